@@ -0,0 +1,305 @@
+"""
+Aggregate plots of many battles or candidates: results are binned with NumPy first and only
+the bins are drawn, so rendering takes the same time for a thousand or a million battles.
+
+- `TrajectoryDensity`: per-round HP histograms of a batch of battles, filled from the
+  trajectory buffers of `simulate_battles_batch` (chunk by chunk for large batches)
+- `stat_grid`: mean (or best) fitness, win rate, ... binned over any pair of stats
+- `stat_distribution`: (fitness-weighted) histograms of the five stats of many builds,
+  drawn as density bands on a radar chart
+
+Binning only needs NumPy. The `plot_*` functions import matplotlib when called; with a
+`path` they draw onto a standalone Agg figure, which works headless and leaves pyplot alone.
+"""
+
+# Standard library imports
+from dataclasses import dataclass
+from typing import Optional, Union
+import numpy as np
+
+from batch_battle import STAT_COLUMNS
+from build_plotter import ARCHETYPE_TO_COLOR
+
+ARCHETYPES: tuple[str, ...] = ("Offense", "Balanced", "Tank")
+# column names of the (S, 15) parameter vectors of `_fitness_wrapper`
+PARAM_NAMES: tuple[str, ...] = tuple(f"{archetype}.{stat}" for archetype in ARCHETYPES for stat in STAT_COLUMNS)
+STAT_LABELS: tuple[str, ...] = ("ATK", "DEF", "REV", "HP", "SPD")
+MAX_CHUNK: int = 2**16  # battles histogrammed at once, bounds temporary memory
+
+# ------------------------------------------------------------
+# Data structures
+# ------------------------------------------------------------
+
+class TrajectoryDensity:
+    """
+    Histogram of the HP of both players in every round over a batch of battles.
+
+    `counts[p, r, k]` counts battles in which player p had HP in bin k after round r
+    (round 0: starting HP). Battles that already ended do not count in later rounds.
+    HP outside `hp_range` is put into the first or last bin.
+    """
+
+    def __init__(self, max_rounds: int = 100, hp_range: tuple[float, float] = (-10.0, 30.0), hp_bins: int = 80):
+        self.hp_edges = np.linspace(hp_range[0], hp_range[1], hp_bins + 1)
+        self.counts = np.zeros((2, max_rounds + 1, hp_bins), dtype=np.int64)
+        self.n_battles = 0
+
+    @property
+    def running(self) -> np.ndarray:
+        """(max_rounds + 1,) number of battles still running after each round."""
+        return self.counts[0].sum(axis=1)
+
+    def add(self, trajectory: np.ndarray) -> "TrajectoryDensity":
+        """Add the battles of an (N, max_rounds + 1, 2) trajectory buffer (NaN after a battle ended)."""
+        n_rounds, n_bins = self.counts.shape[1:]
+        if trajectory.ndim != 3 or trajectory.shape[1:] != (n_rounds, 2):
+            raise ValueError(f"trajectory must have shape (N, {n_rounds}, 2), got {trajectory.shape}")
+        low, width = self.hp_edges[0], self.hp_edges[1] - self.hp_edges[0]
+        round_offset = np.arange(n_rounds)[None, :] * n_bins
+        for start in range(0, len(trajectory), MAX_CHUNK):
+            chunk = np.asarray(trajectory[start:start + MAX_CHUNK])
+            for player in range(2):
+                hp = chunk[:, :, player]
+                valid = ~np.isnan(hp)
+                bins = np.clip(np.floor((hp[valid] - low) / width), 0, n_bins - 1).astype(np.int64)
+                flat = np.broadcast_to(round_offset, hp.shape)[valid] + bins
+                self.counts[player] += np.bincount(flat, minlength=n_rounds * n_bins).reshape(n_rounds, n_bins)
+        self.n_battles += len(trajectory)
+        return self
+
+    def quantile(self, q: float) -> np.ndarray:
+        """(2, max_rounds + 1) HP quantile per player and round (bin centers, NaN once all battles ended)."""
+        cumulative = np.cumsum(self.counts, axis=2)
+        total = cumulative[..., -1:]
+        index = np.argmax(cumulative >= q * total, axis=2)
+        centers = (self.hp_edges[:-1] + self.hp_edges[1:]) / 2
+        return np.where(total[..., 0] > 0, centers[index], np.nan)
+
+@dataclass
+class StatGrid:
+    """Values binned over two stats; `value` is NaN in empty bins."""
+    x_edges: np.ndarray   # (bins_x + 1,)
+    y_edges: np.ndarray   # (bins_y + 1,)
+    value: np.ndarray     # (bins_x, bins_y) mean or minimum per bin
+    count: np.ndarray     # (bins_x, bins_y) samples per bin
+    x_name: str
+    y_name: str
+
+@dataclass
+class StatDistribution:
+    """Weighted histograms of the five stats of many builds."""
+    edges: np.ndarray      # (5, bins + 1) bin edges per stat
+    density: np.ndarray    # (5, bins) weight per bin, normalized to a sum of 1 per stat
+    mean: np.ndarray       # (5,) weighted mean per stat
+    quantiles: np.ndarray  # (5, 3) weighted 10 %, 50 % and 90 % quantiles per stat
+
+# ------------------------------------------------------------
+# Binning
+# ------------------------------------------------------------
+
+def trajectory_density(trajectory: np.ndarray, hp_bins: int = 80,
+                       hp_range: Optional[tuple[float, float]] = None) -> TrajectoryDensity:
+    """`TrajectoryDensity` of one trajectory buffer; the HP range defaults to the range of the buffer."""
+    if hp_range is None:
+        hp_range = (float(np.nanmin(trajectory)), float(np.nanmax(trajectory)) + 1e-9)
+    return TrajectoryDensity(trajectory.shape[1] - 1, hp_range, hp_bins).add(trajectory)
+
+def _column(params: np.ndarray, stat: Union[int, str]) -> tuple[np.ndarray, str]:
+    """Column of (N, 5) stats or (S, 15) parameter vectors by index or name ("hp", "Tank.hp")."""
+    names = PARAM_NAMES if params.shape[1] == len(PARAM_NAMES) else STAT_COLUMNS
+    if isinstance(stat, str):
+        if stat not in names:
+            raise ValueError(f"Unknown stat '{stat}'. Available stats: {', '.join(names)}")
+        stat = names.index(stat)
+    return params[:, stat], names[stat]
+
+def _edges(value_range: tuple[float, float], bins: int) -> np.ndarray:
+    """Equal-width bin edges; a single bin around the value if the range is empty (constant stat)."""
+    low, high = value_range
+    return np.linspace(low, high, bins + 1) if high > low else np.array([low - 0.5, low + 0.5])
+
+def stat_grid(params: np.ndarray, values: np.ndarray, x: Union[int, str], y: Union[int, str],
+              bins: Union[int, tuple[int, int]] = 40, ranges: Optional[tuple[tuple[float, float], tuple[float, float]]] = None,
+              statistic: str = "mean") -> StatGrid:
+    """
+    Bin `values` of N samples over two of their stats.
+
+    Args:
+        params: (N, 5) build stats or (N, 15) parameter vectors as in `fitness_batch`
+        values: (N,) value per sample, e.g. fitness scores or 0/1 wins (mean = win rate)
+        x, y: Stats on the two axes, by column index or name ("atk" or "Offense.atk")
+        bins: Bins per axis
+        ranges: ((x_min, x_max), (y_min, y_max)); defaults to the range of the samples
+        statistic: "mean" or "min" (best fitness) of the values in each bin
+
+    Returns:
+        `StatGrid` with the binned values and sample counts
+    """
+    if statistic not in ("mean", "min"):
+        raise ValueError(f"Unknown statistic '{statistic}'. Available statistics: mean, min")
+    params = np.asarray(params, dtype=np.float64).reshape(len(values), -1)
+    values = np.asarray(values, dtype=np.float64)
+    (x_values, x_name), (y_values, y_name) = _column(params, x), _column(params, y)
+    bins_x, bins_y = (bins, bins) if np.isscalar(bins) else bins
+    if ranges is None:
+        ranges = ((x_values.min(), x_values.max()), (y_values.min(), y_values.max()))
+    x_edges, y_edges = _edges(ranges[0], bins_x), _edges(ranges[1], bins_y)
+    bins_x, bins_y = len(x_edges) - 1, len(y_edges) - 1
+    # samples on the upper edge belong to the last bin, as in np.histogram
+    x_bin = np.clip(np.searchsorted(x_edges, x_values, side="right") - 1, 0, bins_x - 1)
+    y_bin = np.clip(np.searchsorted(y_edges, y_values, side="right") - 1, 0, bins_y - 1)
+    inside = ((x_values >= x_edges[0]) & (x_values <= x_edges[-1]) & (y_values >= y_edges[0]) & (y_values <= y_edges[-1])
+              & ~np.isnan(values))
+    flat = (x_bin * bins_y + y_bin)[inside]
+    count = np.bincount(flat, minlength=bins_x * bins_y)
+    if statistic == "mean":
+        total = np.bincount(flat, weights=values[inside], minlength=bins_x * bins_y)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            value = np.where(count > 0, total / count, np.nan)
+    else:
+        order = np.argsort(flat, kind="stable")
+        occupied = np.flatnonzero(count)
+        value = np.full(bins_x * bins_y, np.nan)
+        if len(occupied):
+            value[occupied] = np.minimum.reduceat(values[inside][order], np.cumsum(count)[occupied] - count[occupied])
+    return StatGrid(x_edges, y_edges, value.reshape(bins_x, bins_y), count.reshape(bins_x, bins_y), x_name, y_name)
+
+def sweep_params(params: np.ndarray, x: Union[int, str], y: Union[int, str],
+                 x_values: np.ndarray, y_values: np.ndarray) -> np.ndarray:
+    """
+    Grid of copies of one (15,) parameter vector with stats `x` and `y` set to every value
+    pair, as input to `fitness_batch` and then `stat_grid`. Returns (len(x_values) * len(y_values), 15).
+    """
+    params = np.asarray(params, dtype=np.float64).reshape(1, -1)
+    x_index = PARAM_NAMES.index(x) if isinstance(x, str) else x
+    y_index = PARAM_NAMES.index(y) if isinstance(y, str) else y
+    grid = np.repeat(params, len(x_values) * len(y_values), axis=0)
+    grid[:, x_index] = np.repeat(x_values, len(y_values))
+    grid[:, y_index] = np.tile(y_values, len(x_values))
+    return grid
+
+def fitness_weights(scores: np.ndarray, temperature: float = 1.0) -> np.ndarray:
+    """Boltzmann weights exp(-(fitness - best) / temperature): low fitness (better) weighs more."""
+    scores = np.asarray(scores, dtype=np.float64)
+    return np.exp(-(scores - np.nanmin(scores)) / temperature)
+
+def _weighted_quantiles(density: np.ndarray, edges: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """Quantiles of a histogram, interpolated linearly within bins."""
+    cumulative = np.concatenate([[0.0], np.cumsum(density)])
+    return np.interp(q, cumulative, edges)
+
+def stat_distribution(stats: np.ndarray, weights: Optional[np.ndarray] = None, bins: int = 24,
+                      ranges: Optional[list[tuple[float, float]]] = None) -> StatDistribution:
+    """
+    Weighted histograms of N builds' stats.
+
+    Args:
+        stats: (N, 5) build stats, e.g. `params.reshape(-1, 3, 5)[:, k]` for archetype k
+        weights: (N,) weight per build, e.g. `fitness_weights(scores)` (default: equal weights)
+        bins: Bins per stat
+        ranges: (min, max) per stat; defaults to the range of the builds
+    """
+    stats = np.asarray(stats, dtype=np.float64).reshape(-1, len(STAT_COLUMNS))
+    weights = np.ones(len(stats)) if weights is None else np.asarray(weights, dtype=np.float64)
+    if ranges is None:
+        ranges = [(low, high if high > low else low + 1.0) for low, high in zip(stats.min(axis=0), stats.max(axis=0))]
+    edges = np.array([np.linspace(low, high, bins + 1) for low, high in ranges])
+    density = np.array([np.histogram(stats[:, k], bins=edges[k], weights=weights)[0] for k in range(len(STAT_COLUMNS))])
+    density /= np.maximum(density.sum(axis=1, keepdims=True), np.finfo(float).tiny)
+    mean = weights @ stats / weights.sum()
+    quantiles = np.array([_weighted_quantiles(density[k], edges[k], np.array([0.1, 0.5, 0.9]))
+                          for k in range(len(STAT_COLUMNS))])
+    return StatDistribution(edges, density, mean, quantiles)
+
+# ------------------------------------------------------------
+# Plotting
+# ------------------------------------------------------------
+
+def _figure(path: Optional[str], **kwargs):
+    """Standalone Agg figure when saving to `path`, else a pyplot figure for `plt.show()`."""
+    if path is not None:
+        from matplotlib.figure import Figure  # imported here: slow, and only needed for plotting
+        return Figure(**kwargs)
+    import matplotlib.pyplot as plt
+    return plt.figure(**kwargs)
+
+def _finish(fig, path: Optional[str]) -> None:
+    if path is not None:
+        fig.savefig(path)
+    else:
+        import matplotlib.pyplot as plt
+        plt.show()
+
+def plot_trajectory_density(density: TrajectoryDensity, names: tuple[str, str] = ("Player 1", "Player 2"),
+                            path: Optional[str] = None, log: bool = True) -> None:
+    """Heatmaps of the HP of both players per round with the median HP, one panel per player."""
+    from matplotlib.colors import LogNorm
+    fig = _figure(path, figsize=(12, 4.5))
+    axs = fig.subplots(1, 2, sharey=True)
+    rounds = np.arange(density.counts.shape[1] + 1) - 0.5
+    last_round = int(np.flatnonzero(density.running)[-1]) if density.running.any() else 0
+    median = density.quantile(0.5)
+    for player, (ax, name) in enumerate(zip(axs, names)):
+        counts = np.ma.masked_equal(density.counts[player].T, 0)
+        mesh = ax.pcolormesh(rounds, density.hp_edges, counts, cmap="viridis",
+                             norm=LogNorm(vmin=1, vmax=max(1, counts.max())) if log and counts.count() else None)
+        ax.plot(np.arange(len(median[player])), median[player], color=ARCHETYPE_TO_COLOR.get(name, "w"),
+                linewidth=1.5, label="median HP")
+        ax.axhline(0, color="k", linestyle="--", linewidth=0.8)
+        ax.set_xlim(-0.5, last_round + 0.5)
+        ax.set_title(f"{name} ({density.n_battles} battles)")
+        ax.set_xlabel("Round")
+        ax.legend(loc="upper right")
+        fig.colorbar(mesh, ax=ax, label="battles")
+    axs[0].set_ylabel("HP")
+    fig.tight_layout()
+    _finish(fig, path)
+
+def plot_stat_grid(grid: StatGrid, label: str = "fitness", path: Optional[str] = None,
+                   cmap: str = "viridis_r", min_count: int = 1) -> None:
+    """Heatmap of a `StatGrid`; bins with fewer than `min_count` samples stay empty."""
+    fig = _figure(path, figsize=(6.5, 5))
+    ax = fig.subplots()
+    value = np.ma.masked_where((grid.count < min_count) | np.isnan(grid.value), grid.value)
+    mesh = ax.pcolormesh(grid.x_edges, grid.y_edges, value.T, cmap=cmap)
+    fig.colorbar(mesh, ax=ax, label=label)
+    ax.set_xlabel(grid.x_name)
+    ax.set_ylabel(grid.y_name)
+    ax.set_title(f"{label} over {grid.x_name} and {grid.y_name} ({int(grid.count.sum())} samples)")
+    fig.tight_layout()
+    _finish(fig, path)
+
+def plot_stat_distributions(distributions: dict[str, StatDistribution], path: Optional[str] = None) -> None:
+    """
+    Radar chart of stat distributions: each axis is shaded by the weighted density of one stat,
+    the line connects the weighted means and the band spans the 10 % to 90 % quantiles.
+    Each axis is scaled to the joint range of that stat over all distributions.
+    """
+    from matplotlib.colors import to_rgba
+    fig = _figure(path, figsize=(5 * len(distributions), 5))
+    axs = np.atleast_1d(fig.subplots(1, len(distributions), subplot_kw=dict(polar=True)))
+    low = np.min([d.edges[:, 0] for d in distributions.values()], axis=0)
+    high = np.max([d.edges[:, -1] for d in distributions.values()], axis=0)
+    scale = lambda values: (values - low) / (high - low)
+    angles = np.linspace(0, 2 * np.pi, len(STAT_COLUMNS), endpoint=False)
+    closed = np.append(angles, angles[:1])
+    for ax, (name, distribution) in zip(axs, distributions.items()):
+        color = ARCHETYPE_TO_COLOR.get(name, "C0")
+        ax.set_theta_offset(np.pi / 2)
+        ax.set_theta_direction(-1)
+        ax.set_xticks(angles, [f"{label}\n[{a:.3g}, {b:.3g}]" for label, a, b in zip(STAT_LABELS, low, high)])
+        ax.set_ylim(0, 1)
+        ax.set_yticklabels([])
+        for k, angle in enumerate(angles):
+            bottoms = (distribution.edges[k, :-1] - low[k]) / (high[k] - low[k])
+            heights = np.diff(distribution.edges[k]) / (high[k] - low[k])
+            alphas = 0.8 * distribution.density[k] / max(distribution.density[k].max(), np.finfo(float).tiny)
+            ax.bar(np.full(len(bottoms), angle), heights, width=0.35, bottom=bottoms,
+                   color=[to_rgba(color, alpha) for alpha in alphas], linewidth=0)
+        inner, outer = scale(distribution.quantiles[:, 0]), scale(distribution.quantiles[:, 2])
+        ax.fill_between(closed, np.append(inner, inner[:1]), np.append(outer, outer[:1]), color=color, alpha=0.15)
+        mean = scale(distribution.mean)
+        ax.plot(closed, np.append(mean, mean[:1]), color=color, linewidth=2)
+        ax.set_title(name)
+    fig.tight_layout()
+    _finish(fig, path)
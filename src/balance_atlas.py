@@ -0,0 +1,236 @@
+"""
+Exhaustive atlas of RPS cycles on a discrete stat grid.
+
+For every archetype, a `StatGrid` lists the printable values of each stat (e.g. integer HP,
+half-point ATK/DEF). Instead of simulating every (Offense, Balanced, Tank) triple, the atlas
+simulates the three cycle matchups pairwise (Offense vs Tank, Tank vs Balanced, Balanced vs
+Offense): a triple is a cycle exactly if its three pairs are wins of the first build, so
+every pairwise result is shared by all triples containing that pair.
+
+Pruning happens before simulating: `proper_strategy_names` is a conjunction of pairwise
+stat orderings (ATK O > B > T, DEF T > B > O, HP O < B < T), so pairs violating their part of
+it can never be in a valid triple and are skipped, and so are pairs with equal speed, whose
+outcome is a coin flip and cannot form a designed cycle.
+
+Pairwise results are stored on disk in chunks, one `.npz` file per matchup and ATK value
+pair, keyed by the stats of both builds. `BalanceAtlas.update` only simulates pairs missing
+from the store, so extending one stat's range computes just the new slice. Every chunk
+records the `max_rounds` it was simulated with; opening a store with a different round
+limit raises instead of mixing outcomes of both limits.
+"""
+
+# Standard library imports
+from dataclasses import dataclass
+from itertools import product
+import os
+from typing import Iterator, Optional, Sequence
+import numpy as np
+from scipy import sparse
+
+from batch_battle import ATK, DEF, HP, SPD, P1_WINS, STAT_COLUMNS
+from battle_engines import get_engine
+from pvp_balance_search import Build
+
+# ------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------
+
+ARCHETYPES: tuple[str, ...] = ("offense", "balanced", "tank")
+# the pairwise matchups of the cycle, (winner, loser) of a valid RPS cycle
+CYCLE_MATCHUPS: tuple[tuple[str, str], ...] = (("offense", "tank"), ("tank", "balanced"), ("balanced", "offense"))
+# order of the archetypes required by `proper_strategy_names` (higher rank = larger stat)
+_STAT_RANKS: dict[int, dict[str, int]] = {
+    ATK: {"offense": 2, "balanced": 1, "tank": 0},
+    DEF: {"offense": 0, "balanced": 1, "tank": 2},
+    HP: {"offense": 0, "balanced": 1, "tank": 2},
+}
+
+# ------------------------------------------------------------
+# Grid
+# ------------------------------------------------------------
+
+@dataclass
+class StatGrid:
+    """Allowed values of each stat of one archetype."""
+    atk: Sequence[float]
+    defense: Sequence[float]
+    revenge: Sequence[float]
+    hp: Sequence[int]
+    spd: Sequence[float]
+
+    def values(self) -> list[np.ndarray]:
+        """Sorted unique values per stat, in `STAT_COLUMNS` order."""
+        return [np.unique(np.asarray(getattr(self, stat), dtype=np.float64)) for stat in STAT_COLUMNS]
+
+    def builds(self) -> np.ndarray:
+        """All builds of the grid as an (M, 5) array, in C order of the stat values."""
+        return np.array(list(product(*self.values())), dtype=np.float64).reshape(-1, len(STAT_COLUMNS))
+
+    def index_of(self, stats: np.ndarray) -> np.ndarray:
+        """Row of each build of `stats` (K, 5) in `builds()`, or -1 if it is not on the grid."""
+        values = self.values()
+        index = np.zeros(len(stats), dtype=np.int64)
+        on_grid = np.ones(len(stats), dtype=bool)
+        for column, column_values in enumerate(values):
+            position = np.clip(np.searchsorted(column_values, stats[:, column]), 0, len(column_values) - 1)
+            on_grid &= column_values[position] == stats[:, column]
+            index = index * len(column_values) + position
+        return np.where(on_grid, index, -1)
+
+def _prune_mask(first: str, second: str, stats_a: np.ndarray, stats_b: np.ndarray) -> np.ndarray:
+    """(m, n) mask of the pairs that satisfy the pairwise part of `proper_strategy_names` and differ in speed."""
+    mask = stats_a[:, None, SPD] != stats_b[None, :, SPD]
+    for column, ranks in _STAT_RANKS.items():
+        if ranks[first] > ranks[second]:
+            mask &= stats_a[:, None, column] > stats_b[None, :, column]
+        else:
+            mask &= stats_a[:, None, column] < stats_b[None, :, column]
+    return mask
+
+# ------------------------------------------------------------
+# Atlas
+# ------------------------------------------------------------
+
+class BalanceAtlas:
+    """
+    Pairwise results of the cycle matchups on a stat grid, stored in chunks under `directory`.
+
+    Args:
+        directory: Chunk store; reused (and extended) across runs with different grids
+        grids: `StatGrid` per archetype ("offense", "balanced", "tank")
+        max_rounds: Rounds after which a battle ends in a draw; must match the chunks in `directory`
+        engine: Battle engine used to simulate missing pairs (see `battle_engines`)
+    """
+
+    def __init__(self, directory: str, grids: dict[str, StatGrid], max_rounds: int = 100, engine: str = "numpy"):
+        self.directory = directory
+        self.grids = grids
+        self.max_rounds = max_rounds
+        self.engine = engine
+        self.builds = {name: grid.builds() for name, grid in grids.items()}
+        self._edges: dict[tuple[str, str], tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    def _chunk_path(self, first: str, second: str, atk_a: float, atk_b: float) -> str:
+        return os.path.join(self.directory, f"{first}_vs_{second}", f"atk_{atk_a!r}_{atk_b!r}.npz")
+
+    def _load_chunk(self, path: str) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        if not os.path.exists(path):
+            empty = np.zeros((0, len(STAT_COLUMNS)))
+            return empty, empty, np.zeros(0, dtype=np.int8), np.zeros(0, dtype=np.int16)
+        with np.load(path) as chunk:
+            stored_rounds = int(chunk["max_rounds"]) if "max_rounds" in chunk.files else None
+            if stored_rounds != self.max_rounds:
+                raise ValueError(f"{path} was simulated with max_rounds={stored_rounds}, this atlas uses "
+                                 f"max_rounds={self.max_rounds}; use a separate directory per round limit")
+            return chunk["stats_a"], chunk["stats_b"], chunk["winner"], chunk["rounds"]
+
+    def _chunks(self, first: str, second: str) -> Iterator[tuple[float, float, np.ndarray, np.ndarray]]:
+        """(atk_a, atk_b, rows of A, rows of B) of every chunk that can contain valid pairs."""
+        builds_a, builds_b = self.builds[first], self.builds[second]
+        a_larger = _STAT_RANKS[ATK][first] > _STAT_RANKS[ATK][second]
+        for atk_a in np.unique(builds_a[:, ATK]):
+            for atk_b in np.unique(builds_b[:, ATK]):
+                if (atk_a > atk_b) != a_larger or atk_a == atk_b:
+                    continue  # whole chunk fails the ATK ordering
+                yield (float(atk_a), float(atk_b), np.flatnonzero(builds_a[:, ATK] == atk_a),
+                       np.flatnonzero(builds_b[:, ATK] == atk_b))
+
+    def update(self, verbose: bool = False) -> int:
+        """
+        Simulate all pruned pairs of the current grids that are not stored yet.
+
+        Returns:
+            Number of newly simulated battles
+        """
+        n_simulated = 0
+        engine = get_engine(self.engine)
+        for first, second in CYCLE_MATCHUPS:
+            builds_a, builds_b = self.builds[first], self.builds[second]
+            os.makedirs(os.path.join(self.directory, f"{first}_vs_{second}"), exist_ok=True)
+            for atk_a, atk_b, rows_a, rows_b in self._chunks(first, second):
+                ia, ib = np.nonzero(_prune_mask(first, second, builds_a[rows_a], builds_b[rows_b]))
+                if ia.size == 0:
+                    continue
+                required = rows_a[ia] * len(builds_b) + rows_b[ib]
+                path = self._chunk_path(first, second, atk_a, atk_b)
+                stats_a, stats_b, winner, rounds = self._load_chunk(path)
+                stored_a, stored_b = self.grids[first].index_of(stats_a), self.grids[second].index_of(stats_b)
+                # off-grid rows (-1) must not be keyed: -1 in B would alias the last B build of the previous A row
+                on_grid = (stored_a >= 0) & (stored_b >= 0)
+                stored = stored_a[on_grid] * len(builds_b) + stored_b[on_grid]
+                missing = required[~np.isin(required, stored)]
+                if missing.size == 0:
+                    continue
+                new_a, new_b = builds_a[missing // len(builds_b)], builds_b[missing % len(builds_b)]
+                result = engine(new_a, new_b, self.max_rounds)
+                np.savez_compressed(path, stats_a=np.concatenate([stats_a, new_a]),
+                                    stats_b=np.concatenate([stats_b, new_b]),
+                                    winner=np.concatenate([winner, result.winner]),
+                                    rounds=np.concatenate([rounds, result.rounds.astype(np.int16)]),
+                                    max_rounds=self.max_rounds)
+                n_simulated += missing.size
+            if verbose:
+                print(f"{first} vs {second}: {n_simulated} battles simulated so far")
+        self._edges.clear()
+        return n_simulated
+
+    def pair_results(self, first: str, second: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Stored results of one cycle matchup restricted to the current grids.
+
+        Returns:
+            (index into builds[first], index into builds[second], rounds) of all pairs where
+            the first build wins
+        """
+        if (first, second) not in self._edges:
+            index_a, index_b, edge_rounds = [], [], []
+            for atk_a, atk_b, _, _ in self._chunks(first, second):
+                stats_a, stats_b, winner, rounds = self._load_chunk(self._chunk_path(first, second, atk_a, atk_b))
+                ia, ib = self.grids[first].index_of(stats_a), self.grids[second].index_of(stats_b)
+                keep = (ia >= 0) & (ib >= 0) & (winner == P1_WINS)
+                index_a.append(ia[keep])
+                index_b.append(ib[keep])
+                edge_rounds.append(rounds[keep])
+            self._edges[(first, second)] = (np.concatenate(index_a or [np.zeros(0, np.int64)]),
+                                            np.concatenate(index_b or [np.zeros(0, np.int64)]),
+                                            np.concatenate(edge_rounds or [np.zeros(0, np.int16)]))
+        return self._edges[(first, second)]
+
+    def _win_matrix(self, first: str, second: str, rounds_range: Optional[tuple[int, int]]) -> sparse.csr_matrix:
+        index_a, index_b, rounds = self.pair_results(first, second)
+        if rounds_range is not None:
+            keep = (rounds >= rounds_range[0]) & (rounds <= rounds_range[1])
+            index_a, index_b = index_a[keep], index_b[keep]
+        shape = (len(self.builds[first]), len(self.builds[second]))
+        return sparse.csr_matrix((np.ones(len(index_a), dtype=np.int64), (index_a, index_b)), shape=shape)
+
+    def count_cycles(self, rounds_range: Optional[tuple[int, int]] = (3, 10)) -> int:
+        """
+        Number of (Offense, Balanced, Tank) triples forming a valid cycle, i.e. each of the
+        three cycle matchups is won by the intended build within `rounds_range` (None: any length).
+        """
+        offense_tank = self._win_matrix("offense", "tank", rounds_range)
+        tank_balanced = self._win_matrix("tank", "balanced", rounds_range)
+        balanced_offense = self._win_matrix("balanced", "offense", rounds_range)
+        # (T x B) @ (B x O) counts the balanced builds closing each tank -> offense path
+        paths = (tank_balanced @ balanced_offense).T.tocsr()
+        return int(offense_tank.multiply(paths).sum())
+
+    def cycles(self, rounds_range: Optional[tuple[int, int]] = (3, 10),
+               limit: Optional[int] = None) -> list[tuple[Build, Build, Build]]:
+        """The valid cycles counted by `count_cycles` as (Offense, Balanced, Tank) builds."""
+        offense_tank = self._win_matrix("offense", "tank", rounds_range)
+        tank_balanced = self._win_matrix("tank", "balanced", rounds_range)
+        balanced_offense = self._win_matrix("balanced", "offense", rounds_range).T.tocsr()  # O x B
+        found = []
+        for o, t in zip(*offense_tank.nonzero()):
+            balanced = np.intersect1d(tank_balanced[t].indices, balanced_offense[o].indices)
+            for b in balanced:
+                found.append((self._build("offense", o), self._build("balanced", b), self._build("tank", t)))
+                if limit is not None and len(found) >= limit:
+                    return found
+        return found
+
+    def _build(self, archetype: str, index: int) -> Build:
+        atk, defense, revenge, hp, spd = self.builds[archetype][index].tolist()
+        return Build(archetype.capitalize(), atk, defense, revenge, int(hp), spd)
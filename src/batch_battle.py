@@ -0,0 +1,248 @@
+"""
+NumPy batch engine for round-based PvP battles.
+
+Resolves N independent battles in lock-step instead of running one Python round loop per
+matchup. Builds are passed as (N, 5) float arrays with the columns given by `STAT_COLUMNS`.
+The step order and damage arithmetic match `pvp_balance_search.simulate_battle` exactly.
+"""
+
+# Standard library imports
+from dataclasses import dataclass
+import random
+from typing import Optional
+import numpy as np
+
+# ------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------
+
+STAT_COLUMNS: tuple[str, ...] = ('atk', 'defense', 'revenge', 'hp', 'spd')
+ATK, DEF, REV, HP, SPD = range(len(STAT_COLUMNS))
+
+# winner codes used in `BatchBattleResult.winner`
+DRAW: int = -1
+P1_WINS: int = 0
+P2_WINS: int = 1
+
+# ------------------------------------------------------------
+# Data structures
+# ------------------------------------------------------------
+
+@dataclass
+class BatchBattleResult:
+    """Outcome of N battles. `winner` holds P1_WINS, P2_WINS or DRAW per battle."""
+    winner: np.ndarray  # (N,) int8
+    rounds: np.ndarray  # (N,) int64
+    hp: np.ndarray      # (N, 2) float64, HP of (p1, p2) when the battle ended
+
+    def __len__(self) -> int:
+        return len(self.winner)
+
+# ------------------------------------------------------------
+# Conversion helpers
+# ------------------------------------------------------------
+
+def builds_to_array(builds) -> np.ndarray:
+    """Stack the stats of a sequence of `Build`s into an (N, 5) float64 array."""
+    return np.array([[float(getattr(build, stat)) for stat in STAT_COLUMNS] for build in builds],
+                    dtype=np.float64).reshape(-1, len(STAT_COLUMNS))
+
+# ------------------------------------------------------------
+# Battle engine
+# ------------------------------------------------------------
+
+def _simulate_tied_battle(s1: np.ndarray, s2: np.ndarray, max_rounds: int,
+                          trajectory: Optional[np.ndarray] = None) -> tuple[int, int, float, float]:
+    """
+    Scalar round loop for a battle with equal speeds.
+
+    The first attacker is drawn with `random.random()` each round, exactly like
+    `simulate_battle`, so tied battles consume the global random stream in the same order.
+    With a `trajectory` ((max_rounds + 1, 2) view of a buffer), HP after every round is written into it.
+    """
+    stats = (s1, s2)
+    hp = [float(s1[HP]), float(s2[HP])]
+    winner, n_rounds = DRAW, max_rounds
+    for round_idx in range(1, max_rounds + 1):
+        a, b = (0, 1) if random.random() < 0.5 else (1, 0)
+        hp[b] -= max(0.0, stats[a][ATK] - stats[b][DEF])
+        if hp[b] <= 0:
+            winner, n_rounds = a, round_idx
+            break
+        hp[a] -= stats[b][REV]
+        if hp[a] <= 0:
+            winner, n_rounds = b, round_idx
+            break
+        hp[a] -= max(0.0, stats[b][ATK] - stats[a][DEF])
+        if hp[a] <= 0:
+            winner, n_rounds = b, round_idx
+            break
+        hp[b] -= stats[a][REV]
+        if hp[b] <= 0:
+            winner, n_rounds = a, round_idx
+            break
+        if trajectory is not None:
+            trajectory[round_idx] = hp
+    if trajectory is not None:
+        trajectory[n_rounds] = hp
+    return winner, n_rounds, hp[0], hp[1]
+
+def allocate_trajectories(n_battles: int, max_rounds: int = 100) -> np.ndarray:
+    """NaN-filled (n_battles, max_rounds + 1, 2) float32 buffer for `simulate_battles_batch(trajectory=...)`."""
+    return np.full((n_battles, max_rounds + 1, 2), np.nan, dtype=np.float32)
+
+def simulate_battles_batch(stats1: np.ndarray, stats2: np.ndarray, max_rounds: int = 100,
+                           trajectory: Optional[np.ndarray] = None) -> BatchBattleResult:
+    """
+    Simulate N PvP battles in lock-step.
+
+    Every round applies the four steps of `simulate_battle` (primary, revenge, primary,
+    revenge) to all running battles at once; a battle is masked out as soon as a step drops
+    one HP to 0 or below.
+
+    Battles with equal speeds are resolved afterwards, in row order, with the scalar loop so
+    that the coin flips are drawn from `random` in the same order as calling
+    `simulate_battle` once per row. With a fixed `random.seed` the results are identical.
+
+    Args:
+        stats1: (N, 5) stats of the first player of every battle (see `STAT_COLUMNS`)
+        stats2: (N, 5) stats of the second player of every battle
+        max_rounds: Rounds after which a battle ends in a draw
+        trajectory: Optional (N, max_rounds + 1, 2) buffer (see `allocate_trajectories`) that
+            receives the HP of both players at the start (index 0) and after every round;
+            entries after the end of a battle are NaN. Nothing per round is recorded without it.
+
+    Returns:
+        BatchBattleResult with winner, round count and final HP of every battle
+    """
+    stats1 = np.asarray(stats1, dtype=np.float64).reshape(-1, len(STAT_COLUMNS))
+    stats2 = np.asarray(stats2, dtype=np.float64).reshape(-1, len(STAT_COLUMNS))
+    n_battles = len(stats1)
+    if trajectory is not None:
+        if trajectory.shape != (n_battles, max_rounds + 1, 2):
+            raise ValueError(f"trajectory buffer has shape {trajectory.shape}, expected {(n_battles, max_rounds + 1, 2)}")
+        trajectory.fill(np.nan)
+        trajectory[:, 0, 0], trajectory[:, 0, 1] = stats1[:, HP], stats2[:, HP]
+
+    winner = np.full(n_battles, DRAW, dtype=np.int8)
+    rounds = np.full(n_battles, max_rounds, dtype=np.int64)
+    hp = np.stack([stats1[:, HP], stats2[:, HP]], axis=1)
+
+    # Arrange every untied battle as (a = faster player, b = slower player)
+    p1_first = stats1[:, SPD] > stats2[:, SPD]
+    p2_first = stats2[:, SPD] > stats1[:, SPD]
+    untied = np.flatnonzero(p1_first | p2_first)
+    a_first = p1_first[untied]
+    stats_a = np.where(a_first[:, None], stats1[untied], stats2[untied])
+    stats_b = np.where(a_first[:, None], stats2[untied], stats1[untied])
+    hp_a = stats_a[:, HP].copy()
+    hp_b = stats_b[:, HP].copy()
+    dmg_a_to_b = np.maximum(0.0, stats_a[:, ATK] - stats_b[:, DEF])
+    dmg_b_to_a = np.maximum(0.0, stats_b[:, ATK] - stats_a[:, DEF])
+    rev_a = stats_a[:, REV]
+    rev_b = stats_b[:, REV]
+    # winner code of a and b in terms of p1/p2
+    code_a = np.where(a_first, P1_WINS, P2_WINS).astype(np.int8)
+    code_b = np.where(a_first, P2_WINS, P1_WINS).astype(np.int8)
+
+    winner_ab = np.full(len(untied), DRAW, dtype=np.int8)
+    rounds_ab = np.full(len(untied), max_rounds, dtype=np.int64)
+    active = np.arange(len(untied))
+    started = active
+    for round_idx in range(1, max_rounds + 1):
+        if active.size == 0:
+            break
+        # Step 1: a primary hits b
+        hp_b[active] -= dmg_a_to_b[active]
+        dead = hp_b[active] <= 0
+        winner_ab[active[dead]] = code_a[active[dead]]
+        rounds_ab[active[dead]] = round_idx
+        active = active[~dead]
+        # Step 2: b deals revenge to a
+        hp_a[active] -= rev_b[active]
+        dead = hp_a[active] <= 0
+        winner_ab[active[dead]] = code_b[active[dead]]
+        rounds_ab[active[dead]] = round_idx
+        active = active[~dead]
+        # Step 3: b primary hits a
+        hp_a[active] -= dmg_b_to_a[active]
+        dead = hp_a[active] <= 0
+        winner_ab[active[dead]] = code_b[active[dead]]
+        rounds_ab[active[dead]] = round_idx
+        active = active[~dead]
+        # Step 4: a deals revenge to b
+        hp_b[active] -= rev_a[active]
+        dead = hp_b[active] <= 0
+        winner_ab[active[dead]] = code_a[active[dead]]
+        rounds_ab[active[dead]] = round_idx
+        active = active[~dead]
+        if trajectory is not None:
+            # every battle running at the start of the round, including those that ended in it
+            trajectory[untied[started], round_idx, 0] = np.where(a_first[started], hp_a[started], hp_b[started])
+            trajectory[untied[started], round_idx, 1] = np.where(a_first[started], hp_b[started], hp_a[started])
+            started = active
+
+    winner[untied] = winner_ab
+    rounds[untied] = rounds_ab
+    hp[untied, 0] = np.where(a_first, hp_a, hp_b)
+    hp[untied, 1] = np.where(a_first, hp_b, hp_a)
+
+    for i in np.flatnonzero(~(p1_first | p2_first)):
+        winner[i], rounds[i], hp[i, 0], hp[i, 1] = _simulate_tied_battle(
+            stats1[i], stats2[i], max_rounds, trajectory[i] if trajectory is not None else None)
+
+    return BatchBattleResult(winner=winner, rounds=rounds, hp=hp)
+
+def simulate_battles_with_order(stats1: np.ndarray, stats2: np.ndarray, p1_first: np.ndarray) -> BatchBattleResult:
+    """
+    Simulate N battles in lock-step with a given attack order per battle and round.
+
+    Used to resolve speed ties in bulk: `p1_first[i, r]` says whether p1 attacks first in
+    round r + 1 of battle i (e.g. pre-drawn coin flips). Speeds are ignored.
+
+    Args:
+        stats1: (N, 5) stats of the first player of every battle
+        stats2: (N, 5) stats of the second player of every battle
+        p1_first: (N, max_rounds) bool array of attack orders
+
+    Returns:
+        BatchBattleResult with winner, round count and final HP of every battle
+    """
+    p1_first = np.asarray(p1_first, dtype=bool)
+    n_battles, max_rounds = p1_first.shape
+    stats1 = np.broadcast_to(np.asarray(stats1, dtype=np.float64), (n_battles, len(STAT_COLUMNS)))
+    stats2 = np.broadcast_to(np.asarray(stats2, dtype=np.float64), (n_battles, len(STAT_COLUMNS)))
+
+    winner = np.full(n_battles, DRAW, dtype=np.int8)
+    rounds = np.full(n_battles, max_rounds, dtype=np.int64)
+    hp1 = stats1[:, HP].copy()
+    hp2 = stats2[:, HP].copy()
+    dmg_1_to_2 = np.maximum(0.0, stats1[:, ATK] - stats2[:, DEF])
+    dmg_2_to_1 = np.maximum(0.0, stats2[:, ATK] - stats1[:, DEF])
+    rev1 = stats1[:, REV]
+    rev2 = stats2[:, REV]
+
+    # (hits the second attacker?, damage if p1 attacks first, damage if p2 attacks first)
+    steps = (
+        (True, dmg_1_to_2, dmg_2_to_1),   # 1) first attacker's primary
+        (False, rev2, rev1),              # 2) second attacker's revenge
+        (False, dmg_2_to_1, dmg_1_to_2),  # 3) second attacker's primary
+        (True, rev1, rev2),               # 4) first attacker's revenge
+    )
+    active = np.arange(n_battles)
+    for round_idx in range(1, max_rounds + 1):
+        if active.size == 0:
+            break
+        first = p1_first[active, round_idx - 1]
+        for hits_second, dmg_if_p1_first, dmg_if_p2_first in steps:
+            hits_p2 = first if hits_second else ~first
+            damage = np.where(first, dmg_if_p1_first[active], dmg_if_p2_first[active])
+            hp2[active] -= np.where(hits_p2, damage, 0.0)
+            hp1[active] -= np.where(hits_p2, 0.0, damage)
+            dead = np.where(hits_p2, hp2[active] <= 0, hp1[active] <= 0)
+            winner[active[dead]] = np.where(hits_p2[dead], P1_WINS, P2_WINS)
+            rounds[active[dead]] = round_idx
+            active = active[~dead]
+            first = first[~dead]
+
+    return BatchBattleResult(winner=winner, rounds=rounds, hp=np.stack([hp1, hp2], axis=1))
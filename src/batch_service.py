@@ -0,0 +1,417 @@
+"""
+Local batch-evaluation service: a small HTTP server (TCP or Unix socket, no network access
+needed) that lets notebooks, scripts and tools share one battle engine and one result cache.
+
+Endpoints (JSON bodies, builds as in `cli.load_builds`: name, atk, defense, revenge, hp, spd):
+- POST /simulate   {"pairs": [[build1, build2], ...], "max_rounds": 100} -> winner and rounds per pair
+- POST /rps_cycle  {"builds": [offense, balanced, tank]} -> result of `test_rps_cycle`
+- POST /fitness    {"builds": [offense, balanced, tank], "min_rounds": 3, "max_rounds": 10}
+                   -> `fitness_breakdown` (same value as `fitness`)
+- GET  /metrics    request, battle, batch and cache counters, throughput and queue latency
+
+Requests arriving at the same time are not simulated one by one: `MatchupBatcher` collects
+the matchups of all pending requests for up to `max_delay` seconds (or until `max_batch`
+matchups are waiting) and resolves them in one call of the batch engine. Engine calls run in
+a separate thread, so the server keeps accepting and queueing requests meanwhile. Deterministic
+outcomes are stored in a `MatchupCache` shared by all clients, and identical matchups that
+are already queued are simulated only once. Speed ties are random and always simulated.
+
+Start with `python batch_service.py --port 8765` (or `--unix /tmp/battles.sock`) and query
+with `BatchServiceClient`.
+"""
+
+# Standard library imports
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import json
+import socket
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from batch_battle import DRAW, P1_WINS, builds_to_array
+from battle_engines import get_engine
+from matchup_cache import MatchupCache, MatchupKey, MatchupValue
+from profiling import TimingHistogram
+from pvp_balance_search import Build, fitness_breakdown
+
+ENDPOINTS: tuple[str, ...] = ("simulate", "rps_cycle", "fitness")
+MAX_BODY_BYTES: int = 64 * 2**20
+
+# ------------------------------------------------------------
+# Data structures
+# ------------------------------------------------------------
+
+@dataclass(frozen=True)
+class ServiceConfig:
+    """
+    Settings of a `BatchService`.
+
+    Args:
+        engine: Battle engine resolving the coalesced matchups (see `battle_engines`)
+        max_batch: Matchups that trigger an engine call without waiting for `max_delay`
+        max_delay: Seconds the first queued matchup waits for others to join its batch
+        cache_size: Matchups kept in the shared cache (0: no cache)
+        cache_resolution: Stats are rounded to multiples of this for the cache key
+    """
+    engine: str = "numpy"
+    max_batch: int = 8192
+    max_delay: float = 0.002
+    cache_size: int = 2**20
+    cache_resolution: float = 1e-6
+
+@dataclass
+class ServiceMetrics:
+    """Counters of a running service; `to_dict` is the body of GET /metrics."""
+    started: float = field(default_factory=time.perf_counter)
+    requests: dict[str, int] = field(default_factory=lambda: dict.fromkeys(ENDPOINTS, 0))
+    errors: int = 0
+    matchups: int = 0             # matchups requested by clients
+    cache_hits: int = 0
+    coalesced: int = 0            # matchups answered by an identical queued matchup
+    battles: int = 0              # matchups simulated by the engine
+    batches: int = 0              # engine calls
+    queue_latency: TimingHistogram = field(default_factory=TimingHistogram)  # enqueue -> start of engine call
+    engine_time: TimingHistogram = field(default_factory=TimingHistogram)
+
+    def to_dict(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "uptime_s": elapsed,
+            "requests": dict(self.requests),
+            "errors": self.errors,
+            "matchups": self.matchups,
+            "cache_hits": self.cache_hits,
+            "coalesced": self.coalesced,
+            "battles": self.battles,
+            "batches": self.batches,
+            "mean_batch_size": self.battles / self.batches if self.batches else 0.0,
+            "matchups_per_s": self.matchups / elapsed if elapsed > 0 else 0.0,
+            "battles_per_s": self.battles / elapsed if elapsed > 0 else 0.0,
+            "engine_busy_fraction": self.engine_time.total / elapsed if elapsed > 0 else 0.0,
+            "queue_latency_ms": {"mean": self.queue_latency.mean * 1e3, "p50": self.queue_latency.percentile(0.5) * 1e3,
+                                 "p99": self.queue_latency.percentile(0.99) * 1e3, "max": self.queue_latency.max * 1e3},
+        }
+
+# ------------------------------------------------------------
+# Request coalescing
+# ------------------------------------------------------------
+
+class MatchupBatcher:
+    """Queue of matchups from concurrent requests, resolved in batched engine calls."""
+
+    def __init__(self, config: ServiceConfig = ServiceConfig(), metrics: Optional[ServiceMetrics] = None):
+        self.config = config
+        self.metrics = metrics if metrics is not None else ServiceMetrics()
+        self.cache = MatchupCache(config.cache_size, config.cache_resolution) if config.cache_size > 0 else None
+        self._engine = get_engine(config.engine)
+        # queued matchups: (p1, p2, max_rounds, future, enqueue time, cache key or None)
+        self._pending: list[tuple[Build, Build, int, asyncio.Future, float, Optional[MatchupKey]]] = []
+        self._queued: dict[MatchupKey, asyncio.Future] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set[asyncio.Task] = set()
+        # one engine thread: batches run one after another while the event loop keeps queueing
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="battle-engine")
+
+    async def resolve(self, pairs: list[tuple[Build, Build]], max_rounds: int = 100) -> list[MatchupValue]:
+        """(winner code as in `batch_battle`, rounds) of each matchup."""
+        loop = asyncio.get_running_loop()
+        results: list = [None] * len(pairs)
+        waiting: list[tuple[int, asyncio.Future]] = []
+        self.metrics.matchups += len(pairs)
+        for i, (p1, p2) in enumerate(pairs):
+            key = None
+            if self.cache is not None and (p1.spd > p2.spd or p2.spd > p1.spd):
+                key = self.cache.make_key(p1, p2, max_rounds)
+                results[i] = self.cache.get(key)
+                if results[i] is not None:
+                    self.metrics.cache_hits += 1
+                    continue
+                if key in self._queued:
+                    self.metrics.coalesced += 1
+                    waiting.append((i, self._queued[key]))
+                    continue
+            future = loop.create_future()
+            if key is not None:
+                self._queued[key] = future
+            self._pending.append((p1, p2, max_rounds, future, time.perf_counter(), key))
+            waiting.append((i, future))
+        if len(self._pending) >= self.config.max_batch:
+            self.flush()
+        elif self._pending and self._timer is None:
+            self._timer = loop.call_later(self.config.max_delay, self.flush)
+        # gather: retrieves every exception if the engine fails, not just the first one
+        for (i, _), value in zip(waiting, await asyncio.gather(*(future for _, future in waiting))):
+            results[i] = value
+        return results
+
+    def flush(self) -> None:
+        """Hand all queued matchups to the engine thread (one engine call per `max_rounds` value)."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        if pending:
+            task = asyncio.get_running_loop().create_task(self._run_batch(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _simulate(self, group: list, max_rounds: int) -> tuple:
+        """Runs in the engine thread; returns (result, start time, end time)."""
+        start = time.perf_counter()
+        result = self._engine(builds_to_array([entry[0] for entry in group]),
+                              builds_to_array([entry[1] for entry in group]), max_rounds)
+        return result, start, time.perf_counter()
+
+    async def _run_batch(self, pending: list) -> None:
+        """Resolve a batch in the engine thread, so the event loop keeps serving other connections."""
+        loop = asyncio.get_running_loop()
+        for max_rounds in sorted({entry[2] for entry in pending}):
+            group = [entry for entry in pending if entry[2] == max_rounds]
+            try:
+                result, start, end = await loop.run_in_executor(self._executor, self._simulate, group, max_rounds)
+            except Exception as error:
+                for entry in group:
+                    self._queued.pop(entry[5], None)
+                    if not entry[3].done():
+                        entry[3].set_exception(RuntimeError(f"battle engine '{self.config.engine}' failed: {error!r}"))
+                continue
+            for entry in group:
+                self.metrics.queue_latency.add(start - entry[4])
+            for (p1, p2, _, future, _, key), winner, rounds in zip(group, result.winner, result.rounds):
+                value = (int(winner), int(rounds))
+                if key is not None:
+                    self.cache.put(key, value)
+                    del self._queued[key]
+                if not future.done():  # the requesting connection may be gone
+                    future.set_result(value)
+            self.metrics.batches += 1
+            self.metrics.battles += len(group)
+            self.metrics.engine_time.add(end - start)
+
+    def close(self) -> None:
+        """Stop the engine thread once the running batch is done."""
+        self._executor.shutdown(wait=False)
+
+# ------------------------------------------------------------
+# Endpoints
+# ------------------------------------------------------------
+
+def _parse_build(row: dict, name: Optional[str] = None) -> Build:
+    """Build from a JSON object; HP is rounded as in `fitness`."""
+    try:
+        return Build(str(row.get("name", "")) if name is None else name, float(row["atk"]), float(row["defense"]),
+                     float(row["revenge"]), int(round(float(row["hp"]))), float(row["spd"]))
+    except KeyError as error:
+        raise ValueError(f"every build needs the fields name, atk, defense, revenge, hp, spd (missing {error})") from None
+
+def _parse_triple(payload: dict) -> tuple[Build, Build, Build]:
+    builds = payload.get("builds")
+    if not isinstance(builds, list) or len(builds) != 3:
+        raise ValueError("'builds' must be a list of the Offense, Balanced and Tank builds")
+    # fixed names: a triple whose builds share a name must still tell the winners apart
+    return tuple(_parse_build(row, name) for row, name in zip(builds, ("Offense", "Balanced", "Tank")))
+
+class BatchService:
+    """Endpoint handlers on top of a shared `MatchupBatcher`."""
+
+    def __init__(self, config: ServiceConfig = ServiceConfig()):
+        self.config = config
+        self.metrics = ServiceMetrics()
+        self.batcher = MatchupBatcher(config, self.metrics)
+
+    async def _rps_cycle(self, offense: Build, balanced: Build, tank: Build) -> tuple[bool, tuple[int, int, int]]:
+        """`test_rps_cycle` with the three matchups queued in the shared batcher."""
+        results = await self.batcher.resolve([(offense, tank), (tank, balanced), (balanced, offense)])
+        return all(winner == P1_WINS for winner, _ in results), tuple(rounds for _, rounds in results)
+
+    async def simulate(self, payload: dict) -> dict:
+        max_rounds = int(payload.get("max_rounds", 100))
+        pairs = [(_parse_build(p1), _parse_build(p2)) for p1, p2 in payload["pairs"]]
+        results = await self.batcher.resolve(pairs, max_rounds)
+        return {"results": [{"winner": None if winner == DRAW else (p1.name, p2.name)[winner], "rounds": rounds}
+                            for (p1, p2), (winner, rounds) in zip(pairs, results)]}
+
+    async def rps_cycle(self, payload: dict) -> dict:
+        is_rps, round_lengths = await self._rps_cycle(*_parse_triple(payload))
+        return {"is_rps": is_rps, "round_lengths": list(round_lengths)}
+
+    async def fitness(self, payload: dict) -> dict:
+        builds = _parse_triple(payload)
+        breakdown = fitness_breakdown(*builds, min_rounds=int(payload.get("min_rounds", 3)),
+                                      max_rounds=int(payload.get("max_rounds", 10)),
+                                      rps_result=await self._rps_cycle(*builds))
+        return {"fitness": breakdown.total, "out_of_range": breakdown.out_of_range, "rps": breakdown.rps,
+                "rounds": breakdown.rounds, "names": breakdown.names, "is_rps": breakdown.is_rps,
+                "round_lengths": list(breakdown.round_lengths)}
+
+    def close(self) -> None:
+        self.batcher.close()
+
+    def metrics_dict(self) -> dict:
+        metrics = self.metrics.to_dict()
+        if self.batcher.cache is not None:
+            cache = self.batcher.cache.stats()
+            metrics["cache"] = {"size": cache.size, "maxsize": cache.maxsize, "hit_rate": cache.hit_rate}
+        return metrics
+
+    async def handle(self, method: str, path: str, payload: Optional[dict]) -> tuple[int, dict]:
+        """(HTTP status, JSON response) of one request."""
+        endpoint = path.strip("/").split("?")[0]
+        if endpoint == "metrics" and method == "GET":
+            return 200, self.metrics_dict()
+        if endpoint not in ENDPOINTS:
+            return 404, {"error": f"unknown endpoint '{path}', available: /metrics, /{', /'.join(ENDPOINTS)}"}
+        if method != "POST":
+            return 405, {"error": f"/{endpoint} expects POST"}
+        self.metrics.requests[endpoint] += 1
+        try:
+            if not isinstance(payload, dict):
+                raise ValueError("request body must be a JSON object")
+            return 200, await getattr(self, endpoint)(payload)
+        except (KeyError, TypeError, ValueError) as error:
+            self.metrics.errors += 1
+            return 400, {"error": str(error)}
+        except Exception as error:
+            self.metrics.errors += 1
+            return 500, {"error": f"{type(error).__name__}: {error}"}
+
+    # ------------------------------------------------------------
+    # HTTP transport
+    # ------------------------------------------------------------
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Minimal HTTP/1.1 with keep-alive: one JSON request and response at a time."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    status, response = 413, {"error": f"request body larger than {MAX_BODY_BYTES} bytes"}
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    try:
+                        payload = json.loads(body) if body else None
+                    except json.JSONDecodeError as error:
+                        status, response = 400, {"error": f"invalid JSON: {error}"}
+                    else:
+                        status, response = await self.handle(method, path, payload)
+                data = json.dumps(response).encode()
+                close = headers.get("connection", "").lower() == "close" or status == 413
+                writer.write(f"HTTP/1.1 {status} {http.client.responses.get(status, '')}\r\n"
+                             f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                             f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765, unix_path: Optional[str] = None) -> asyncio.AbstractServer:
+        """Start listening on `host:port` (port 0: any free port) or on the Unix socket `unix_path`."""
+        if unix_path is not None:
+            return await asyncio.start_unix_server(self._serve_connection, path=unix_path)
+        return await asyncio.start_server(self._serve_connection, host, port)
+
+# ------------------------------------------------------------
+# Client
+# ------------------------------------------------------------
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+class BatchServiceClient:
+    """Blocking client of a running `BatchService`, keeping one connection open."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, unix_path: Optional[str] = None,
+                 timeout: Optional[float] = 60.0):
+        self._connection = (_UnixHTTPConnection(unix_path, timeout) if unix_path is not None
+                            else http.client.HTTPConnection(host, port, timeout=timeout))
+
+    def request(self, endpoint: str, payload: Optional[dict] = None) -> dict:
+        """Send one request; raises ValueError with the server's message on errors."""
+        body = None if payload is None else json.dumps(payload)
+        self._connection.request("GET" if payload is None else "POST", f"/{endpoint}", body=body,
+                                 headers={"Content-Type": "application/json"})
+        response = self._connection.getresponse()
+        data = json.loads(response.read())
+        if response.status != 200:
+            raise ValueError(f"/{endpoint}: {data.get('error', response.reason)}")
+        return data
+
+    def simulate(self, pairs: list[tuple[Build, Build]], max_rounds: int = 100) -> list[dict]:
+        from cli import builds_to_rows
+        return self.request("simulate", {"pairs": [builds_to_rows(pair) for pair in pairs],
+                                         "max_rounds": max_rounds})["results"]
+
+    def rps_cycle(self, offense: Build, balanced: Build, tank: Build) -> tuple[bool, tuple[int, int, int]]:
+        from cli import builds_to_rows
+        response = self.request("rps_cycle", {"builds": builds_to_rows((offense, balanced, tank))})
+        return response["is_rps"], tuple(response["round_lengths"])
+
+    def fitness(self, offense: Build, balanced: Build, tank: Build, min_rounds: int = 3, max_rounds: int = 10) -> float:
+        from cli import builds_to_rows
+        return self.request("fitness", {"builds": builds_to_rows((offense, balanced, tank)),
+                                        "min_rounds": min_rounds, "max_rounds": max_rounds})["fitness"]
+
+    def metrics(self) -> dict:
+        return self.request("metrics")
+
+    def close(self) -> None:
+        self._connection.close()
+
+# ------------------------------------------------------------
+# Entry point
+# ------------------------------------------------------------
+
+async def serve(config: ServiceConfig = ServiceConfig(), host: str = "127.0.0.1", port: int = 8765,
+                unix_path: Optional[str] = None) -> None:
+    """Run a `BatchService` until cancelled."""
+    service = BatchService(config)
+    server = await service.start(host, port, unix_path)
+    address = unix_path if unix_path is not None else "http://%s:%d" % server.sockets[0].getsockname()[:2]
+    print(f"Batch service ({config.engine} engine) listening on {address}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Serve batched battle simulations to local clients.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port (default: 8765)")
+    parser.add_argument("--unix", default=None, metavar="PATH", help="Listen on this Unix socket instead of TCP")
+    parser.add_argument("--engine", default="numpy", help="Battle engine: python, numpy or jit (see `battle_engines`)")
+    parser.add_argument("--max-batch", type=int, default=8192, help="Matchups per engine call that trigger it at once")
+    parser.add_argument("--max-delay-ms", type=float, default=2.0, help="Milliseconds a request waits for others")
+    parser.add_argument("--cache-size", type=int, default=2**20, help="Matchups in the shared cache (0: no cache)")
+    args = parser.parse_args(argv)
+    config = ServiceConfig(engine=args.engine, max_batch=args.max_batch, max_delay=args.max_delay_ms / 1e3,
+                           cache_size=args.cache_size)
+    get_engine(config.engine)  # fail before binding
+    try:
+        asyncio.run(serve(config, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
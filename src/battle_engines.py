@@ -0,0 +1,155 @@
+"""
+Registry of battle engines working on flat float64 stat arrays.
+
+Every engine takes the (N, 5) stats of both players (columns as in `batch_battle.STAT_COLUMNS`)
+and `max_rounds`, and returns a `BatchBattleResult`:
+- "python": plain round loop per battle, the reference implementation
+- "numpy":  lock-step NumPy engine `simulate_battles_batch`
+- "jit":    the same round loop compiled with Numba and cached to disk; runs as "python"
+            if Numba is not installed
+
+All engines resolve speed ties in row order with `random.random()`, so with a fixed
+`random.seed` they return identical results.
+"""
+
+# Standard library imports
+from importlib.util import find_spec
+from typing import Callable
+import numpy as np
+
+from batch_battle import ATK, DEF, REV, HP, SPD, DRAW, P1_WINS, P2_WINS, STAT_COLUMNS, BatchBattleResult, \
+    _simulate_tied_battle, simulate_battles_batch
+
+Engine = Callable[[np.ndarray, np.ndarray, int], BatchBattleResult]
+
+ENGINES: dict[str, Engine] = {}
+
+# Numba is optional; it is only imported the first time the "jit" engine runs
+JIT_AVAILABLE: bool = find_spec("numba") is not None
+
+# ------------------------------------------------------------
+# Registry
+# ------------------------------------------------------------
+
+def register_engine(name: str) -> Callable[[Engine], Engine]:
+    """Decorator that makes an engine selectable by name."""
+    def decorator(engine: Engine) -> Engine:
+        ENGINES[name] = engine
+        return engine
+    return decorator
+
+def get_engine(name: str) -> Engine:
+    """Return the engine registered under `name`."""
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown battle engine '{name}'. Available engines: {', '.join(ENGINES)}") from None
+
+# ------------------------------------------------------------
+# Round loop kernel
+# ------------------------------------------------------------
+
+def _battle_loop(stats1, stats2, max_rounds, winner, rounds, hp) -> None:
+    """
+    Round loop of `simulate_battle` over all battles with different speeds; tied rows are skipped.
+
+    Only uses `x[i][j]` indexing and scalar arithmetic, so it runs both on nested lists in
+    plain Python and on arrays in Numba's nopython mode.
+    """
+    for i in range(len(stats1)):
+        if stats1[i][SPD] > stats2[i][SPD]:
+            a_is_p1 = True
+            stats_a, stats_b = stats1[i], stats2[i]
+        elif stats2[i][SPD] > stats1[i][SPD]:
+            a_is_p1 = False
+            stats_a, stats_b = stats2[i], stats1[i]
+        else:
+            continue
+        code_a = P1_WINS if a_is_p1 else P2_WINS
+        code_b = P2_WINS if a_is_p1 else P1_WINS
+
+        hp_a = stats_a[HP]
+        hp_b = stats_b[HP]
+        dmg_a_to_b = max(0.0, stats_a[ATK] - stats_b[DEF])
+        dmg_b_to_a = max(0.0, stats_b[ATK] - stats_a[DEF])
+        result = DRAW
+        n_rounds = max_rounds
+        for round_idx in range(1, max_rounds + 1):
+            hp_b -= dmg_a_to_b
+            if hp_b <= 0:
+                result, n_rounds = code_a, round_idx
+                break
+            hp_a -= stats_b[REV]
+            if hp_a <= 0:
+                result, n_rounds = code_b, round_idx
+                break
+            hp_a -= dmg_b_to_a
+            if hp_a <= 0:
+                result, n_rounds = code_b, round_idx
+                break
+            hp_b -= stats_a[REV]
+            if hp_b <= 0:
+                result, n_rounds = code_a, round_idx
+                break
+
+        winner[i] = result
+        rounds[i] = n_rounds
+        hp[i][0] = hp_a if a_is_p1 else hp_b
+        hp[i][1] = hp_b if a_is_p1 else hp_a
+
+_jit_battle_loop = None
+
+def _load_jit_battle_loop():
+    """Compile `_battle_loop` with Numba on first use (cache=True: later processes load it from disk)."""
+    global _jit_battle_loop
+    if _jit_battle_loop is None:
+        if JIT_AVAILABLE:
+            import numba
+            _jit_battle_loop = numba.njit(cache=True)(_battle_loop)
+        else:
+            _jit_battle_loop = _battle_loop
+    return _jit_battle_loop
+
+def _resolve_ties(stats1: np.ndarray, stats2: np.ndarray, max_rounds: int, result: BatchBattleResult) -> BatchBattleResult:
+    """Resolve the speed-tied rows in row order with the scalar tie loop."""
+    for i in np.flatnonzero(~((stats1[:, SPD] > stats2[:, SPD]) | (stats2[:, SPD] > stats1[:, SPD]))):
+        result.winner[i], result.rounds[i], result.hp[i, 0], result.hp[i, 1] = \
+            _simulate_tied_battle(stats1[i], stats2[i], max_rounds)
+    return result
+
+def _as_stat_array(stats: np.ndarray) -> np.ndarray:
+    return np.ascontiguousarray(stats, dtype=np.float64).reshape(-1, len(STAT_COLUMNS))
+
+# ------------------------------------------------------------
+# Engines
+# ------------------------------------------------------------
+
+@register_engine("python")
+def python_engine(stats1: np.ndarray, stats2: np.ndarray, max_rounds: int = 100) -> BatchBattleResult:
+    """Reference engine: one Python round loop per battle."""
+    stats1, stats2 = _as_stat_array(stats1), _as_stat_array(stats2)
+    n_battles = len(stats1)
+    winner, rounds = [DRAW] * n_battles, [max_rounds] * n_battles
+    hp = np.stack([stats1[:, HP], stats2[:, HP]], axis=1).tolist()
+    _battle_loop(stats1.tolist(), stats2.tolist(), max_rounds, winner, rounds, hp)
+    result = BatchBattleResult(winner=np.array(winner, dtype=np.int8), rounds=np.array(rounds, dtype=np.int64),
+                               hp=np.array(hp, dtype=np.float64).reshape(-1, 2))
+    return _resolve_ties(stats1, stats2, max_rounds, result)
+
+@register_engine("numpy")
+def numpy_engine(stats1: np.ndarray, stats2: np.ndarray, max_rounds: int = 100) -> BatchBattleResult:
+    """Lock-step NumPy engine."""
+    return simulate_battles_batch(stats1, stats2, max_rounds)
+
+@register_engine("jit")
+def jit_engine(stats1: np.ndarray, stats2: np.ndarray, max_rounds: int = 100) -> BatchBattleResult:
+    """Numba-compiled round loop (plain Python if Numba is missing)."""
+    if not JIT_AVAILABLE:
+        return python_engine(stats1, stats2, max_rounds)
+    stats1, stats2 = _as_stat_array(stats1), _as_stat_array(stats2)
+    n_battles = len(stats1)
+    result = BatchBattleResult(winner=np.full(n_battles, DRAW, dtype=np.int8),
+                               rounds=np.full(n_battles, max_rounds, dtype=np.int64),
+                               hp=np.stack([stats1[:, HP], stats2[:, HP]], axis=1))
+    _load_jit_battle_loop()(stats1, stats2, max_rounds, result.winner, result.rounds, result.hp)
+    return _resolve_ties(stats1, stats2, max_rounds, result)
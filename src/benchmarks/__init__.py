@@ -0,0 +1,8 @@
+"""
+Throughput benchmarks for the battle simulator, the fitness function and the optimizer.
+
+Run from `src/` with `python -m benchmarks`; see `benchmarks.suite` for the measured cases.
+"""
+
+from benchmarks.suite import BenchmarkResult, Regression, BENCHMARKS, run_benchmarks, save_results, load_results, \
+    compare_results
@@ -0,0 +1,44 @@
+"""
+Command line entry point: `python -m benchmarks [--quick] [--output FILE] [--compare BASELINE]`.
+
+Exits with status 1 if any benchmark is slower than the baseline by more than `--threshold`.
+"""
+import argparse
+import sys
+
+from benchmarks.suite import BENCHMARKS, run_benchmarks, save_results, load_results, compare_results
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", "-o", default="benchmark_results.json", help="JSON file to write the results to")
+    parser.add_argument("--compare", "-c", default=None, help="JSON results of a previous run to compare against")
+    parser.add_argument("--threshold", "-t", type=float, default=0.1,
+                        help="Relative slowdown that counts as a regression (default: 0.1 = 10%%)")
+    parser.add_argument("--quick", action="store_true", help="Fewer repetitions and smaller optimizer runs")
+    parser.add_argument("--group", "-g", action="append", choices=list(BENCHMARKS), default=None,
+                        help="Benchmark group to run (repeatable, default: all)")
+    parser.add_argument("--filter", "-k", default=None, help="Only keep benchmarks whose name contains this string")
+    parser.add_argument("--list", action="store_true", help="List the benchmark groups and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name in BENCHMARKS:
+            print(name)
+        return 0
+
+    results = run_benchmarks(quick=args.quick, groups=args.group, name_filter=args.filter)
+    save_results(results, args.output)
+    print(f"Results written to {args.output}")
+
+    if args.compare is not None:
+        regressions = compare_results(load_results(args.compare), results, threshold=args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\nNo regressions beyond {args.threshold:.0%} compared to {args.compare}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
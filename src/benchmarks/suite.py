@@ -0,0 +1,271 @@
+"""
+Benchmark cases and the machinery to time, store and compare them.
+
+Every benchmark group is a function registered in `BENCHMARKS` that returns a list of
+`BenchmarkResult`s, each a throughput (items per second, higher is better):
+- battles:    `simulate_battle`, `resolve_battle_fast` and every battle engine on short and long fights,
+              and card-deck battles (`simulate_deck_battles`)
+- fitness:    `fitness` evaluations of the `default_stats`, `default_stats2` and `stats_from_matrix` presets
+- optimizer:  differential evolution generations of `optimize_builds` at several popsize/workers settings
+
+Results are written as JSON together with the commit they were measured on, so two runs can be
+compared with `compare_results`.
+"""
+
+# Standard library imports
+from contextlib import redirect_stdout
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timezone
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+from typing import Callable, Optional
+import numpy as np
+
+from pvp_balance_search import Build, simulate_battle, resolve_battle_fast, fitness, fitness_batch, optimize_builds
+from batch_battle import builds_to_array
+from battle_engines import ENGINES
+from deck_battle import DeckBuild, simulate_deck_battles
+from test_builds import default_stats, default_stats2, stats_from_matrix
+
+# ------------------------------------------------------------
+# Data structures
+# ------------------------------------------------------------
+
+@dataclass
+class BenchmarkResult:
+    """Best throughput of one benchmark case over `repeat` timed runs."""
+    name: str
+    rate: float           # items per second, best run
+    unit: str             # what an item is, e.g. "battles"
+    seconds: float        # duration of the best run
+    n_items: int          # items per run
+    repeat: int
+    params: dict = field(default_factory=dict)
+
+    def __str__(self):
+        return f"{self.name:50s} {self.rate:14,.1f} {self.unit}/s"
+
+@dataclass
+class Regression:
+    """A benchmark that got slower than its baseline by more than the threshold."""
+    name: str
+    baseline_rate: float
+    current_rate: float
+    unit: str
+
+    @property
+    def change(self) -> float:
+        """Relative change of the throughput (negative = slower)."""
+        return self.current_rate / self.baseline_rate - 1.0
+
+    def __str__(self):
+        return (f"{self.name}: {self.baseline_rate:,.1f} -> {self.current_rate:,.1f} {self.unit}/s "
+                f"({self.change:+.1%})")
+
+BENCHMARKS: dict[str, Callable[[bool], list[BenchmarkResult]]] = {}
+
+def register_benchmark(name: str):
+    """Decorator that adds a benchmark group to `BENCHMARKS`."""
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+# ------------------------------------------------------------
+# Timing
+# ------------------------------------------------------------
+
+def measure(name: str, func: Callable[[], object], n_items: int, unit: str, repeat: int = 5,
+            params: Optional[dict] = None) -> BenchmarkResult:
+    """
+    Time `func` (which processes `n_items` items per call) `repeat` times after one warm-up call.
+
+    The best run is reported, as it is the least disturbed by other load on the machine.
+    `random` is reseeded before every call so speed ties take the same path each time.
+    """
+    random.seed(0)
+    func()  # warm-up: imports, JIT compilation, caches
+    timings = []
+    for _ in range(repeat):
+        random.seed(0)
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return BenchmarkResult(name=name, rate=n_items / best, unit=unit, seconds=best, n_items=n_items,
+                           repeat=repeat, params=params or {})
+
+# ------------------------------------------------------------
+# Benchmark groups
+# ------------------------------------------------------------
+
+# (p1, p2) pairs: a fight that ends in the first round, and one that runs into the round limit
+FIGHTS: dict[str, tuple[Build, Build]] = {
+    "short": (Build("Offense", atk=10, defense=1, revenge=0, hp=6, spd=8),
+              Build("Tank", atk=2, defense=1, revenge=0.5, hp=6, spd=2)),
+    "long": (Build("Tank", atk=3.1, defense=3, revenge=0, hp=25, spd=2),
+             Build("Tank", atk=3.1, defense=3, revenge=0, hp=25, spd=1)),
+}
+
+PRESETS: dict[str, Callable[[], tuple[Build, Build, Build]]] = {
+    "default_stats": default_stats,
+    "default_stats2": default_stats2,
+    "stats_from_matrix": lambda: stats_from_matrix(scale_factor=1),
+}
+
+@register_benchmark("battles")
+def bench_battles(quick: bool = False) -> list[BenchmarkResult]:
+    """Battles per second of the scalar resolvers and the batch engines, for short and long fights."""
+    n_scalar = 200 if quick else 2000
+    n_batch = 2000 if quick else 20000
+    repeat = 3 if quick else 5
+    results = []
+    for length, (p1, p2) in FIGHTS.items():
+        params = {"fight": length, "rounds": simulate_battle(p1, p2)[0].rounds}
+        results.append(measure(f"battles/simulate_battle/{length}",
+                               lambda: [simulate_battle(p1, p2) for _ in range(n_scalar)],
+                               n_scalar, "battles", repeat, params))
+        results.append(measure(f"battles/resolve_battle_fast/{length}",
+                               lambda: [resolve_battle_fast(p1, p2) for _ in range(n_scalar)],
+                               n_scalar, "battles", repeat, params))
+        stats1 = np.repeat(builds_to_array([p1]), n_batch, axis=0)
+        stats2 = np.repeat(builds_to_array([p2]), n_batch, axis=0)
+        for engine_name, engine in ENGINES.items():
+            # the pure Python engine runs on fewer rows to keep the suite short
+            n_rows = n_scalar if engine_name == "python" else n_batch
+            results.append(measure(f"battles/engine_{engine_name}/{length}",
+                                   lambda: engine(stats1[:n_rows], stats2[:n_rows], 100),
+                                   n_rows, "battles", repeat, params))
+    deck_p1 = DeckBuild("Offense", [3, 4, 5, 6, 8], [1, 2, 3], revenge=0.5, hp=15, spd=3)
+    deck_p2 = DeckBuild("Tank", [2, 3, 4], [2, 3, 4, 5], revenge=1.0, hp=20, spd=3)
+    results.append(measure("battles/deck_battles", lambda: simulate_deck_battles(deck_p1, deck_p2, n_batch, seed=0),
+                           n_batch, "battles", repeat))
+    return results
+
+@register_benchmark("fitness")
+def bench_fitness(quick: bool = False) -> list[BenchmarkResult]:
+    """Fitness evaluations per second of the preset builds, scalar (loop and closed form) and batched."""
+    n_evals = 100 if quick else 1000
+    repeat = 3 if quick else 5
+    results = []
+    for preset_name, preset in PRESETS.items():
+        with redirect_stdout(io.StringIO()):
+            builds = preset()
+        params = {"preset": preset_name}
+        results.append(measure(f"fitness/loop/{preset_name}",
+                               lambda: [fitness(*builds, fast=False) for _ in range(n_evals)],
+                               n_evals, "evals", repeat, params))
+        results.append(measure(f"fitness/fast/{preset_name}",
+                               lambda: [fitness(*builds) for _ in range(n_evals)],
+                               n_evals, "evals", repeat, params))
+        vectors = np.repeat(builds_to_array(builds).reshape(1, -1), 10 * n_evals, axis=0)
+        results.append(measure(f"fitness/batch/{preset_name}", lambda: fitness_batch(vectors),
+                               len(vectors), "evals", repeat, params))
+    return results
+
+@register_benchmark("optimizer")
+def bench_optimizer(quick: bool = False) -> list[BenchmarkResult]:
+    """Differential evolution generations per second of `optimize_builds` for several settings."""
+    maxiter = 2 if quick else 5
+    repeat = 1 if quick else 3
+    settings = [
+        {"popsize": 5, "workers": 1, "vectorized": False},
+        {"popsize": 15, "workers": 1, "vectorized": False},
+        {"popsize": 15, "workers": 2, "vectorized": False},
+        {"popsize": 15, "workers": 1, "vectorized": True},
+    ]
+    if not quick:
+        settings.append({"popsize": 15, "workers": os.cpu_count() or 1, "vectorized": False})
+    ranges = dict(atk_ranges=[(1, 10)] * 3, def_ranges=[(1, 10)] * 3, rev_ranges=[(-2, 2)] * 3,
+                  hp_ranges=[(6, 23), (6, 24), (6, 25)], spd_ranges=[(0, 10)] * 3)
+    results = []
+    for setting in settings:
+        name = (f"optimizer/popsize_{setting['popsize']}/"
+                + ("vectorized" if setting["vectorized"] else f"workers_{setting['workers']}"))
+        generations = []
+
+        def run():
+            completed = []
+            with redirect_stdout(io.StringIO()):
+                optimize_builds(**ranges, maxiter=maxiter, seed=0, **setting,
+                                on_generation=lambda generation, best: completed.append(generation))
+            generations.append(len(completed))
+
+        result = measure(name, run, maxiter, "generations", repeat, dict(setting, maxiter=maxiter))
+        # DE can converge before maxiter; rate by the generations actually run
+        result.n_items = min(generations)
+        result.rate = result.n_items / result.seconds
+        results.append(result)
+    return results
+
+# ------------------------------------------------------------
+# Running, storing and comparing
+# ------------------------------------------------------------
+
+def run_benchmarks(quick: bool = False, groups: Optional[list[str]] = None, name_filter: Optional[str] = None,
+                   verbose: bool = True) -> list[BenchmarkResult]:
+    """
+    Run the benchmark groups.
+
+    Args:
+        quick: Fewer repetitions and smaller workloads (for smoke tests)
+        groups: Names of the groups in `BENCHMARKS` to run (default: all)
+        name_filter: Only keep benchmarks whose name contains this string
+        verbose: Print every result as it is measured
+
+    Returns:
+        List of all results
+    """
+    results = []
+    for group in groups or BENCHMARKS:
+        bench = BENCHMARKS[group]
+        for result in bench(quick):
+            if name_filter is not None and name_filter not in result.name:
+                continue
+            if verbose:
+                print(result)
+            results.append(result)
+    return results
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def save_results(results: list[BenchmarkResult], path: str) -> dict:
+    """Write results with commit, machine and timestamp metadata to a JSON file."""
+    data = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "results": [asdict(result) for result in results],
+    }
+    with open(path, "w") as file:
+        json.dump(data, file, indent=2)
+    return data
+
+def load_results(path: str) -> list[BenchmarkResult]:
+    """Read the results of a JSON file written by `save_results`."""
+    with open(path) as file:
+        data = json.load(file)
+    return [BenchmarkResult(**result) for result in data["results"]]
+
+def compare_results(baseline: list[BenchmarkResult], current: list[BenchmarkResult],
+                    threshold: float = 0.1) -> list[Regression]:
+    """
+    Find benchmarks whose throughput dropped by more than `threshold` (relative) since `baseline`.
+    Benchmarks present in only one of the runs are ignored.
+    """
+    baseline_rates = {result.name: result.rate for result in baseline}
+    return [Regression(result.name, baseline_rates[result.name], result.rate, result.unit)
+            for result in current
+            if result.name in baseline_rates and result.rate < (1.0 - threshold) * baseline_rates[result.name]]
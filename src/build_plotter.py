@@ -3,7 +3,7 @@ Plot a build's parameters: ATK, DEF, REV, HP, SPD in a radar chart.
 Given three named builds, plot them next to each other for comparison.
 """
 
-import matplotlib.pyplot as plt
+from typing import Optional
 import numpy as np
 
 ARCHETYPE_TO_COLOR: dict[str, str] = {
@@ -12,7 +12,7 @@ ARCHETYPE_TO_COLOR: dict[str, str] = {
     "Tank": "#3375FF",     # Blue
 }
 
-def plot_build_radar(ax: plt.Axes, build: "Build", max_values: tuple[int, int, int, int, int], color: str|None = None) -> None:
+def plot_build_radar(ax: "plt.Axes", build: "Build", max_values: tuple[int, int, int, int, int], color: str|None = None) -> None:
     """
     Plot a build's parameters: ATK, DEF, REV, HP, SPD in a radar chart.
     
@@ -37,18 +37,19 @@ def plot_build_radar(ax: plt.Axes, build: "Build", max_values: tuple[int, int, i
     ax.set_theta_offset(np.pi / 2)
     ax.set_theta_direction(-1)
 
-    plt.xticks(angles[:-1], labels)
+    ax.set_xticks(angles[:-1], labels)
 
     ax.plot(angles, stats, color=color, linewidth=2, linestyle='solid', label=build.name)
     ax.fill(angles, stats, color=color, alpha=0.25)
     ax.set_title(build.name)
 
 
-def plot_builds(builds: list["Build"]) -> None:
+def plot_builds(builds: list["Build"], path: Optional[str] = None) -> None:
     """
     Plot multiple builds in a radar chart for comparison.
-    Each drawn on the same axes.
+    Each drawn on the same axes. With a `path`, the figure is saved there instead of shown.
     """
+    import matplotlib.pyplot as plt  # imported here: slow, and only needed for plotting
     num_builds = len(builds)
     # max_atk = max(build.atk for build in builds)
     # max_def = max(build.defense for build in builds)
@@ -56,10 +57,14 @@ def plot_builds(builds: list["Build"]) -> None:
     # max_hp = max(build.hp for build in builds)
     # max_spd = max(build.spd for build in builds)
     # max_values = (max_atk, max_def, max_rev, max_hp, max_spd)
-    max_values = (1, 1, 1, 1)
+    max_values = (1, 1, 1, 1, 1)
 
     fig, axs = plt.subplots(1, 1, subplot_kw=dict(polar=True), figsize=(5 * num_builds, 5))
     for build in builds:
         color = ARCHETYPE_TO_COLOR.get(build.name, None)
         plot_build_radar(axs, build, max_values, color)
-    plt.show()
+    if path is not None:
+        fig.savefig(path)
+        plt.close(fig)
+    else:
+        plt.show()
@@ -0,0 +1,242 @@
+"""
+Command line entry point `battle-builder` (or `python cli.py`) with the subcommands:
+- simulate: resolve battles between builds read from JSON or CSV files
+- optimize: search an RPS build triple with `optimize_builds`
+- sweep:    vary one stat of a triple and report fitness and cycle validity per value
+- plot:     radar chart of builds, saved to a file
+
+Build files are CSV with the header `name,atk,defense,revenge,hp,spd` or JSON with a list
+of objects with these keys. Modules are imported inside the subcommands, so `simulate`
+only loads NumPy and the battle engines (not SciPy or matplotlib) and starts quickly.
+"""
+
+# Standard library imports
+import argparse
+import csv
+import json
+import random
+import sys
+from typing import Optional
+import numpy as np
+
+BUILD_FIELDS: tuple[str, ...] = ("name", "atk", "defense", "revenge", "hp", "spd")
+ARCHETYPES: tuple[str, ...] = ("Offense", "Balanced", "Tank")
+# stat ranges of `optimize` for [Offense, Balanced, Tank], as in `run_optimization`
+DEFAULT_RANGES: dict[str, list[tuple[float, float]]] = {
+    "atk_ranges": [(1, 10)] * 3,
+    "def_ranges": [(1, 10)] * 3,
+    "rev_ranges": [(-2, 2)] * 3,
+    "hp_ranges": [(6, 23), (6, 24), (6, 25)],
+    "spd_ranges": [(0, 10)] * 3,
+}
+
+# ------------------------------------------------------------
+# Build files
+# ------------------------------------------------------------
+
+def load_builds(path: str) -> tuple[list[str], np.ndarray]:
+    """
+    Read builds from a JSON or CSV file (by extension; "-" reads CSV from stdin).
+
+    Returns:
+        (names, (N, 5) float64 stats in the column order of `batch_battle.STAT_COLUMNS`)
+    """
+    if path.endswith(".json"):
+        with open(path) as file:
+            rows = json.load(file)
+        rows = rows["builds"] if isinstance(rows, dict) else rows
+    else:
+        file = sys.stdin if path == "-" else open(path, newline="")
+        try:
+            rows = list(csv.DictReader(file))
+        finally:
+            if file is not sys.stdin:
+                file.close()
+    try:
+        names = [str(row.get("name", i)) for i, row in enumerate(rows)]
+        stats = np.array([[float(row[stat]) for stat in BUILD_FIELDS[1:]] for row in rows], dtype=np.float64)
+    except KeyError as error:
+        raise ValueError(f"{path}: every build needs the fields {', '.join(BUILD_FIELDS)} (missing {error})") from None
+    return names, stats.reshape(-1, 5)
+
+def builds_to_rows(builds) -> list[dict]:
+    """JSON-serializable rows of `Build`s, readable by `load_builds`."""
+    return [{"name": build.name, "atk": float(build.atk), "defense": float(build.defense),
+             "revenge": float(build.revenge), "hp": int(build.hp), "spd": float(build.spd)} for build in builds]
+
+def _load_triple(path: str):
+    """Offense, Balanced and Tank of a build file (by name if present, else the first three)."""
+    from pvp_balance_search import Build
+    names, stats = load_builds(path)
+    order = [names.index(name) for name in ARCHETYPES] if set(ARCHETYPES) <= set(names) else [0, 1, 2]
+    if len(stats) < 3:
+        raise ValueError(f"{path}: need three builds (Offense, Balanced, Tank), found {len(stats)}")
+    return tuple(Build(ARCHETYPES[k], *stats[i, :3], int(round(stats[i, 3])), stats[i, 4]) for k, i in enumerate(order))
+
+def _parse_values(text: str) -> np.ndarray:
+    """Values of a START:STOP:STEP range (STOP included)."""
+    try:
+        start, stop, step = (float(value) for value in text.split(":"))
+    except ValueError:
+        raise ValueError(f"--values must be START:STOP:STEP with three numbers, got '{text}'") from None
+    if not step > 0:
+        raise ValueError(f"--values STEP must be positive, got {step:g}")
+    if stop < start:
+        raise ValueError(f"--values STOP ({stop:g}) must not be smaller than START ({start:g})")
+    return np.arange(start, stop + step / 2, step)
+
+def _write_rows(rows: list[dict], output: Optional[str], fmt: str) -> None:
+    file = sys.stdout if output is None else open(output, "w", newline="")
+    try:
+        if fmt == "json":
+            json.dump(rows, file, indent=1)
+            file.write("\n")
+        elif rows:
+            writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    finally:
+        if file is not sys.stdout:
+            file.close()
+
+# ------------------------------------------------------------
+# Subcommands
+# ------------------------------------------------------------
+
+def cmd_simulate(args: argparse.Namespace) -> int:
+    from batch_battle import DRAW, P1_WINS
+    from battle_engines import get_engine
+    names, stats = load_builds(args.builds)
+    if args.against is not None:
+        # row-wise pairs; a single opponent plays every build
+        other_names, other_stats = load_builds(args.against)
+        if len(other_stats) == 1:
+            other_names, other_stats = other_names * len(stats), np.repeat(other_stats, len(stats), axis=0)
+        if len(other_stats) != len(stats):
+            raise ValueError(f"{args.against} has {len(other_stats)} builds, {args.builds} has {len(stats)}")
+        first, second = np.arange(len(stats)), np.arange(len(stats))
+        names2, stats2 = other_names, other_stats
+    else:
+        # every pair of builds once
+        first, second = np.triu_indices(len(stats), k=1)
+        names2, stats2 = names, stats
+    if args.seed is not None:
+        random.seed(args.seed)
+    result = get_engine(args.engine)(stats[first], stats2[second], args.max_rounds)
+    rows = [{"p1": names[i], "p2": names2[j],
+             "winner": "draw" if code == DRAW else names[i] if code == P1_WINS else names2[j],
+             "rounds": int(n_rounds), "hp1": float(hp1), "hp2": float(hp2)}
+            for i, j, code, n_rounds, (hp1, hp2) in zip(first, second, result.winner, result.rounds, result.hp)]
+    _write_rows(rows, args.output, args.format)
+    return 0
+
+def cmd_optimize(args: argparse.Namespace) -> int:
+    from pvp_balance_search import optimize_builds, test_rps_cycle, proper_strategy_names, fitness
+    options = {}
+    if args.robust:
+        from robustness import RobustnessConfig
+        options["robustness"] = RobustnessConfig(n_variants=args.robust)
+    builds = optimize_builds(**DEFAULT_RANGES, maxiter=args.maxiter, popsize=args.popsize, workers=args.workers,
+                             seed=args.seed, vectorized=args.vectorized, engine=args.engine,
+                             initial_builds=_load_triple(args.initial) if args.initial is not None else None,
+                             checkpoint_path=args.checkpoint, resume_from=args.resume, **options)
+    for build in builds:
+        print(build)
+    is_rps, rounds = test_rps_cycle(*builds)
+    print(f"Valid strategy names: {proper_strategy_names(*builds)}, RPS cycle: {is_rps} (rounds: {rounds}), "
+          f"fitness: {fitness(*builds):.4f}")
+    if args.output is not None:
+        _write_rows(builds_to_rows(builds), args.output, "json" if args.output.endswith(".json") else "csv")
+    return 0
+
+def cmd_sweep(args: argparse.Namespace) -> int:
+    from pvp_balance_search import fitness_batch, proper_strategy_names, test_rps_cycle, _params_to_builds
+    values = _parse_values(args.values)
+    builds = _load_triple(args.builds)
+    build, stat = ARCHETYPES.index(args.build), BUILD_FIELDS[1:].index(args.stat)
+    params = np.tile([float(getattr(b, field)) for b in builds for field in BUILD_FIELDS[1:]], (len(values), 1))
+    params[:, 5 * build + stat] = values
+    if args.seed is not None:
+        random.seed(args.seed)
+    scores = fitness_batch(params, engine=args.engine)
+    rows = []
+    for value, score, x in zip(values, scores, params):
+        triple = _params_to_builds(x)
+        is_rps, rounds = test_rps_cycle(*triple, engine=args.engine)
+        rows.append({args.stat: float(value), "fitness": float(score), "rps_cycle": is_rps,
+                     "proper_names": proper_strategy_names(*triple),
+                     "rounds_ot": rounds[0], "rounds_tb": rounds[1], "rounds_bo": rounds[2]})
+    _write_rows(rows, args.output, args.format)
+    return 0
+
+def cmd_plot(args: argparse.Namespace) -> int:
+    import matplotlib
+    matplotlib.use("Agg")
+    from build_plotter import plot_builds
+    from pvp_balance_search import Build
+    names, stats = load_builds(args.builds)
+    plot_builds([Build(name, *row[:3], int(round(row[3])), row[4]) for name, row in zip(names, stats)],
+                path=args.output)
+    print(f"Plot written to {args.output}")
+    return 0
+
+# ------------------------------------------------------------
+# Entry point
+# ------------------------------------------------------------
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="battle-builder", description="Simulate, optimize and plot battle builds.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    simulate = subparsers.add_parser("simulate", help="Resolve battles between builds from JSON/CSV files")
+    simulate.add_argument("builds", help="Build file (.json or .csv, '-' for CSV on stdin)")
+    simulate.add_argument("--against", "-a", default=None,
+                          help="Second build file: battle row i of both files (or every build against its single build) "
+                               "instead of every pair of `builds`")
+    simulate.set_defaults(func=cmd_simulate)
+
+    optimize = subparsers.add_parser("optimize", help="Optimize an RPS triple with differential evolution")
+    optimize.add_argument("--maxiter", type=int, default=100, help="Generations (default: 100)")
+    optimize.add_argument("--popsize", type=int, default=15, help="Population size multiplier (default: 15)")
+    optimize.add_argument("--workers", type=int, default=-1, help="Worker processes (default: all CPUs)")
+    optimize.add_argument("--vectorized", action="store_true", help="Evaluate generations with `fitness_batch`")
+    optimize.add_argument("--robust", type=int, default=0, metavar="N",
+                          help="Also maximize robustness over N perturbed variants (implies --vectorized)")
+    optimize.add_argument("--initial", default=None, help="Build file with the Offense/Balanced/Tank seed triple")
+    optimize.add_argument("--checkpoint", default=None, help="Save the solver state to this .npz file")
+    optimize.add_argument("--resume", default=None, help="Continue the run saved in this checkpoint")
+    optimize.add_argument("--output", "-o", default=None, help="Write the optimized builds to this .json/.csv file")
+    optimize.set_defaults(func=cmd_optimize)
+
+    sweep = subparsers.add_parser("sweep", help="Vary one stat of a triple and report fitness and cycle validity")
+    sweep.add_argument("builds", help="Build file with the Offense, Balanced and Tank builds")
+    sweep.add_argument("--build", choices=ARCHETYPES, required=True, help="Build whose stat is varied")
+    sweep.add_argument("--stat", choices=BUILD_FIELDS[1:], required=True, help="Stat to vary")
+    sweep.add_argument("--values", required=True, metavar="START:STOP:STEP", help="Values to try (STOP included)")
+    sweep.set_defaults(func=cmd_sweep)
+
+    plot = subparsers.add_parser("plot", help="Radar chart of builds")
+    plot.add_argument("builds", help="Build file (.json or .csv)")
+    plot.add_argument("--output", "-o", default="builds.png", help="Image file (default: builds.png)")
+    plot.set_defaults(func=cmd_plot)
+
+    for subparser in (simulate, optimize, sweep):
+        subparser.add_argument("--engine", default=None if subparser is optimize else "numpy",
+                               help="Battle engine: python, numpy or jit (see `battle_engines`)")
+        subparser.add_argument("--seed", type=int, default=None, help="Random seed")
+    simulate.add_argument("--max-rounds", type=int, default=100, help="Rounds before a draw (default: 100)")
+    for subparser in (simulate, sweep):
+        subparser.add_argument("--format", "-f", choices=("csv", "json"), default="csv", help="Output format")
+        subparser.add_argument("--output", "-o", default=None, help="Output file (default: stdout)")
+    return parser
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, ValueError) as error:
+        print(f"battle-builder {args.command}: {error}", file=sys.stderr)
+        return 2
+
+if __name__ == "__main__":
+    sys.exit(main())
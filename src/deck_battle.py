@@ -0,0 +1,201 @@
+"""
+Card-deck PvP battles as described in the rulebook (Monster Battles, Deck Management Rules).
+
+Instead of fixed ATK and DEF stats, every player has an attack deck and a defense deck. When
+a player attacks, they play the top card of their attack deck; the defender draws the top
+card of their defense deck and blocks that much damage. Revenge, HP, speed and the step order
+(primary, revenge, primary, revenge) are the same as in `simulate_battle`. Every battle starts
+with both decks shuffled, and an exhausted deck is reshuffled.
+
+Decks are stored as small integer arrays: the card values of a deck, one row of card indices
+per battle holding that battle's shuffled order (a permutation), and a draw pointer per
+battle. `simulate_deck_battles` runs N battles of one matchup in lock-step on these arrays,
+so no per-card Python objects are created, and counts how often each card was played.
+
+Randomness (shuffles and speed ties) comes from a `numpy.random.Generator`, so results are
+reproducible for a given `seed` (and `chunk_size`).
+"""
+
+# Standard library imports
+from dataclasses import dataclass
+from typing import Optional, Sequence
+import numpy as np
+
+from batch_battle import DRAW, P1_WINS, P2_WINS, BatchBattleResult
+from pvp_balance_search import BattleResult, _battle_results
+
+# ------------------------------------------------------------
+# Data structures
+# ------------------------------------------------------------
+
+@dataclass
+class DeckBuild:
+    """A player with an attack deck and a defense deck instead of ATK and DEF."""
+    name: str
+    attack_deck: Sequence[int]   # damage of each attack card
+    defense_deck: Sequence[int]  # block of each defense card
+    revenge: float = 0.0
+    hp: int = 20
+    spd: float = 0.0
+
+    def __str__(self):
+        return (f"{self.name}(ATK deck: {list(self.attack_deck)}, DEF deck: {list(self.defense_deck)}, "
+                f"REV: {self.revenge}, HP: {self.hp}, SPD: {self.spd})")
+
+@dataclass
+class DeckBattleResult(BatchBattleResult):
+    """
+    Outcome of N deck battles of one matchup, plus how often each card was played.
+
+    `attack_usage[p][k]` counts how often player p (0 = p1, 1 = p2) played attack card k,
+    `defense_usage[p][k]` how often they blocked with defense card k, over all battles.
+    Cards are counted when they are resolved, not when a battle ends before their step.
+    """
+    attack_usage: tuple[np.ndarray, np.ndarray]
+    defense_usage: tuple[np.ndarray, np.ndarray]
+
+    def battle_results(self, p1: DeckBuild, p2: DeckBuild) -> list[BattleResult]:
+        """Per-battle `BattleResult`s with the winner's name, as returned by `resolve_battles`."""
+        return _battle_results([(p1, p2)] * len(self), self)
+
+    def win_rates(self) -> tuple[float, float, float]:
+        """Fraction of battles won by p1, won by p2 and drawn."""
+        return (float(np.mean(self.winner == P1_WINS)), float(np.mean(self.winner == P2_WINS)),
+                float(np.mean(self.winner == DRAW)))
+
+# ------------------------------------------------------------
+# Array-backed decks
+# ------------------------------------------------------------
+
+class BatchDeck:
+    """
+    One deck of the same player in N battles.
+
+    Args:
+        values: Value of each card (damage or block)
+        n_battles: Number of battles sharing the deck list
+        rng: Generator used for all shuffles
+    """
+
+    def __init__(self, values: Sequence[int], n_battles: int, rng: np.random.Generator):
+        card_values = np.asarray(values)
+        if card_values.ndim != 1 or card_values.size == 0:
+            raise ValueError(f"A deck needs at least one card, got {values!r}")
+        limits = np.iinfo(np.int16)
+        if (not np.issubdtype(card_values.dtype, np.number) or np.any(card_values != np.round(card_values))
+                or card_values.min() < limits.min or card_values.max() > limits.max):
+            raise ValueError(f"Card values must be integers in [{limits.min}, {limits.max}], got {values!r}")
+        self.values = card_values.astype(np.int16)
+        self.rng = rng
+        n_cards = len(self.values)
+        # card indices in draw order per battle; int8 is enough for any realistic deck
+        index_dtype = np.int8 if n_cards <= np.iinfo(np.int8).max else np.int16
+        self.order = rng.permuted(np.broadcast_to(np.arange(n_cards, dtype=index_dtype), (n_battles, n_cards)),
+                                  axis=1)
+        self.pointer = np.zeros(n_battles, dtype=np.int16)
+        self.usage = np.zeros(n_cards, dtype=np.int64)
+
+    def draw(self, rows: np.ndarray) -> np.ndarray:
+        """Draw the top card in each of the battles `rows`; exhausted decks are reshuffled first."""
+        exhausted = rows[self.pointer[rows] == len(self.values)]
+        if exhausted.size:
+            self.order[exhausted] = self.rng.permuted(self.order[exhausted], axis=1)
+            self.pointer[exhausted] = 0
+        cards = self.order[rows, self.pointer[rows]]
+        self.pointer[rows] += 1
+        self.usage += np.bincount(cards, minlength=len(self.values))
+        return self.values[cards]
+
+# ------------------------------------------------------------
+# Battle engine
+# ------------------------------------------------------------
+
+def _simulate_chunk(p1: DeckBuild, p2: DeckBuild, n_battles: int, max_rounds: int, rng: np.random.Generator,
+                    attack_decks: list[BatchDeck], defense_decks: list[BatchDeck]) -> BatchBattleResult:
+    """Lock-step round loop over `n_battles` battles with freshly shuffled decks."""
+    revenge = np.array([p1.revenge, p2.revenge], dtype=np.float64)
+    winner = np.full(n_battles, DRAW, dtype=np.int8)
+    rounds = np.full(n_battles, max_rounds, dtype=np.int64)
+    hp = np.tile(np.array([p1.hp, p2.hp], dtype=np.float64), (n_battles, 1))
+
+    def primary(rows: np.ndarray, attacker: np.ndarray) -> np.ndarray:
+        """Damage of the attackers' top attack cards after the defenders' top defense cards."""
+        damage = np.empty(len(rows), dtype=np.float64)
+        for player in (0, 1):
+            mask = attacker == player
+            if mask.any():
+                attack = attack_decks[player].draw(rows[mask])
+                block = defense_decks[1 - player].draw(rows[mask])
+                damage[mask] = np.maximum(0, attack - block)
+        return damage
+
+    active = np.arange(n_battles)
+    for round_idx in range(1, max_rounds + 1):
+        if active.size == 0:
+            break
+        if p1.spd > p2.spd:
+            a = np.zeros(len(active), dtype=np.int8)
+        elif p2.spd > p1.spd:
+            a = np.ones(len(active), dtype=np.int8)
+        else:
+            a = (rng.random(len(active)) >= 0.5).astype(np.int8)  # coin flip per battle and round
+        b = 1 - a
+        # (target, damage) of the four steps; each step is applied to the battles still running
+        for step in range(4):
+            if step == 0:    # a primary hits b
+                target, damage = b, primary(active, a)
+            elif step == 1:  # b deals revenge to a
+                target, damage = a, revenge[b]
+            elif step == 2:  # b primary hits a
+                target, damage = a, primary(active, b)
+            else:            # a deals revenge to b
+                target, damage = b, revenge[a]
+            hp[active, target] -= damage
+            dead = hp[active, target] <= 0
+            winner[active[dead]] = 1 - target[dead]
+            rounds[active[dead]] = round_idx
+            keep = ~dead
+            active, a, b = active[keep], a[keep], b[keep]
+    return BatchBattleResult(winner=winner, rounds=rounds, hp=hp)
+
+def simulate_deck_battles(p1: DeckBuild, p2: DeckBuild, n_battles: int, max_rounds: int = 100,
+                          seed: Optional[int] = None, chunk_size: int = 100_000) -> DeckBattleResult:
+    """
+    Simulate `n_battles` independent deck battles between `p1` and `p2`.
+
+    Args:
+        p1, p2: The two players
+        n_battles: Number of battles
+        max_rounds: Rounds after which a battle ends in a draw
+        seed: Seed of the generator used for shuffles and speed ties
+        chunk_size: Battles simulated at once; bounds the memory of the deck arrays
+
+    Returns:
+        DeckBattleResult with winner, round count and final HP of every battle and the card
+        usage counts of both players
+    """
+    rng = np.random.default_rng(seed)
+    usage = {"attack": [np.zeros(len(p.attack_deck), dtype=np.int64) for p in (p1, p2)],
+             "defense": [np.zeros(len(p.defense_deck), dtype=np.int64) for p in (p1, p2)]}
+    chunks = []
+    for start in range(0, n_battles, chunk_size):
+        size = min(chunk_size, n_battles - start)
+        attack_decks = [BatchDeck(p.attack_deck, size, rng) for p in (p1, p2)]
+        defense_decks = [BatchDeck(p.defense_deck, size, rng) for p in (p1, p2)]
+        chunks.append(_simulate_chunk(p1, p2, size, max_rounds, rng, attack_decks, defense_decks))
+        for player in (0, 1):
+            usage["attack"][player] += attack_decks[player].usage
+            usage["defense"][player] += defense_decks[player].usage
+
+    return DeckBattleResult(
+        winner=np.concatenate([chunk.winner for chunk in chunks] or [np.zeros(0, dtype=np.int8)]),
+        rounds=np.concatenate([chunk.rounds for chunk in chunks] or [np.zeros(0, dtype=np.int64)]),
+        hp=np.concatenate([chunk.hp for chunk in chunks] or [np.zeros((0, 2))]),
+        attack_usage=tuple(usage["attack"]),
+        defense_usage=tuple(usage["defense"]),
+    )
+
+def simulate_deck_battle(p1: DeckBuild, p2: DeckBuild, max_rounds: int = 100,
+                         seed: Optional[int] = None) -> BattleResult:
+    """Simulate a single deck battle; see `simulate_deck_battles`."""
+    return simulate_deck_battles(p1, p2, 1, max_rounds, seed).battle_results(p1, p2)[0]
@@ -0,0 +1,388 @@
+"""
+Monte Carlo simulation of complete games (rulebook: Game Flow, Victory Conditions).
+
+A game has 9 rounds. In every round, teams of two players draw 3 monster cards, one team
+member's policy picks one, the team fights it with `simulate_monster_battle`, and every player
+spends their skill tokens in the shop. After rounds 3, 6 and 9, all players fight PvP
+battles. Defeating a monster is worth 1 VP per team member, winning a PvP battle 2 VP.
+
+Players are `Build`s. The shop sells stat upgrades standing in for cards: +1 ATK (attack
+card), +1 DEF (defense card), +5 HP and +1 SPD (stamina). Skill tokens of all types go into
+one pool (System A, unified tokens). Decisions are made by pluggable policies registered by
+name in `POLICIES`, so they can be sent to worker processes.
+
+`run_games` splits a number of independently seeded games into chunks, plays the chunks in
+a process pool and aggregates the per-game VP into `GameStats` (games/sec, VP spread and
+how often the early leader wins, to check runaway-leader mitigation).
+"""
+
+# Standard library imports
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from functools import partial
+import random
+import time
+from typing import Callable, Optional, Sequence
+import numpy as np
+
+from monster_battle import DIFFICULTY_TIERS, Monster, simulate_monster_battle
+from pvp_balance_search import Build, resolve_battle_fast
+from tournament import rotation_pairings
+
+# ------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------
+
+N_ROUNDS: int = 9
+PVP_ROUNDS: tuple[int, ...] = (3, 6, 9)
+MONSTER_VP: int = 1
+PVP_VP: int = 2
+# PvP rewards, option A: (winner, loser) skill tokens
+PVP_TOKENS: tuple[int, int] = (4, 2)
+MONSTERS_DRAWN: int = 3
+
+# starting deck: attack cards 2-4, defense cards 2-4, 20 HP
+STARTING_BUILD = Build("Player", atk=3, defense=3, revenge=0, hp=20, spd=4)
+
+@dataclass(frozen=True)
+class ShopItem:
+    """A purchasable upgrade of one stat."""
+    stat: str
+    amount: float
+    cost: int
+    max_purchases: Optional[int] = None
+
+SHOP: dict[str, ShopItem] = {
+    "atk": ShopItem("atk", 1, cost=4),
+    "defense": ShopItem("defense", 1, cost=4),
+    "hp": ShopItem("hp", 5, cost=3, max_purchases=4),   # at most +20 HP
+    "spd": ShopItem("spd", 1, cost=4, max_purchases=3),  # at most +15 stamina
+}
+
+MONSTER_DECK: list[Monster] = [monster for tier, difficulty in DIFFICULTY_TIERS.items()
+                               for monster in difficulty.monsters(tier.capitalize())]
+
+# ------------------------------------------------------------
+# Data structures
+# ------------------------------------------------------------
+
+@dataclass
+class PlayerState:
+    """A player during a game."""
+    index: int
+    build: Build
+    policy: "Policy"
+    vp: int = 0
+    tokens: int = 0
+    purchases: dict[str, int] = field(default_factory=dict)
+    monsters_defeated: int = 0
+    pvp_wins: int = 0
+
+    def can_buy(self, item_name: str) -> bool:
+        item = SHOP[item_name]
+        bought = self.purchases.get(item_name, 0)
+        return self.tokens >= item.cost and (item.max_purchases is None or bought < item.max_purchases)
+
+    def buy(self, item_name: str) -> None:
+        item = SHOP[item_name]
+        self.tokens -= item.cost
+        self.purchases[item_name] = self.purchases.get(item_name, 0) + 1
+        value = getattr(self.build, item.stat) + item.amount
+        self.build = replace(self.build, **{item.stat: int(value) if item.stat == "hp" else value})
+
+@dataclass
+class GameBatch:
+    """Results of G games with P players."""
+    vp: np.ndarray          # (G, P) final VP
+    vp_history: np.ndarray  # (G, len(PVP_ROUNDS), P) VP after each PvP phase
+    tokens: np.ndarray      # (G, P) unspent skill tokens at the end
+    monster_wins: np.ndarray  # (G, P) monsters defeated
+    pvp_wins: np.ndarray      # (G, P) PvP battles won
+    winner: np.ndarray      # (G,) index of the winner (most VP, then most tokens), -1 if still tied
+
+    def __len__(self) -> int:
+        return len(self.vp)
+
+@dataclass
+class GameStats:
+    """Aggregated statistics of `run_games`."""
+    batch: GameBatch
+    policies: tuple[str, ...]
+    seconds: float
+
+    @property
+    def n_games(self) -> int:
+        return len(self.batch)
+
+    @property
+    def games_per_second(self) -> float:
+        return self.n_games / self.seconds if self.seconds > 0 else float("inf")
+
+    @property
+    def vp_spread(self) -> np.ndarray:
+        """Difference between the highest and the lowest final VP of each game."""
+        return self.batch.vp.max(axis=1) - self.batch.vp.min(axis=1)
+
+    def close_game_rate(self, max_spread: int = 3) -> float:
+        """Fraction of games whose final VP are within `max_spread` (the rulebook's 3-4 VP goal)."""
+        return float(np.mean(self.vp_spread <= max_spread))
+
+    def early_leader_win_rate(self) -> float:
+        """Fraction of games won by the sole VP leader after the first PvP phase (of the games that had one)."""
+        after_first = self.batch.vp_history[:, 0]
+        leader = after_first.argmax(axis=1)
+        sole_leader = (after_first == after_first.max(axis=1, keepdims=True)).sum(axis=1) == 1
+        if not sole_leader.any():
+            return float("nan")
+        return float(np.mean(self.batch.winner[sole_leader] == leader[sole_leader]))
+
+    def win_rates(self) -> np.ndarray:
+        """Win rate of each seat."""
+        return np.array([np.mean(self.batch.winner == seat) for seat in range(self.batch.vp.shape[1])])
+
+    def __str__(self):
+        spread = self.vp_spread
+        seats = ", ".join(f"{policy} {vp:.2f} VP / {rate:.1%} wins"
+                          for policy, vp, rate in zip(self.policies, self.batch.vp.mean(axis=0), self.win_rates()))
+        return (f"{self.n_games} games in {self.seconds:.2f} s ({self.games_per_second:,.1f} games/s)\n"
+                f"  seats: {seats}\n"
+                f"  VP spread: mean {spread.mean():.2f}, std {spread.std():.2f}, "
+                f"median {np.median(spread):.0f}, 90th percentile {np.percentile(spread, 90):.0f}\n"
+                f"  close games (spread <= 3): {self.close_game_rate():.1%}, "
+                f"early leader wins: {self.early_leader_win_rate():.1%}")
+
+# ------------------------------------------------------------
+# Policies
+# ------------------------------------------------------------
+
+class Policy:
+    """Decisions of a player. Subclasses override `choose_monster` and `shop`."""
+
+    def choose_monster(self, player: PlayerState, team: Sequence[PlayerState], monsters: list[Monster],
+                       rng: np.random.Generator) -> int:
+        """Index of the monster the team fights."""
+        return int(rng.integers(len(monsters)))
+
+    def shop(self, player: PlayerState, rng: np.random.Generator) -> list[str]:
+        """`SHOP` items to buy, in order; items that cannot be bought any more are skipped."""
+        return []
+
+POLICIES: dict[str, Callable[[], Policy]] = {}
+
+def register_policy(name: str):
+    """Decorator that makes a policy class selectable by name."""
+    def decorator(policy_class):
+        POLICIES[name] = policy_class
+        return policy_class
+    return decorator
+
+def get_policy(name: str) -> Policy:
+    """Return a new instance of the policy registered under `name`."""
+    try:
+        return POLICIES[name]()
+    except KeyError:
+        raise ValueError(f"Unknown policy '{name}'. Available policies: {', '.join(POLICIES)}") from None
+
+def _shop_repeatedly(player: PlayerState, preference: Sequence[str]) -> list[str]:
+    """Buy the first affordable item of `preference` until none is affordable."""
+    budget = replace(player, purchases=dict(player.purchases))
+    items = []
+    while True:
+        item = next((name for name in preference if budget.can_buy(name)), None)
+        if item is None:
+            return items
+        budget.buy(item)
+        items.append(item)
+
+def _outdamages(team: Sequence[PlayerState], monster: Monster) -> bool:
+    """Rough estimate: the team needs fewer turns to kill the monster than the monster needs to kill the team."""
+    team_damage = sum(max(0.0, member.build.atk - monster.defense) for member in team)
+    monster_damage = max(max(0.0, monster.atk - member.build.defense) for member in team)
+    team_hp = sum(member.build.hp for member in team)
+    return team_damage > 0 and monster.hp / team_damage < team_hp / max(monster_damage, 1e-9)
+
+@register_policy("random")
+class RandomPolicy(Policy):
+    """Random monster, random affordable upgrades."""
+
+    def shop(self, player: PlayerState, rng: np.random.Generator) -> list[str]:
+        return _shop_repeatedly(player, list(rng.permutation(list(SHOP))))
+
+@register_policy("cautious")
+class CautiousPolicy(Policy):
+    """Weakest monster; buys HP and defense."""
+
+    def choose_monster(self, player, team, monsters, rng) -> int:
+        return int(np.argmin([monster.hp * monster.atk for monster in monsters]))
+
+    def shop(self, player, rng) -> list[str]:
+        return _shop_repeatedly(player, ["hp", "defense"])
+
+@register_policy("aggressive")
+class AggressivePolicy(Policy):
+    """Strongest monster (highest reward); buys attack and speed."""
+
+    def choose_monster(self, player, team, monsters, rng) -> int:
+        return int(np.argmax([monster.reward for monster in monsters]))
+
+    def shop(self, player, rng) -> list[str]:
+        return _shop_repeatedly(player, ["spd", "atk"])
+
+@register_policy("balanced")
+class BalancedPolicy(Policy):
+    """Highest reward among the monsters the team out-damages; buys its least bought stat."""
+
+    def choose_monster(self, player, team, monsters, rng) -> int:
+        beatable = [i for i, monster in enumerate(monsters) if _outdamages(team, monster)]
+        if not beatable:
+            return int(np.argmin([monster.hp for monster in monsters]))
+        return max(beatable, key=lambda i: monsters[i].reward)
+
+    def shop(self, player, rng) -> list[str]:
+        budget = replace(player, purchases=dict(player.purchases))
+        items = []
+        while True:
+            affordable = [name for name in SHOP if budget.can_buy(name)]
+            if not affordable:
+                return items
+            item = min(affordable, key=lambda name: budget.purchases.get(name, 0))
+            budget.buy(item)
+            items.append(item)
+
+# ------------------------------------------------------------
+# Game
+# ------------------------------------------------------------
+
+def _pvp_pairings(players: list[PlayerState], pvp_phase: int, pvp_pairing: str) -> list[tuple[int, int]]:
+    if pvp_pairing == "rotation":
+        return rotation_pairings(len(players), pvp_phase)
+    if pvp_pairing == "standing":
+        ranking = sorted(range(len(players)), key=lambda i: -players[i].vp)
+        return [(ranking[i], ranking[i + 1]) for i in range(0, len(ranking) - 1, 2)]
+    raise ValueError(f"Unknown PvP pairing '{pvp_pairing}'. Available pairings: standing, rotation")
+
+def play_game(policies: Sequence[str], seed: int, targeting: str = "A1", pvp_pairing: str = "standing",
+              starting_build: Build = STARTING_BUILD) -> tuple[list[PlayerState], list[list[int]]]:
+    """
+    Play one game.
+
+    Args:
+        policies: Policy name of each player (2 or 4 players)
+        seed: Seed of all random decisions, monster draws and battles of the game (also
+            seeds `random`, which resolves PvP speed ties)
+        targeting: Monster targeting rule (see `monster_battle.TARGETING`)
+        pvp_pairing: "standing" (1st vs 2nd, 3rd vs 4th) or "rotation"
+        starting_build: Stats every player starts with
+
+    Returns:
+        Final state of every player and the VP of every player after each PvP phase
+    """
+    rng = np.random.default_rng(seed)
+    random.seed(seed)
+    players = [PlayerState(i, replace(starting_build, name=f"Player {i}"), get_policy(name))
+               for i, name in enumerate(policies)]
+    history = []
+    for round_idx in range(1, N_ROUNDS + 1):
+        for first, second in rotation_pairings(len(players), round_idx - 1):
+            team = (players[first], players[second])
+            chooser = team[round_idx % 2]  # team members take turns choosing the monster
+            monsters = [MONSTER_DECK[i] for i in rng.choice(len(MONSTER_DECK), MONSTERS_DRAWN, replace=False)]
+            monster = monsters[chooser.policy.choose_monster(chooser, team, monsters, rng)]
+            result = simulate_monster_battle((team[0].build, team[1].build), monster, targeting, n_seeds=1,
+                                             seed=int(rng.integers(2**32)), vp=(team[0].vp, team[1].vp))
+            for member, tokens in zip(team, result.tokens[0]):
+                member.tokens += int(tokens.sum())
+                if result.won[0]:
+                    member.vp += MONSTER_VP
+                    member.monsters_defeated += 1
+        for player in players:
+            for item in player.policy.shop(player, rng):
+                if player.can_buy(item):
+                    player.buy(item)
+        if round_idx in PVP_ROUNDS:
+            for first, second in _pvp_pairings(players, PVP_ROUNDS.index(round_idx), pvp_pairing):
+                battle = resolve_battle_fast(players[first].build, players[second].build)
+                if battle.winner is None:
+                    continue
+                winner, loser = ((players[first], players[second]) if battle.winner == players[first].build.name
+                                 else (players[second], players[first]))
+                winner.vp += PVP_VP
+                winner.pvp_wins += 1
+                winner.tokens += PVP_TOKENS[0]
+                loser.tokens += PVP_TOKENS[1]
+            history.append([player.vp for player in players])
+    return players, history
+
+def _final_winner(vp: np.ndarray, tokens: np.ndarray) -> int:
+    """Most VP, ties broken by remaining skill tokens (tiebreaker option A); -1 if still tied."""
+    best = np.flatnonzero(vp == vp.max())
+    if len(best) > 1:
+        best = best[tokens[best] == tokens[best].max()]
+    return int(best[0]) if len(best) == 1 else -1
+
+def _play_chunk(policies: tuple[str, ...], seeds: Sequence[int], targeting: str, pvp_pairing: str,
+                starting_build: Build) -> GameBatch:
+    """Play the games of `seeds`; runs in a worker process."""
+    random_state = random.getstate()
+    try:
+        games = [play_game(policies, seed, targeting, pvp_pairing, starting_build) for seed in seeds]
+    finally:
+        random.setstate(random_state)
+    vp = np.array([[player.vp for player in players] for players, _ in games], dtype=np.int64)
+    tokens = np.array([[player.tokens for player in players] for players, _ in games], dtype=np.int64)
+    return GameBatch(
+        vp=vp.reshape(len(games), len(policies)),
+        vp_history=np.array([history for _, history in games], dtype=np.int64).reshape(
+            len(games), len(PVP_ROUNDS), len(policies)),
+        tokens=tokens.reshape(len(games), len(policies)),
+        monster_wins=np.array([[player.monsters_defeated for player in players] for players, _ in games],
+                              dtype=np.int64).reshape(len(games), len(policies)),
+        pvp_wins=np.array([[player.pvp_wins for player in players] for players, _ in games],
+                          dtype=np.int64).reshape(len(games), len(policies)),
+        winner=np.array([_final_winner(v, t) for v, t in zip(vp, tokens)], dtype=np.int64),
+    )
+
+def _concatenate(batches: list[GameBatch]) -> GameBatch:
+    return GameBatch(**{name: np.concatenate([getattr(batch, name) for batch in batches])
+                        for name in GameBatch.__dataclass_fields__})
+
+def run_games(n_games: int, policies: Sequence[str] = ("balanced", "balanced"), seed: int = 0,
+              workers: Optional[int] = None, chunk_size: int = 50, targeting: str = "A1",
+              pvp_pairing: str = "standing", starting_build: Build = STARTING_BUILD,
+              verbose: bool = True) -> GameStats:
+    """
+    Play `n_games` independent games, game i with seed `seed + i`, in a process pool.
+
+    Args:
+        n_games: Number of games
+        policies: Policy name of each seat (2 or 4 players, see `POLICIES`)
+        seed: Seed of the first game
+        workers: Worker processes (default: all CPUs); 1 plays all games in this process
+        chunk_size: Games per task sent to a worker
+        targeting: Monster targeting rule (see `monster_battle.TARGETING`)
+        pvp_pairing: "standing" or "rotation"
+        starting_build: Stats every player starts with
+        verbose: Print the statistics
+
+    Returns:
+        GameStats with the per-game results; identical for any `workers` and `chunk_size`
+    """
+    policies = tuple(policies)
+    if len(policies) not in (2, 4):
+        raise ValueError(f"Games need 2 or 4 players, got {len(policies)}")
+    for name in policies:
+        get_policy(name)
+    seeds = [seed + i for i in range(n_games)]
+    chunks = [seeds[start:start + chunk_size] for start in range(0, n_games, chunk_size)]
+    start_time = time.perf_counter()
+    if workers == 1:
+        batches = [_play_chunk(policies, chunk, targeting, pvp_pairing, starting_build) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            play_chunk = partial(_play_chunk, policies, targeting=targeting, pvp_pairing=pvp_pairing,
+                                 starting_build=starting_build)
+            batches = list(pool.map(play_chunk, chunks))
+    stats = GameStats(batch=_concatenate(batches), policies=policies, seconds=time.perf_counter() - start_time)
+    if verbose:
+        print(stats)
+    return stats
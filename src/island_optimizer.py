@@ -0,0 +1,305 @@
+"""
+Island-model differential evolution for the build optimization.
+
+Instead of one population whose candidates are farmed out to a worker pool (one pickled
+`_fitness_wrapper` call per candidate), every island runs its own complete DE population in
+its own process and evaluates it locally. Every `migration_interval` generations an island
+sends copies of its best vectors to the next island of a ring and takes in whatever
+migrants have arrived, replacing its worst members. Migration is asynchronous, so islands
+never wait for each other and throughput grows with the number of cores.
+
+The islands talk through a small hub (a `multiprocessing.managers` server holding one queue
+per island). Local islands connect to it like any other client, so islands on other machines
+can join the same run with `python island_optimizer.py --connect HOST:PORT --authkey KEY
+--island I`.
+"""
+
+# Standard library imports
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, asdict
+from functools import partial
+from multiprocessing.managers import BaseManager
+import queue
+import secrets
+import socket
+from typing import Optional
+import numpy as np
+
+from optimizer_checkpoint import check_solver_internals, import_solver_class
+from pvp_balance_search import Build, _fitness_wrapper, _fitness_wrapper_vectorized, _params_to_builds
+
+# ------------------------------------------------------------
+# Data structures
+# ------------------------------------------------------------
+
+@dataclass
+class IslandSettings:
+    """Settings shared by all islands of a run (sent to remote islands through the hub)."""
+    bounds: list[tuple[float, float]]
+    n_islands: int = 4
+    maxiter: int = 100
+    popsize: int = 15
+    migration_interval: int = 10
+    n_migrants: int = 2
+    seed: Optional[int] = None
+    vectorized: bool = True
+    engine: Optional[str] = None
+
+@dataclass
+class IslandResult:
+    """Best candidate and counters of one island."""
+    island: int
+    x: np.ndarray
+    fun: float
+    nfev: int
+    generations: int
+    migrants_sent: int = 0
+    migrants_accepted: int = 0
+    population: np.ndarray = field(default=None, repr=False)             # final population, real parameters
+    population_energies: np.ndarray = field(default=None, repr=False)
+
+    @property
+    def builds(self) -> tuple[Build, Build, Build]:
+        return _params_to_builds(self.x)
+
+    def __str__(self):
+        return (f"Island {self.island}: fitness {self.fun:.4f} after {self.generations} generations, "
+                f"{self.nfev} evaluations, migrants sent/accepted: {self.migrants_sent}/{self.migrants_accepted}")
+
+# ------------------------------------------------------------
+# Migration hub
+# ------------------------------------------------------------
+
+_hub_queues: dict = {}
+_hub_settings: dict = {}
+
+def _get_queue(name):
+    return _hub_queues.setdefault(name, queue.Queue())
+
+def _get_settings():
+    return _hub_settings
+
+def _init_hub(settings: dict) -> None:
+    """Runs in the hub's server process on start."""
+    _hub_settings.update(settings)
+
+class MigrationHub(BaseManager):
+    """Queue server of an island run; `get_queue(i)` is island i's inbox, `get_queue("results")` collects results."""
+
+MigrationHub.register("get_queue", callable=_get_queue)
+MigrationHub.register("get_settings", callable=_get_settings)
+
+def connect_hub(address: tuple[str, int], authkey: bytes) -> MigrationHub:
+    hub = MigrationHub(address=address, authkey=authkey)
+    hub.connect()
+    return hub
+
+# ------------------------------------------------------------
+# Island
+# ------------------------------------------------------------
+
+def _replace_worst(solver: "DifferentialEvolutionSolver", migrants: list[tuple[np.ndarray, float]], lower: np.ndarray,
+                   upper: np.ndarray) -> int:
+    """Put migrants better than the worst members in their place. Returns the number accepted."""
+    accepted = 0
+    for x, energy in migrants:
+        worst = int(np.argmax(solver.population_energies))
+        if energy >= solver.population_energies[worst]:
+            continue
+        solver.population[worst] = np.clip((np.asarray(x) - lower) / (upper - lower), 0.0, 1.0)
+        solver.population_energies[worst] = energy
+        accepted += 1
+    # the 'best1bin' strategy expects the best member at index 0
+    best = int(np.argmin(solver.population_energies))
+    solver.population[[0, best]] = solver.population[[best, 0]]
+    solver.population_energies[[0, best]] = solver.population_energies[[best, 0]]
+    return accepted
+
+def run_island(island: int, hub_address: tuple[str, int], authkey: bytes,
+               settings: Optional[IslandSettings] = None) -> IslandResult:
+    """
+    Run one island to completion and put its result into the hub's "results" queue.
+
+    Args:
+        island: Index of this island in the ring (0 .. n_islands - 1)
+        hub_address, authkey: Address and key of the run's `MigrationHub`
+        settings: Run settings; fetched from the hub if not given (remote islands)
+
+    Returns:
+        IslandResult of this island
+    """
+    hub = connect_hub(hub_address, authkey)
+    if settings is None:
+        settings = IslandSettings(**hub.get_settings().copy())
+    inbox = hub.get_queue(island)
+    outbox = hub.get_queue((island + 1) % settings.n_islands)
+    lower, upper = np.array(settings.bounds, dtype=np.float64).T
+
+    if settings.vectorized:
+        fitness_func = partial(_fitness_wrapper_vectorized, engine=settings.engine or "numpy")
+    else:
+        fitness_func = partial(_fitness_wrapper, engine=settings.engine)
+    seed = None if settings.seed is None else settings.seed + island
+    DifferentialEvolutionSolver = import_solver_class()
+    solver: Optional[DifferentialEvolutionSolver] = None
+    counters = {"generation": 0, "sent": 0, "accepted": 0}
+
+    def callback(xk, convergence):
+        """Exchange migrants every `migration_interval` generations."""
+        counters["generation"] += 1
+        if settings.n_islands < 2 or counters["generation"] % settings.migration_interval != 0:
+            return False
+        order = np.argsort(solver.population_energies)[:settings.n_migrants]
+        for i in order:
+            outbox.put((solver._scale_parameters(solver.population[i]), float(solver.population_energies[i])))
+            counters["sent"] += 1
+        migrants = []
+        while True:
+            try:
+                migrants.append(inbox.get_nowait())
+            except queue.Empty:
+                break
+        counters["accepted"] += _replace_worst(solver, migrants, lower, upper)
+        return False
+
+    with DifferentialEvolutionSolver(
+        fitness_func,
+        bounds=settings.bounds,
+        strategy='best1bin',
+        maxiter=settings.maxiter,
+        popsize=settings.popsize,
+        tol=0.00001,
+        mutation=(0.5, 1.5),
+        recombination=0.9,
+        rng=np.random.RandomState(seed),
+        workers=1,
+        updating='deferred',
+        polish=True,
+        callback=callback,
+        vectorized=settings.vectorized
+    ) as solver:
+        check_solver_internals(solver)
+        result = solver.solve()
+
+    island_result = IslandResult(island=island, x=result.x, fun=float(result.fun), nfev=int(result.nfev),
+                                 generations=counters["generation"], migrants_sent=counters["sent"],
+                                 migrants_accepted=counters["accepted"], population=result.population,
+                                 population_energies=result.population_energies)
+    hub.get_queue("results").put(island_result)
+    return island_result
+
+# ------------------------------------------------------------
+# Driver
+# ------------------------------------------------------------
+
+def optimize_builds_islands(
+    atk_ranges: list[tuple[int, int]],
+    def_ranges: list[tuple[int, int]],
+    rev_ranges: list[tuple[int, int]],
+    hp_ranges: list[tuple[int, int]],
+    spd_ranges: list[tuple[int, int]],
+    n_islands: int = 4,
+    maxiter: int = 100,
+    popsize: int = 15,
+    migration_interval: int = 10,
+    n_migrants: int = 2,
+    seed: Optional[int] = None,
+    vectorized: bool = True,
+    engine: Optional[str] = None,
+    n_local_islands: Optional[int] = None,
+    hub_address: Optional[tuple[str, int]] = None,
+    authkey: Optional[bytes] = None
+) -> list[IslandResult]:
+    """
+    Optimize the 15 build parameters with several DE populations exchanging their best vectors.
+
+    Args:
+        atk_ranges, def_ranges, rev_ranges, hp_ranges, spd_ranges: Stat ranges for
+            [Offense, Balanced, Tank], as in `optimize_builds`
+        n_islands: Number of populations
+        maxiter: Generations per island
+        popsize: Population size multiplier of every island
+        migration_interval: Generations between two migrations
+        n_migrants: Best vectors sent to the next island per migration
+        seed: Island i uses seed + i
+        vectorized: Evaluate each island's generations with `fitness_batch`
+        engine: Battle engine of the fitness evaluation (see `battle_engines`)
+        n_local_islands: Islands started on this machine (default: all). The others have to
+            be started elsewhere with `--connect` and the printed address and key.
+        hub_address: Address the migration hub listens on; port 0 picks a free port. By
+            default the hub listens on 127.0.0.1 if all islands are local and on all
+            interfaces ("0.0.0.0") if remote islands are expected. Remote islands must be able
+            to reach the printed host; pass the address of a reachable interface otherwise.
+        authkey: Key remote islands need to connect (random if not given)
+
+    Returns:
+        Results of all islands, best fitness first
+    """
+    bounds = [
+        atk_ranges[0], def_ranges[0], rev_ranges[0], hp_ranges[0], spd_ranges[0],
+        atk_ranges[1], def_ranges[1], rev_ranges[1], hp_ranges[1], spd_ranges[1],
+        atk_ranges[2], def_ranges[2], rev_ranges[2], hp_ranges[2], spd_ranges[2],
+    ]
+    settings = IslandSettings(bounds=bounds, n_islands=n_islands, maxiter=maxiter, popsize=popsize,
+                              migration_interval=migration_interval, n_migrants=n_migrants, seed=seed,
+                              vectorized=vectorized, engine=engine)
+    n_local_islands = n_islands if n_local_islands is None else n_local_islands
+    authkey = authkey if authkey is not None else secrets.token_bytes(16)
+
+    if hub_address is None:
+        hub_address = ("127.0.0.1", 0) if n_local_islands >= n_islands else ("0.0.0.0", 0)
+
+    hub = MigrationHub(address=hub_address, authkey=authkey)
+    hub.start(_init_hub, (asdict(settings),))
+    host, port = hub.address[:2]
+    wildcard = host in ("", "0.0.0.0")
+    # local islands connect through the loopback interface, remote ones through the machine's name
+    local_address = ("127.0.0.1", port) if wildcard else (host, port)
+    public_host = socket.getfqdn() if wildcard else host
+    try:
+        print(f"Island run with {n_islands} islands, migration hub at {host or '0.0.0.0'}:{port}")
+        if n_local_islands < n_islands:
+            print(f"Start islands {n_local_islands}..{n_islands - 1} elsewhere with: "
+                  f"python island_optimizer.py --connect {public_host}:{port} "
+                  f"--authkey {authkey.hex()} --island I")
+            if host.startswith("127."):
+                print("The hub only listens on the loopback interface; pass a reachable hub_address "
+                      "so remote islands can connect.")
+            elif wildcard:
+                print(f"If {public_host} cannot be resolved from the other machines, use this machine's IP address.")
+        with ProcessPoolExecutor(max_workers=max(1, n_local_islands)) as pool:
+            futures = [pool.submit(run_island, island, local_address, authkey, settings)
+                       for island in range(n_local_islands)]
+            results_queue = hub.get_queue("results")
+            results = []
+            while len(results) < n_islands:
+                try:
+                    results.append(results_queue.get(timeout=1.0))
+                except queue.Empty:
+                    # surface errors of local islands instead of waiting forever
+                    for future in futures:
+                        if future.done() and future.exception() is not None:
+                            raise future.exception()
+    finally:
+        hub.shutdown()
+
+    results.sort(key=lambda result: result.fun)
+    for result in results:
+        print(result)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Join an island run as a remote island")
+    parser.add_argument("--connect", required=True, help="HOST:PORT of the migration hub")
+    parser.add_argument("--authkey", required=True, help="Hex key printed by the hub")
+    parser.add_argument("--island", type=int, required=True, help="Index of this island")
+    args = parser.parse_args()
+    host, port = args.connect.rsplit(":", 1)
+    # imported here: results must be pickled as `island_optimizer.IslandResult`, not `__main__.IslandResult`,
+    # so the hub can unpickle them
+    import island_optimizer
+    print(island_optimizer.run_island(args.island, (host, int(port)), bytes.fromhex(args.authkey)))
+
+if __name__ == "__main__":
+    main()
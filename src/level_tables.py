@@ -0,0 +1,254 @@
+"""
+Analytic PvP/PvE balance model over level tables (NumPy port of `game_balance_optimizer.tsx`).
+
+Instead of full `Build`s, players and monsters pick a level (1-3) for attack and one for
+defense, and level tables give the stats of every level. The model does not simulate
+rounds; it divides HP by the damage per turn:
+- PvP damage of a player: ATK[atk level] - enemy DEF[enemy def level] + own REV[def level],
+  against HP[enemy def level]; the player needing fewer turns to kill wins.
+- PvE: two players attack a monster, each dealing ATK - monster DEF + REV / 2, and the
+  monster deals (ATK - player DEF) / 2 + its REV. HP is taken from the higher of the two
+  levels on both sides.
+
+All functions take an (S, 24) array of S candidate level tables (layout: `TABLES`, three
+levels each) and evaluate every strategy x strategy and strategy x monster combination
+for all candidates at once. `level_table_fitness_batch` combines the results into a
+score in the style of `fitness_batch`, and `optimize_level_tables` minimizes it with
+the same differential evolution settings as `optimize_builds`.
+"""
+
+# Standard library imports
+from dataclasses import dataclass, fields
+from typing import Optional
+import numpy as np
+
+# ------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------
+
+TABLES: tuple[str, ...] = ("player_atk", "player_def", "player_revenge", "player_hp",
+                           "monster_atk", "monster_def", "monster_revenge", "monster_hp")
+N_LEVELS: int = 3
+P_ATK, P_DEF, P_REV, P_HP, M_ATK, M_DEF, M_REV, M_HP = range(len(TABLES))
+
+# (attack level, defense level) of the three strategies and of the analyzed monsters
+STRATEGIES: dict[str, tuple[int, int]] = {"Offense": (3, 1), "Balanced": (2, 2), "Tank": (1, 3)}
+MONSTER_LEVELS: dict[str, tuple[int, int]] = {
+    "Easy (1-1)": (1, 1),
+    "Medium (2-2)": (2, 2),
+    "Hard (3-3)": (3, 3),
+    "Glass Cannon (3-1)": (3, 1),
+    "Tank Boss (1-3)": (1, 3),
+}
+# the cycle matchups (winner, loser): Offense > Tank > Balanced > Offense
+CYCLE: tuple[tuple[int, int], ...] = ((0, 2), (2, 1), (1, 0))
+
+# fitness penalty weights
+ORDER_FACTOR: float = 1000
+CYCLE_FACTOR: float = 100
+PVE_FACTOR: float = 10
+MARGIN_FACTOR: float = 10
+MAX_TURNS: float = 100  # turns counted for "never", e.g. when a side deals no damage
+
+# search ranges of every table, used by `optimize_level_tables` for all three levels
+TABLE_BOUNDS: dict[str, tuple[float, float]] = {
+    "player_atk": (1, 10), "player_def": (0, 5), "player_revenge": (0, 2), "player_hp": (3, 20),
+    "monster_atk": (1, 12), "monster_def": (0, 6), "monster_revenge": (0, 2), "monster_hp": (3, 20),
+}
+
+# ------------------------------------------------------------
+# Data structures
+# ------------------------------------------------------------
+
+@dataclass
+class LevelTables:
+    """Stats of levels 1-3 of players and monsters."""
+    player_atk: tuple[float, float, float] = (3, 4, 5)
+    player_def: tuple[float, float, float] = (0.75, 1.5, 2)
+    player_revenge: tuple[float, float, float] = (0.2, 0.4, 0.6)
+    player_hp: tuple[float, float, float] = (10, 8, 6)  # HP inversely related to DEF
+    monster_atk: tuple[float, float, float] = (3, 5, 7)
+    monster_def: tuple[float, float, float] = (1.5, 3, 4)
+    monster_revenge: tuple[float, float, float] = (0.2, 0.4, 0.6)
+    monster_hp: tuple[float, float, float] = (5, 6, 7)
+
+    def to_array(self) -> np.ndarray:
+        """Flat (24,) parameter vector in the layout of `TABLES`."""
+        return np.array([getattr(self, name) for name in TABLES], dtype=np.float64).ravel()
+
+    @classmethod
+    def from_array(cls, params: np.ndarray) -> "LevelTables":
+        rows = np.asarray(params, dtype=np.float64).reshape(len(TABLES), N_LEVELS)
+        return cls(**{name: tuple(float(value) for value in row) for name, row in zip(TABLES, rows)})
+
+    def __str__(self):
+        return "\n".join(f"{field.name:16s} " + "  ".join(f"{value:6.2f}" for value in getattr(self, field.name))
+                         for field in fields(self))
+
+@dataclass
+class LevelTableAnalysis:
+    """PvP and PvE results of S candidate level tables."""
+    pvp_damage: np.ndarray       # (S, 3, 3) damage per turn of strategy i against strategy j
+    pvp_turns: np.ndarray        # (S, 3, 3) turns strategy i needs to kill strategy j (inf: never)
+    pvp_wins: np.ndarray         # (S, 3, 3) bool, strategy i beats strategy j
+    cycle_margin: np.ndarray     # (S, 3) turns the winners of `CYCLE` have to spare (> 0: cycle holds)
+    pve_turns_to_win: np.ndarray   # (S, 3, M) turns the team of a strategy needs to kill the monster
+    pve_turns_to_lose: np.ndarray  # (S, 3, M) turns the monster needs to kill a player
+    pve_wins: np.ndarray         # (S, 3, M) bool
+    solvability: np.ndarray      # (S,) H3 (D2 - D1) + H2 (D1 - D3) + H1 (D3 - D2); a cycle needs < 0
+
+    def __len__(self) -> int:
+        return len(self.solvability)
+
+    @property
+    def is_cycle(self) -> np.ndarray:
+        return np.all(self.cycle_margin > 0, axis=1)
+
+# ------------------------------------------------------------
+# Model
+# ------------------------------------------------------------
+
+def _as_tables(params: np.ndarray) -> np.ndarray:
+    return np.asarray(params, dtype=np.float64).reshape(-1, len(TABLES), N_LEVELS)
+
+def _turns(hp: np.ndarray, damage: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore"):
+        return np.where(damage > 0, hp / np.where(damage > 0, damage, 1.0), np.inf)
+
+def pvp_matrix(params: np.ndarray, strategies: dict[str, tuple[int, int]] = STRATEGIES
+               ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    PvP damage, turns to kill and wins of every strategy pair (`calcPvPOutcome`).
+
+    Returns:
+        (S, K, K) damage per turn, turns to kill and bool wins of strategy i against strategy j
+    """
+    tables = _as_tables(params)
+    atk, dfn = (np.array([levels[k] for levels in strategies.values()]) - 1 for k in (0, 1))
+    damage = (tables[:, P_ATK, atk][:, :, None] - tables[:, P_DEF, dfn][:, None, :]
+              + tables[:, P_REV, dfn][:, :, None])
+    turns = _turns(tables[:, P_HP, dfn][:, None, :], damage)
+    return damage, turns, turns < np.swapaxes(turns, 1, 2)
+
+def pve_matrix(params: np.ndarray, strategies: dict[str, tuple[int, int]] = STRATEGIES,
+               monsters: dict[str, tuple[int, int]] = MONSTER_LEVELS) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Turns to kill the monster, turns to be killed and wins of every strategy x monster
+    combination (`calcTurnsToWin`, two players of the same strategy).
+
+    Returns:
+        (S, K, M) turns to win, turns to lose and bool wins
+    """
+    tables = _as_tables(params)
+    atk, dfn = (np.array([levels[k] for levels in strategies.values()]) - 1 for k in (0, 1))
+    m_atk, m_def = (np.array([levels[k] for levels in monsters.values()]) - 1 for k in (0, 1))
+    to_monster = 2 * (tables[:, P_ATK, atk][:, :, None] - tables[:, M_DEF, m_def][:, None, :]
+                      + tables[:, P_REV, dfn][:, :, None] / 2)
+    to_player = ((tables[:, M_ATK, m_atk][:, None, :] - tables[:, P_DEF, dfn][:, :, None]) / 2
+                 + tables[:, M_REV, m_def][:, None, :])
+    turns_to_win = _turns(tables[:, M_HP, np.maximum(m_atk, m_def)][:, None, :], to_monster)
+    turns_to_lose = _turns(tables[:, P_HP, np.maximum(atk, dfn)][:, :, None], to_player)
+    return turns_to_win, turns_to_lose, turns_to_win < turns_to_lose
+
+def analyze_level_tables(params: np.ndarray, monsters: dict[str, tuple[int, int]] = MONSTER_LEVELS
+                         ) -> LevelTableAnalysis:
+    """Evaluate PvP, the RPS cycle and PvE for an (S, 24) array (or one `LevelTables.to_array()`)."""
+    tables = _as_tables(params)
+    damage, turns, wins = pvp_matrix(tables)
+    winner, loser = np.array(CYCLE).T
+    with np.errstate(invalid="ignore"):  # NaN if neither side ever kills
+        cycle_margin = turns[:, loser, winner] - turns[:, winner, loser]
+    turns_to_win, turns_to_lose, pve_wins = pve_matrix(tables, monsters=monsters)
+    hp, dfn = tables[:, P_HP], tables[:, P_DEF]
+    solvability = (hp[:, 2] * (dfn[:, 1] - dfn[:, 0]) + hp[:, 1] * (dfn[:, 0] - dfn[:, 2])
+                   + hp[:, 0] * (dfn[:, 2] - dfn[:, 1]))
+    return LevelTableAnalysis(pvp_damage=damage, pvp_turns=turns, pvp_wins=wins, cycle_margin=cycle_margin,
+                              pve_turns_to_win=turns_to_win, pve_turns_to_lose=turns_to_lose, pve_wins=pve_wins,
+                              solvability=solvability)
+
+# ------------------------------------------------------------
+# Fitness
+# ------------------------------------------------------------
+
+def level_table_fitness_batch(params: np.ndarray, margin_range: tuple[float, float] = (0.5, 1.5),
+                              pve_targets: Optional[dict[str, bool]] = None) -> np.ndarray:
+    """
+    Score S candidate level tables at once (lower is better).
+
+    Penalties:
+    - ORDER_FACTOR per unit that a table is not increasing with the level (player HP: not decreasing)
+    - CYCLE_FACTOR per cycle matchup won by the wrong strategy
+    - MARGIN_FACTOR per turn that a cycle margin lies outside `margin_range` (the
+      widget's guideline: similar margins of 0.5-1.5 turns)
+    - PVE_FACTOR per strategy x monster outcome differing from `pve_targets`
+      (default: every strategy beats the easy and medium monster and loses to the hard one)
+
+    Args:
+        params: (S, 24) level tables in the layout of `TABLES`
+        margin_range: Desired turns to spare of the cycle winners
+        pve_targets: Desired PvE outcome per monster of `MONSTER_LEVELS`; others are not scored
+
+    Returns:
+        (S,) fitness scores
+    """
+    tables = _as_tables(params)
+    pve_targets = {"Easy (1-1)": True, "Medium (2-2)": True, "Hard (3-3)": False} if pve_targets is None else pve_targets
+
+    steps = np.diff(tables, axis=2)
+    steps[:, P_HP] *= -1
+    score = ORDER_FACTOR * np.maximum(0.0, -steps).sum(axis=(1, 2))
+
+    analysis = analyze_level_tables(tables, monsters={name: MONSTER_LEVELS[name] for name in pve_targets})
+    score += CYCLE_FACTOR * np.sum(~(analysis.cycle_margin > 0), axis=1)
+    margin = np.clip(np.nan_to_num(analysis.cycle_margin, nan=0.0), -MAX_TURNS, MAX_TURNS)
+    score += MARGIN_FACTOR * (np.maximum(0.0, margin_range[0] - margin)
+                              + np.maximum(0.0, margin - margin_range[1])).sum(axis=1)
+    targets = np.array(list(pve_targets.values()), dtype=bool)
+    score += PVE_FACTOR * np.sum(analysis.pve_wins != targets, axis=(1, 2))
+    return score
+
+def optimize_level_tables(
+    bounds: Optional[dict[str, tuple[float, float]]] = None,
+    maxiter: int = 200,
+    popsize: int = 15,
+    seed: Optional[int] = None,
+    initial: Optional[LevelTables] = None,
+    margin_range: tuple[float, float] = (0.5, 1.5),
+    pve_targets: Optional[dict[str, bool]] = None
+) -> tuple[LevelTables, float]:
+    """
+    Optimize the 24 level table entries with differential evolution, evaluating every
+    generation with one `level_table_fitness_batch` call.
+
+    Args:
+        bounds: Search range per table (see `TABLE_BOUNDS`, the default)
+        maxiter: Maximum number of generations
+        popsize: Population size multiplier (population = popsize * 24)
+        seed: Random seed for reproducibility
+        initial: Level tables added to the initial population
+        margin_range, pve_targets: Passed on to `level_table_fitness_batch`
+
+    Returns:
+        (best level tables, their fitness)
+    """
+    # imported here: SciPy is only needed for optimizing
+    from scipy.optimize import differential_evolution
+    bounds = TABLE_BOUNDS if bounds is None else {**TABLE_BOUNDS, **bounds}
+    de_bounds = [bounds[name] for name in TABLES for _ in range(N_LEVELS)]
+    x0 = np.clip(initial.to_array(), *np.array(de_bounds).T) if initial is not None else None
+    result = differential_evolution(
+        lambda x: level_table_fitness_batch(np.asarray(x).T, margin_range, pve_targets),
+        bounds=de_bounds,
+        strategy='best1bin',
+        maxiter=maxiter,
+        popsize=popsize,
+        tol=0.00001,
+        mutation=(0.5, 1.5),
+        recombination=0.9,
+        rng=np.random.default_rng(seed),
+        updating='deferred',
+        vectorized=True,
+        polish=False,
+        x0=x0,
+    )
+    return LevelTables.from_array(result.x), float(result.fun)
@@ -0,0 +1,204 @@
+"""
+Bounded memo cache for battle outcomes, keyed on quantized build stats.
+
+Differential evolution proposes many candidates whose matchups only differ below any
+practical precision, and the optimizer callback re-evaluates the best vector every
+generation. `MatchupCache` stores `(winner, rounds)` per matchup in an LRU dictionary so
+these battles are only simulated once.
+
+Each process owns its own cache (see `get_matchup_cache`), which keeps the `workers=-1`
+pool of `optimize_builds` free of locks. Optionally, processes can additionally share a
+fixed-size, direct-mapped `SharedMatchupTable` in shared memory.
+"""
+
+# Standard library imports
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from multiprocessing import shared_memory
+from typing import Optional
+import numpy as np
+
+from batch_battle import STAT_COLUMNS
+
+# ------------------------------------------------------------
+# Data structures
+# ------------------------------------------------------------
+
+MatchupKey = tuple[int, ...]
+MatchupValue = tuple[int, int]  # (winner code as in batch_battle, rounds)
+
+@dataclass
+class CacheStats:
+    """Counters of a `MatchupCache`."""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    shared_hits: int = 0
+    size: int = 0
+    maxsize: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __str__(self):
+        return (f"hits: {self.hits} ({self.hit_rate:.1%}, shared: {self.shared_hits}), "
+                f"misses: {self.misses}, evictions: {self.evictions}, size: {self.size}/{self.maxsize}")
+
+@dataclass(frozen=True)
+class CacheConfig:
+    """
+    Picklable cache settings, passed to pool workers so each builds an identical cache.
+
+    Args:
+        maxsize: Maximum number of matchups kept per process
+        resolution: Stats are rounded to multiples of this before building the key
+        shared_slots: Size of an additional shared-memory table (0 = no shared table)
+        shared_name: Name of an existing shared-memory table to attach to
+    """
+    maxsize: int = 2**16
+    resolution: float = 1e-6
+    shared_slots: int = 0
+    shared_name: Optional[str] = None
+
+# ------------------------------------------------------------
+# Shared-memory backing
+# ------------------------------------------------------------
+
+_KEY_LENGTH: int = 2 * len(STAT_COLUMNS) + 1  # stats of both players + max_rounds
+_SLOT_DTYPE = np.dtype([
+    ('key', np.int64, (_KEY_LENGTH,)),
+    ('winner', np.int8),
+    ('rounds', np.int32),
+    ('check', np.int64),
+])
+
+class SharedMatchupTable:
+    """
+    Direct-mapped matchup table in shared memory, usable from several processes.
+
+    Writes are not locked. Every slot stores a checksum of its key and value, written last,
+    and entries whose checksum does not match (concurrently overwritten slots) read as misses.
+    """
+
+    def __init__(self, n_slots: int = 2**20, name: Optional[str] = None):
+        """Create a new table with `n_slots` slots, or attach to the existing table `name`."""
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=n_slots * _SLOT_DTYPE.itemsize)
+            self._owner = True
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            self._owner = False
+        self.slots = np.ndarray((self._shm.size // _SLOT_DTYPE.itemsize,), dtype=_SLOT_DTYPE, buffer=self._shm.buf)
+        if self._owner:
+            self.slots['check'] = 0
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def get(self, key: MatchupKey) -> Optional[MatchupValue]:
+        slot = self.slots[hash(key) % len(self.slots)]
+        value = (int(slot['winner']), int(slot['rounds']))
+        if tuple(slot['key'].tolist()) != key or int(slot['check']) != hash((key, value)):
+            return None
+        return value
+
+    def put(self, key: MatchupKey, value: MatchupValue) -> bool:
+        """Store an entry and return True if it replaced a different matchup."""
+        slot = self.slots[hash(key) % len(self.slots)]
+        evicted = int(slot['check']) != 0 and tuple(slot['key'].tolist()) != key
+        slot['check'] = 0
+        slot['key'] = key
+        slot['winner'], slot['rounds'] = value
+        slot['check'] = hash((key, value))
+        return evicted
+
+    def close(self) -> None:
+        """Detach from the table; the table that created the block also frees it."""
+        del self.slots
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+# ------------------------------------------------------------
+# Cache
+# ------------------------------------------------------------
+
+class MatchupCache:
+    """LRU cache of matchup outcomes keyed on quantized stats of both builds and max_rounds."""
+
+    def __init__(self, maxsize: int = 2**16, resolution: float = 1e-6, shared: Optional[SharedMatchupTable] = None):
+        self.maxsize = maxsize
+        self.resolution = resolution
+        self.shared = shared
+        self._entries: OrderedDict[MatchupKey, MatchupValue] = OrderedDict()
+        self._stats = CacheStats(maxsize=maxsize)
+
+    def make_key(self, p1, p2, max_rounds: int) -> MatchupKey:
+        """Quantize the stats of two builds to the cache resolution."""
+        q = self.resolution
+        return (round(p1.atk / q), round(p1.defense / q), round(p1.revenge / q), round(p1.hp / q), round(p1.spd / q),
+                round(p2.atk / q), round(p2.defense / q), round(p2.revenge / q), round(p2.hp / q), round(p2.spd / q),
+                max_rounds)
+
+    def get(self, key: MatchupKey) -> Optional[MatchupValue]:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            return value
+        if self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self._stats.hits += 1
+                self._stats.shared_hits += 1
+                self._insert(key, value)
+                return value
+        self._stats.misses += 1
+        return None
+
+    def put(self, key: MatchupKey, value: MatchupValue) -> None:
+        self._insert(key, value)
+        if self.shared is not None:
+            self.shared.put(key, value)
+
+    def _insert(self, key: MatchupKey, value: MatchupValue) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self._stats.evictions += 1
+
+    def stats(self) -> CacheStats:
+        return replace(self._stats, size=len(self._entries))
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._stats = CacheStats(maxsize=self.maxsize)
+
+# ------------------------------------------------------------
+# Per-process cache
+# ------------------------------------------------------------
+
+_process_cache: Optional[MatchupCache] = None
+_process_config: Optional[CacheConfig] = None
+
+def get_matchup_cache(config: CacheConfig = CacheConfig()) -> MatchupCache:
+    """
+    Return this process's cache, (re)building it if `config` changed.
+    Pool workers call this with the config they were sent and attach to its shared table.
+    """
+    global _process_cache, _process_config
+    if _process_cache is None or config != _process_config:
+        if _process_cache is not None and _process_cache.shared is not None:
+            _process_cache.shared.close()
+        shared = SharedMatchupTable(name=config.shared_name) if config.shared_name is not None else None
+        _process_cache = MatchupCache(maxsize=config.maxsize, resolution=config.resolution, shared=shared)
+        _process_config = config
+    return _process_cache
+
+def matchup_cache_stats() -> CacheStats:
+    """Counters of this process's cache (empty if no cache was used yet)."""
+    return _process_cache.stats() if _process_cache is not None else CacheStats()
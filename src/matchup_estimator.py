@@ -0,0 +1,153 @@
+"""
+Win-probability estimates for matchups with random attack order.
+
+When two builds have equal speed, `simulate_battle` flips a coin for the first attacker every
+round, so a single simulation is only one sample. `estimate_matchup` returns the distribution
+of winner and battle length instead: either exactly, via dynamic programming over the
+(hp1, hp2) states reachable after each round, or by Monte Carlo sampling with all coin flips
+drawn as one NumPy array and the samples resolved in bulk by the batch engine.
+"""
+
+# Standard library imports
+from dataclasses import dataclass
+from typing import Optional, Union
+import numpy as np
+
+from batch_battle import ATK, DEF, REV, HP, SPD, DRAW, P1_WINS, P2_WINS, builds_to_array, \
+    simulate_battles_batch, simulate_battles_with_order
+
+# ------------------------------------------------------------
+# Data structures
+# ------------------------------------------------------------
+
+@dataclass
+class MatchupEstimate:
+    """
+    Distribution of a matchup's outcome.
+
+    `round_probs[w, r]` is the probability that the battle ends after r rounds with winner code
+    w (P1_WINS, P2_WINS or DRAW as in `batch_battle`; DRAW = -1 indexes the last row).
+    """
+    round_probs: np.ndarray  # (3, max_rounds + 1)
+    n_samples: int           # 0 if the distribution is exact
+
+    @property
+    def p1_win(self) -> float:
+        return float(self.round_probs[P1_WINS].sum())
+
+    @property
+    def p2_win(self) -> float:
+        return float(self.round_probs[P2_WINS].sum())
+
+    @property
+    def draw(self) -> float:
+        return float(self.round_probs[DRAW].sum())
+
+    @property
+    def rounds(self) -> np.ndarray:
+        """Probability of each battle length, regardless of the winner."""
+        return self.round_probs.sum(axis=0)
+
+    @property
+    def expected_rounds(self) -> float:
+        return float(self.rounds @ np.arange(self.round_probs.shape[1]))
+
+    def __str__(self):
+        method = "exact" if self.n_samples == 0 else f"{self.n_samples} samples"
+        return (f"P1 {self.p1_win:.3f}, P2 {self.p2_win:.3f}, draw {self.draw:.3f}, "
+                f"E[rounds] {self.expected_rounds:.2f} ({method})")
+
+# ------------------------------------------------------------
+# Exact distribution
+# ------------------------------------------------------------
+
+def _play_round(s1: np.ndarray, s2: np.ndarray, hp1: float, hp2: float, p1_first: bool) -> tuple[Optional[int], tuple[float, float]]:
+    """Play one round with the steps of `simulate_battle`. Returns (winner code or None, HP)."""
+    stats = (s1, s2)
+    hp = [hp1, hp2]
+    a, b = (0, 1) if p1_first else (1, 0)
+    hp[b] -= max(0.0, stats[a][ATK] - stats[b][DEF])
+    if hp[b] <= 0:
+        return a, (hp[0], hp[1])
+    hp[a] -= stats[b][REV]
+    if hp[a] <= 0:
+        return b, (hp[0], hp[1])
+    hp[a] -= max(0.0, stats[b][ATK] - stats[a][DEF])
+    if hp[a] <= 0:
+        return b, (hp[0], hp[1])
+    hp[b] -= stats[a][REV]
+    if hp[b] <= 0:
+        return a, (hp[0], hp[1])
+    return None, (hp[0], hp[1])
+
+def _exact_round_probs(s1: np.ndarray, s2: np.ndarray, max_rounds: int, max_states: int) -> Optional[np.ndarray]:
+    """
+    Outcome distribution of a tied matchup by dynamic programming over (hp1, hp2) states.
+
+    After a completed round both players have taken the same total damage whichever order was
+    drawn, so the states only differ by float rounding and stay few. Returns None if more than
+    `max_states` distinct states are alive after some round.
+    """
+    round_probs = np.zeros((3, max_rounds + 1))
+    states = {(float(s1[HP]), float(s2[HP])): 1.0}
+    for round_idx in range(1, max_rounds + 1):
+        next_states: dict[tuple[float, float], float] = {}
+        for (hp1, hp2), prob in states.items():
+            for p1_first in (True, False):
+                winner, hp = _play_round(s1, s2, hp1, hp2, p1_first)
+                if winner is None:
+                    next_states[hp] = next_states.get(hp, 0.0) + 0.5 * prob
+                else:
+                    round_probs[winner, round_idx] += 0.5 * prob
+        if len(next_states) > max_states:
+            return None
+        states = next_states
+        if not states:
+            break
+    round_probs[DRAW, max_rounds] += sum(states.values())
+    return round_probs
+
+# ------------------------------------------------------------
+# Estimator
+# ------------------------------------------------------------
+
+def estimate_matchup(p1, p2, n_samples: int = 10000,
+                     rng: Union[np.random.Generator, int, None] = None,
+                     exact: bool = False, max_rounds: int = 100, max_states: int = 4096) -> MatchupEstimate:
+    """
+    Estimate win/draw probabilities and battle-length distribution of p1 vs p2.
+
+    Matchups with different speeds are deterministic and resolved once. For speed ties, the
+    coin flips of all samples are drawn as one (n_samples, max_rounds) array and the samples
+    are resolved together by `simulate_battles_with_order`.
+
+    Args:
+        p1, p2: `Build`s (anything with atk, defense, revenge, hp and spd attributes)
+        n_samples: Number of Monte Carlo samples for speed ties
+        rng: numpy Generator or seed for the coin flips
+        exact: Compute the tie distribution exactly by dynamic programming, falling back to
+            sampling if it needs more than `max_states` HP states
+        max_rounds: Rounds after which a battle ends in a draw
+        max_states: State limit of the exact mode
+
+    Returns:
+        MatchupEstimate of the matchup
+    """
+    s1, s2 = builds_to_array([p1, p2])
+    if s1[SPD] != s2[SPD]:
+        result = simulate_battles_batch(s1, s2, max_rounds=max_rounds)
+        round_probs = np.zeros((3, max_rounds + 1))
+        round_probs[result.winner[0], result.rounds[0]] = 1.0
+        return MatchupEstimate(round_probs=round_probs, n_samples=0)
+
+    if exact:
+        round_probs = _exact_round_probs(s1, s2, max_rounds, max_states)
+        if round_probs is not None:
+            return MatchupEstimate(round_probs=round_probs, n_samples=0)
+
+    rng = np.random.default_rng(rng)
+    p1_first = rng.random((n_samples, max_rounds)) < 0.5
+    result = simulate_battles_with_order(s1, s2, p1_first)
+    counts = np.zeros((3, max_rounds + 1))
+    np.add.at(counts, (result.winner, result.rounds), 1.0)
+    return MatchupEstimate(round_probs=counts / n_samples, n_samples=n_samples)
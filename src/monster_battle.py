@@ -0,0 +1,262 @@
+"""
+Cooperative 2-player vs monster battles (rulebook: Monster Battles, Skill Tokens & Rewards).
+
+Players are `Build`s as in PvP. Every turn, the two players and the monster act in order of
+speed (ties broken at random, per turn). A player's primary hits the monster; the monster hits
+one player chosen by its targeting rule (Variant A):
+- "slowest"     (A1): the slower player
+- "most_damage" (A2): the player who dealt the most damage last turn
+- "highest_hp"  (A3): the player with the higher current HP
+- "most_vp"     (A4): the player with more victory points
+If the rule does not decide (equal values, or nobody dealt damage yet), the target is drawn
+at random; defeated players are never targeted and do not act. As in `simulate_battle`, the
+target of a primary deals its revenge back if it survives. The battle ends when the monster
+or both players reach 0 HP.
+
+Skill tokens follow System B (split tokens), per player:
+- base:    the monster's reward if it was defeated, half (rounded down) if one player fell
+- attack:  1 per 3 damage dealt
+- defense: 1 per 3 damage blocked
+- speed:   1 per turn acted before the monster
+- hp:      1 per 5 HP remaining
+
+`simulate_monster_battle` runs many seeds of one (team, monster, targeting) setting in
+lock-step and returns the per-seed outcomes, so win rates and turn and token distributions
+of a setting come from one call.
+"""
+
+# Standard library imports
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
+
+from pvp_balance_search import Build
+
+# ------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------
+
+TARGETING: dict[str, str] = {
+    "A1": "slowest",
+    "A2": "most_damage",
+    "A3": "highest_hp",
+    "A4": "most_vp",
+}
+TOKEN_TYPES: tuple[str, ...] = ("base", "attack", "defense", "speed", "hp")
+# indices of the actors in the per-seed arrays
+MONSTER: int = 2
+
+# ------------------------------------------------------------
+# Data structures
+# ------------------------------------------------------------
+
+@dataclass
+class Monster:
+    """A monster card. Monsters have no defense or revenge unless a card says so."""
+    name: str
+    hp: int
+    atk: float
+    spd: float
+    reward: int
+    defense: float = 0.0
+    revenge: float = 0.0
+
+    def __str__(self):
+        return f"{self.name}(HP: {self.hp}, ATK: {self.atk}, SPD: {self.spd}, reward: {self.reward})"
+
+@dataclass(frozen=True)
+class DifficultyTier:
+    """Preliminary monster values of a difficulty tier and its target win rate."""
+    hp_range: tuple[int, int]
+    atk_range: tuple[int, int]
+    spd: float
+    reward: int
+    target_win_rate: float
+
+    def monsters(self, name: str = "Monster") -> list[Monster]:
+        """Every monster of the tier with integer HP and ATK in the (inclusive) ranges."""
+        return [Monster(f"{name} (HP {hp}, ATK {atk})", hp, atk, self.spd, self.reward)
+                for hp in range(self.hp_range[0], self.hp_range[1] + 1)
+                for atk in range(self.atk_range[0], self.atk_range[1] + 1)]
+
+DIFFICULTY_TIERS: dict[str, DifficultyTier] = {
+    "easy": DifficultyTier(hp_range=(10, 15), atk_range=(2, 3), spd=3, reward=3, target_win_rate=0.85),
+    "medium": DifficultyTier(hp_range=(20, 25), atk_range=(4, 5), spd=5, reward=6, target_win_rate=0.65),
+    "hard": DifficultyTier(hp_range=(35, 40), atk_range=(6, 8), spd=7, reward=10, target_win_rate=0.40),
+}
+
+@dataclass
+class MonsterBattleResult:
+    """Outcome of one (team, monster, targeting) setting over S seeds."""
+    won: np.ndarray     # (S,) bool, monster defeated
+    turns: np.ndarray   # (S,) int64, turns played
+    hp: np.ndarray      # (S, 3) float64, HP of (player 1, player 2, monster) at the end
+    tokens: np.ndarray  # (S, 2, len(TOKEN_TYPES)) int64, skill tokens per player and type
+
+    def __len__(self) -> int:
+        return len(self.won)
+
+    @property
+    def win_rate(self) -> float:
+        return float(np.mean(self.won))
+
+    @property
+    def mean_turns(self) -> float:
+        return float(np.mean(self.turns))
+
+    def turn_distribution(self) -> np.ndarray:
+        """Number of seeds that ended after t turns, indexed by t."""
+        return np.bincount(self.turns)
+
+    def token_distribution(self, player: Optional[int] = None, token_type: Optional[str] = None) -> np.ndarray:
+        """
+        Number of seeds in which a player earned k tokens, indexed by k.
+
+        Args:
+            player: 0 or 1 (default: the tokens of both players summed)
+            token_type: One of `TOKEN_TYPES` (default: all types summed)
+        """
+        tokens = self.tokens if token_type is None else self.tokens[..., [TOKEN_TYPES.index(token_type)]]
+        tokens = tokens.sum(axis=2)
+        return np.bincount(tokens.sum(axis=1) if player is None else tokens[:, player])
+
+    def __str__(self):
+        mean_tokens = ", ".join(f"{name} {value:.2f}" for name, value in zip(TOKEN_TYPES, self.tokens.mean(axis=(0, 1))))
+        return (f"win rate {self.win_rate:.1%} over {len(self)} seeds, {self.mean_turns:.2f} turns on average, "
+                f"tokens per player: {mean_tokens}")
+
+# ------------------------------------------------------------
+# Battle engine
+# ------------------------------------------------------------
+
+def _targeting_rule(targeting: str) -> str:
+    rule = TARGETING.get(targeting, targeting)
+    if rule not in TARGETING.values():
+        raise ValueError(f"Unknown targeting rule '{targeting}'. Available rules: "
+                         + ", ".join(f"{key} ({value})" for key, value in TARGETING.items()))
+    return rule
+
+def simulate_monster_battle(team: tuple[Build, Build], monster: Monster, targeting: str = "slowest",
+                            n_seeds: int = 1000, max_turns: int = 100, seed: Optional[int] = None,
+                            vp: tuple[int, int] = (0, 0)) -> MonsterBattleResult:
+    """
+    Simulate `n_seeds` battles of a team of two players against a monster.
+
+    Args:
+        team: The two players
+        monster: The monster
+        targeting: Targeting rule, by name or variant ("A1" .. "A4", see `TARGETING`)
+        n_seeds: Number of battles; they only differ in the random tie-breaks
+        max_turns: Turns after which the battle counts as lost
+        seed: Seed of the generator used for the tie-breaks
+        vp: Victory points of the two players, used by the "most_vp" rule
+
+    Returns:
+        MonsterBattleResult with outcome, turns, final HP and skill tokens of every seed
+    """
+    rule = _targeting_rule(targeting)
+    rng = np.random.default_rng(seed)
+    p1, p2 = team
+    spd = np.array([p1.spd, p2.spd, monster.spd], dtype=np.float64)
+    atk = np.array([max(0.0, p1.atk - monster.defense), max(0.0, p2.atk - monster.defense)])
+    dmg_to = np.array([max(0.0, monster.atk - p1.defense), max(0.0, monster.atk - p2.defense)])
+    blocked = np.array([min(monster.atk, max(0.0, p1.defense)), min(monster.atk, max(0.0, p2.defense))])
+    revenge = np.array([p1.revenge, p2.revenge], dtype=np.float64)
+
+    hp = np.tile(np.array([p1.hp, p2.hp, monster.hp], dtype=np.float64), (n_seeds, 1))
+    won = np.zeros(n_seeds, dtype=bool)
+    turns = np.full(n_seeds, max_turns, dtype=np.int64)
+    dealt = np.zeros((n_seeds, 2))       # damage dealt over the battle
+    dealt_last = np.zeros((n_seeds, 2))  # damage dealt in the previous turn
+    blocked_total = np.zeros((n_seeds, 2))
+    acted_first = np.zeros((n_seeds, 2), dtype=np.int64)
+
+    active = np.arange(n_seeds)
+    for turn in range(1, max_turns + 1):
+        if active.size == 0:
+            break
+        # order of the three actors, fastest first; a random permutation before the stable sort breaks ties
+        shuffled = rng.random((len(active), 3)).argsort(axis=1)
+        order = np.take_along_axis(shuffled, np.argsort(-spd[shuffled], axis=1, kind="stable"), axis=1)
+        monster_slot = np.argmax(order == MONSTER, axis=1)
+        dealt_now = np.zeros((len(active), 2))
+        coin = rng.random(len(active)) < 0.5  # tie-break of the targeting rule
+        finished = np.zeros(len(active), dtype=bool)
+
+        for slot in range(3):
+            actor = order[:, slot]
+            for player in (0, 1):
+                rows = np.flatnonzero((actor == player) & ~finished & (hp[active, player] > 0))
+                if rows.size == 0:
+                    continue
+                seeds = active[rows]
+                acted_first[seeds, player] += slot < monster_slot[rows]
+                # primary hits the monster, which deals its revenge if it survives
+                hp[seeds, MONSTER] -= atk[player]
+                dealt_now[rows, player] += atk[player]
+                killed = hp[seeds, MONSTER] <= 0
+                won[seeds[killed]] = True
+                hp[seeds[~killed], player] -= monster.revenge
+                finished[rows] |= killed | ((hp[seeds, 0] <= 0) & (hp[seeds, 1] <= 0))
+
+            rows = np.flatnonzero((actor == MONSTER) & ~finished)
+            if rows.size == 0:
+                continue
+            seeds = active[rows]
+            alive = hp[seeds, :2] > 0
+            if rule == "slowest":
+                key = -spd[:2] * np.ones((len(rows), 1))
+            elif rule == "most_damage":
+                key = dealt_last[seeds]
+            elif rule == "highest_hp":
+                key = hp[seeds, :2].copy()
+            else:
+                key = np.array(vp, dtype=np.float64) * np.ones((len(rows), 1))
+            target = np.where(key[:, 1] > key[:, 0], 1, np.where(key[:, 0] > key[:, 1], 0, coin[rows].astype(np.int64)))
+            target = np.where(alive[np.arange(len(rows)), target], target, 1 - target)
+            # primary hits the target, who deals revenge if they survive
+            hp[seeds, target] -= dmg_to[target]
+            blocked_total[seeds, target] += blocked[target]
+            survived = hp[seeds, target] > 0
+            hp[seeds[survived], MONSTER] -= revenge[target[survived]]
+            dealt_now[rows[survived], target[survived]] += revenge[target[survived]]
+            killed = hp[seeds, MONSTER] <= 0
+            won[seeds[killed]] = True
+            finished[rows] |= killed | ((hp[seeds, 0] <= 0) & (hp[seeds, 1] <= 0))
+
+        dealt[active] += dealt_now
+        dealt_last[active] = dealt_now
+        turns[active[finished]] = turn
+        active = active[~finished]
+
+    n_fallen = (hp[:, :2] <= 0).sum(axis=1)
+    base = np.where(won & (n_fallen == 0), monster.reward, np.where(won & (n_fallen == 1), monster.reward // 2, 0))
+    tokens = np.stack([
+        np.repeat(base[:, None], 2, axis=1),
+        np.floor(np.maximum(dealt, 0) / 3),
+        np.floor(blocked_total / 3),
+        acted_first,
+        np.floor(np.maximum(hp[:, :2], 0) / 5),
+    ], axis=2).astype(np.int64)
+    return MonsterBattleResult(won=won, turns=turns, hp=hp, tokens=tokens)
+
+# ------------------------------------------------------------
+# Tier tuning
+# ------------------------------------------------------------
+
+def sweep_tier(team: tuple[Build, Build], tier: str, targeting: str = "slowest", n_seeds: int = 1000,
+               max_turns: int = 100, seed: Optional[int] = 0) -> list[tuple[Monster, MonsterBattleResult]]:
+    """
+    Simulate `team` against every monster of a difficulty tier and print the win rates next
+    to the tier's target win rate.
+
+    Returns:
+        (monster, result) per monster of the tier
+    """
+    difficulty = DIFFICULTY_TIERS[tier]
+    results = [(monster, simulate_monster_battle(team, monster, targeting, n_seeds, max_turns, seed))
+               for monster in difficulty.monsters(tier.capitalize())]
+    print(f"{tier} tier, targeting {_targeting_rule(targeting)}, target win rate {difficulty.target_win_rate:.0%}:")
+    for monster, result in results:
+        print(f"  {monster.name:30s} {result}")
+    return results
@@ -0,0 +1,178 @@
+"""
+Checkpoints of a running differential evolution, so long optimizations can be resumed.
+
+A checkpoint holds everything the solver needs to continue exactly where it stopped: the
+population (in the solver's internal [0, 1] scaling, so no precision is lost), its energies,
+the generation and evaluation counters, the states of both random generators involved (the
+solver's numpy RandomState and Python's `random`, which the fitness uses for speed ties) and
+the solver's index permutation, which it shuffles in place to pick mutation partners.
+It is stored as a single compressed `.npz` file, written atomically.
+
+SciPy's `differential_evolution` does not expose its solver, so the optimizers drive the
+private `DifferentialEvolutionSolver` and read some of its private attributes. They are
+listed in `SOLVER_INTERNALS` and checked by `check_solver_internals`, so a SciPy release that
+changes them fails with a clear error instead of resuming incorrectly.
+"""
+
+# Standard library imports
+from dataclasses import dataclass
+import os
+import random
+from typing import Optional
+import numpy as np
+
+# SciPy versions whose solver internals match `SOLVER_INTERNALS` (see pyproject.toml)
+SUPPORTED_SCIPY: str = ">=1.15,<1.17"
+# attributes of DifferentialEvolutionSolver used by this module, `profiling` and `island_optimizer`
+SOLVER_INTERNALS: tuple[str, ...] = ("population", "population_energies", "feasible", "constraint_violation",
+                                     "random_number_generator", "_nfev", "_random_population_index",
+                                     "_mapwrapper", "_scale_parameters")
+
+# ------------------------------------------------------------
+# Data structures
+# ------------------------------------------------------------
+
+@dataclass
+class OptimizerCheckpoint:
+    """State of a differential evolution run after `generation` completed generations."""
+    generation: int
+    nfev: int
+    bounds: np.ndarray               # (n_params, 2)
+    population: np.ndarray           # (pop_size, n_params), scaled to [0, 1] like the solver's
+    population_energies: np.ndarray  # (pop_size,)
+    rng_state: dict                  # `np.random.RandomState.get_state(legacy=False)`
+    sample_order: np.ndarray         # (pop_size,) population index permutation of the solver
+    python_random_state: Optional[tuple] = None  # `random.getstate()`
+
+    @property
+    def best_energy(self) -> float:
+        return float(self.population_energies.min())
+
+    def __str__(self):
+        return (f"generation {self.generation}, {self.nfev} evaluations, "
+                f"population {self.population.shape[0]}, best fitness {self.best_energy:.4f}")
+
+# ------------------------------------------------------------
+# SciPy solver
+# ------------------------------------------------------------
+
+def _unsupported_scipy(detail: str) -> RuntimeError:
+    import scipy
+    return RuntimeError(f"SciPy {scipy.__version__} is not supported by the optimizer ({detail}); "
+                        f"install scipy{SUPPORTED_SCIPY}")
+
+def import_solver_class():
+    """SciPy's private `DifferentialEvolutionSolver`, with a clear error if it has moved."""
+    # imported here: SciPy dominates the import time, and most callers only simulate
+    try:
+        from scipy.optimize._differentialevolution import DifferentialEvolutionSolver
+    except ImportError:
+        raise _unsupported_scipy("scipy.optimize._differentialevolution.DifferentialEvolutionSolver not found") from None
+    return DifferentialEvolutionSolver
+
+def check_solver_internals(solver) -> None:
+    """
+    Raises:
+        RuntimeError: if the solver lacks one of the `SOLVER_INTERNALS`
+    """
+    missing = [name for name in SOLVER_INTERNALS if not hasattr(solver, name)]
+    if missing:
+        raise _unsupported_scipy(f"DifferentialEvolutionSolver has no {', '.join(missing)}")
+
+# ------------------------------------------------------------
+# Capture / restore
+# ------------------------------------------------------------
+
+def capture_checkpoint(solver, generation: int, bounds) -> OptimizerCheckpoint:
+    """Snapshot a `scipy.optimize` DifferentialEvolutionSolver between two generations."""
+    check_solver_internals(solver)
+    return OptimizerCheckpoint(
+        generation=generation,
+        nfev=int(solver._nfev),
+        bounds=np.asarray(bounds, dtype=np.float64),
+        population=solver.population.copy(),
+        population_energies=solver.population_energies.copy(),
+        rng_state=solver.random_number_generator.get_state(legacy=False),
+        sample_order=solver._random_population_index.copy(),
+        python_random_state=random.getstate(),
+    )
+
+def restore_checkpoint(solver, checkpoint: OptimizerCheckpoint, bounds) -> None:
+    """
+    Load a checkpoint into a freshly constructed DifferentialEvolutionSolver.
+
+    Raises:
+        ValueError: if the checkpoint was written for different bounds or population size
+        RuntimeError: if the installed SciPy's solver lacks the restored attributes
+    """
+    check_solver_internals(solver)
+    if not np.array_equal(checkpoint.bounds, np.asarray(bounds, dtype=np.float64)):
+        raise ValueError("Checkpoint was written for different parameter bounds")
+    if checkpoint.population.shape != solver.population.shape:
+        raise ValueError(f"Checkpoint population has shape {checkpoint.population.shape}, "
+                         f"but the solver expects {solver.population.shape} (different popsize?)")
+    solver.population = checkpoint.population.copy()
+    solver.population_energies = checkpoint.population_energies.copy()
+    # no constraints are used, so every member is feasible
+    solver.feasible = np.ones(len(solver.population), dtype=bool)
+    solver.constraint_violation = np.zeros((len(solver.population), 1))
+    solver._nfev = checkpoint.nfev
+    solver.random_number_generator.set_state(checkpoint.rng_state)
+    solver._random_population_index = checkpoint.sample_order.copy()
+    if checkpoint.python_random_state is not None:
+        random.setstate(checkpoint.python_random_state)
+
+# ------------------------------------------------------------
+# File format
+# ------------------------------------------------------------
+
+def save_checkpoint(checkpoint: OptimizerCheckpoint, path: str) -> None:
+    """Write a checkpoint to `path` (.npz). The file is replaced atomically."""
+    rng_state = checkpoint.rng_state
+    arrays = dict(
+        generation=checkpoint.generation,
+        nfev=checkpoint.nfev,
+        bounds=checkpoint.bounds,
+        population=checkpoint.population,
+        population_energies=checkpoint.population_energies,
+        rng_key=rng_state['state']['key'],
+        rng_pos=rng_state['state']['pos'],
+        rng_gauss=(rng_state['gauss'] if rng_state['has_gauss'] else np.nan),
+        sample_order=checkpoint.sample_order,
+    )
+    if checkpoint.python_random_state is not None:
+        version, internal_state, gauss_next = checkpoint.python_random_state
+        arrays.update(python_random_version=version,
+                      python_random_state=np.array(internal_state, dtype=np.int64),
+                      python_random_gauss=(np.nan if gauss_next is None else gauss_next))
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        np.savez_compressed(file, **arrays)
+    os.replace(tmp_path, path)
+
+def load_checkpoint(path: str) -> OptimizerCheckpoint:
+    """Read a checkpoint written by `save_checkpoint`."""
+    with np.load(path) as data:
+        rng_gauss = float(data['rng_gauss'])
+        rng_state = {
+            'bit_generator': 'MT19937',
+            'state': {'key': data['rng_key'].copy(), 'pos': int(data['rng_pos'])},
+            'has_gauss': int(not np.isnan(rng_gauss)),
+            'gauss': 0.0 if np.isnan(rng_gauss) else rng_gauss,
+        }
+        python_random_state = None
+        if 'python_random_state' in data:
+            gauss_next = float(data['python_random_gauss'])
+            python_random_state = (int(data['python_random_version']),
+                                   tuple(int(value) for value in data['python_random_state']),
+                                   None if np.isnan(gauss_next) else gauss_next)
+        return OptimizerCheckpoint(
+            generation=int(data['generation']),
+            nfev=int(data['nfev']),
+            bounds=data['bounds'].copy(),
+            population=data['population'].copy(),
+            population_energies=data['population_energies'].copy(),
+            rng_state=rng_state,
+            sample_order=data['sample_order'].copy(),
+            python_random_state=python_random_state,
+        )
@@ -0,0 +1,293 @@
+"""
+Multi-objective (NSGA-II) search for RPS build triples.
+
+`fitness` folds everything into one number with fixed penalty weights, so trading e.g.
+round length against cycle robustness needs a new run per weighting. This module instead
+keeps three objectives separate and returns their whole Pareto front from one run
+(all objectives are minimized):
+- "cycle_margin":       minus the smallest signed margin of the three cycle matchups, where
+                        the margin of a matchup is the intended winner's remaining HP fraction
+                        minus the intended loser's (draws count at most 0). Negative values
+                        mean that the triple forms an RPS cycle, with room to spare.
+- "round_deviation":    rounds outside the [min_rounds, max_rounds] window, summed over the
+                        three matchups
+- "distinctiveness":    minus the smallest distance between two of the builds, with every stat
+                        scaled to its `STAT_RANGES` interval
+
+Stat ranges and the naming order (ATK: Offense > Balanced > Tank, DEF and HP the other way
+round) are not objectives but constraints: a candidate violating them is dominated by
+every candidate violating them less (Deb's constrained domination).
+
+Every generation is evaluated with one batch engine call for all candidates (as
+`fitness_batch`), and the non-dominated sorting works on a boolean domination matrix built
+in row blocks, so populations of a few thousand candidates stay cheap next to the battles.
+"""
+
+# Standard library imports
+from dataclasses import dataclass, field
+from typing import Optional
+import numpy as np
+
+from batch_battle import ATK, DEF, HP, P1_WINS
+from battle_engines import get_engine
+from pvp_balance_search import Build, STAT_RANGES, _penalize_out_of_range_batch, _params_to_builds
+import profiling
+
+# ------------------------------------------------------------
+# Objectives
+# ------------------------------------------------------------
+
+OBJECTIVES: tuple[str, ...] = ("cycle_margin", "round_deviation", "distinctiveness")
+_STAT_NAMES: tuple[str, ...] = ("atk", "defense", "revenge", "hp", "spd")  # column order of a build
+
+@profiling.timed("pareto_objectives")
+def objectives_batch(params: np.ndarray, min_rounds: int = 3, max_rounds: int = 10,
+                     engine: str = "numpy") -> tuple[np.ndarray, np.ndarray]:
+    """
+    Evaluate the objectives and constraint violations of S parameter vectors at once.
+
+    Args:
+        params: (S, 15) array of parameter vectors in the layout of `_fitness_wrapper`
+        min_rounds: Minimum desired length of each RPS matchup
+        max_rounds: Maximum desired length of each RPS matchup
+        engine: Name of the battle engine resolving all 3 * S matchups (see `battle_engines`)
+
+    Returns:
+        ((S, 3) objectives in the order of `OBJECTIVES`, (S,) constraint violations, 0 if feasible)
+    """
+    stats = np.array(params, dtype=np.float64).reshape(-1, 3, 5)
+    stats[:, :, HP] = np.round(stats[:, :, HP])  # same rounding as `_fitness_wrapper`
+    offense, balanced, tank = stats[:, 0], stats[:, 1], stats[:, 2]
+
+    # O beats T, T beats B, B beats O; interleaved per candidate as in `fitness_batch`
+    first = np.stack([offense, tank, balanced], axis=1).reshape(-1, 5)
+    second = np.stack([tank, balanced, offense], axis=1).reshape(-1, 5)
+    result = get_engine(engine)(first, second, 100)
+    profiling.count_battles(len(result), float(result.rounds.sum()))
+
+    remaining = np.clip(result.hp / np.stack([first[:, HP], second[:, HP]], axis=1), 0.0, 1.0)
+    margin = remaining[:, 0] - remaining[:, 1]
+    margin = np.where(result.winner == P1_WINS, np.maximum(margin, 0.0), np.minimum(margin, 0.0))
+    rounds = result.rounds.reshape(-1, 3)
+
+    scale = np.array([STAT_RANGES[stat][1] - STAT_RANGES[stat][0] for stat in _STAT_NAMES], dtype=np.float64)
+    scaled = stats / scale
+    distance = np.min([np.linalg.norm(scaled[:, i] - scaled[:, j], axis=1) for i, j in ((0, 1), (1, 2), (0, 2))],
+                      axis=0)
+
+    objectives = np.stack([
+        -margin.reshape(-1, 3).min(axis=1),
+        (np.maximum(0, min_rounds - rounds) + np.maximum(0, rounds - max_rounds)).sum(axis=1),
+        -distance,
+    ], axis=1)
+
+    violation = np.zeros(len(stats))
+    for column, stat in enumerate(_STAT_NAMES[:4]):
+        violation += _penalize_out_of_range_batch(stats[:, :, column], STAT_RANGES[stat], multiplier=1).sum(axis=1)
+    proper_names = ((offense[:, ATK] > balanced[:, ATK]) & (balanced[:, ATK] > tank[:, ATK])
+                    & (tank[:, DEF] > balanced[:, DEF]) & (balanced[:, DEF] > offense[:, DEF])
+                    & (offense[:, HP] < balanced[:, HP]) & (balanced[:, HP] < tank[:, HP]))
+    violation += 1.0 - proper_names
+    return objectives, violation
+
+# ------------------------------------------------------------
+# Non-dominated sorting
+# ------------------------------------------------------------
+
+def _domination_matrix(objectives: np.ndarray, violation: np.ndarray, block_size: int = 1024) -> np.ndarray:
+    """(N, N) bool, [i, j] if candidate i (constrained-)dominates candidate j."""
+    n = len(objectives)
+    feasible = violation <= 0
+    dominates = np.empty((n, n), dtype=bool)
+    for start in range(0, n, block_size):
+        stop = min(n, start + block_size)
+        rows = slice(start, stop)
+        # one 2-D comparison per objective is much faster than reducing an (rows, N, M) array
+        no_worse = np.ones((stop - start, n), dtype=bool)
+        better = np.zeros_like(no_worse)
+        for values in objectives.T:
+            no_worse &= values[rows, None] <= values[None, :]
+            better |= values[rows, None] < values[None, :]
+        pareto = no_worse & better
+        both_feasible = feasible[rows, None] & feasible[None, :]
+        dominates[rows] = np.where(both_feasible, pareto,
+                                   feasible[rows, None] & ~feasible[None, :]
+                                   | (~feasible[rows, None] & ~feasible[None, :]
+                                      & (violation[rows, None] < violation[None, :])))
+    return dominates
+
+def non_dominated_sort(objectives: np.ndarray, violation: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Pareto rank of every candidate (0: non-dominated; rank k: dominated only by ranks < k).
+
+    Args:
+        objectives: (N, M) objective values, lower is better
+        violation: (N,) constraint violations; candidates violating less dominate (default: all feasible)
+
+    Returns:
+        (N,) int64 ranks
+    """
+    objectives = np.asarray(objectives, dtype=np.float64)
+    violation = np.zeros(len(objectives)) if violation is None else np.asarray(violation, dtype=np.float64)
+    dominates = _domination_matrix(objectives, violation)
+    n_dominators = dominates.sum(axis=0)
+    ranks = np.full(len(objectives), -1, dtype=np.int64)
+    front = np.flatnonzero(n_dominators == 0)
+    rank = 0
+    while front.size:
+        ranks[front] = rank
+        n_dominators -= dominates[front].sum(axis=0)
+        n_dominators[front] = -1  # never selected again
+        front = np.flatnonzero(n_dominators == 0)
+        rank += 1
+    return ranks
+
+def crowding_distance(objectives: np.ndarray, ranks: np.ndarray) -> np.ndarray:
+    """NSGA-II crowding distance of every candidate within its front (inf at the front's extremes)."""
+    objectives = np.asarray(objectives, dtype=np.float64)
+    distance = np.zeros(len(objectives))
+    for rank in np.unique(ranks):
+        members = np.flatnonzero(ranks == rank)
+        if members.size <= 2:
+            distance[members] = np.inf
+            continue
+        for values in objectives[members].T:
+            order = np.argsort(values, kind="stable")
+            spread = values[order[-1]] - values[order[0]]
+            distance[members[order[[0, -1]]]] = np.inf
+            if spread > 0:
+                distance[members[order[1:-1]]] += (values[order[2:]] - values[order[:-2]]) / spread
+    return distance
+
+# ------------------------------------------------------------
+# Optimization
+# ------------------------------------------------------------
+
+@dataclass
+class ParetoResult:
+    """Final non-dominated feasible candidates of `optimize_builds_pareto`."""
+    params: np.ndarray      # (K, 15) parameter vectors, best cycle margin first
+    objectives: np.ndarray  # (K, len(OBJECTIVES)), lower is better
+    generations: int
+    nfev: int
+    population: np.ndarray = field(default=None, repr=False)  # final population
+    population_objectives: np.ndarray = field(default=None, repr=False)
+    population_violation: np.ndarray = field(default=None, repr=False)
+
+    def __len__(self) -> int:
+        return len(self.params)
+
+    @property
+    def builds(self) -> list[tuple[Build, Build, Build]]:
+        return [_params_to_builds(x) for x in self.params]
+
+    def __str__(self):
+        lines = [f"Pareto front: {len(self)} candidates after {self.generations} generations ({self.nfev} evaluations)",
+                 "  " + "  ".join(f"{name:>16s}" for name in OBJECTIVES)]
+        lines += ["  " + "  ".join(f"{value:16.3f}" for value in row) for row in self.objectives]
+        return "\n".join(lines)
+
+def _tournament(rng: np.random.Generator, ranks: np.ndarray, crowding: np.ndarray, n: int) -> np.ndarray:
+    """Indices of `n` binary tournament winners (lower rank, then larger crowding distance)."""
+    a, b = rng.integers(len(ranks), size=(2, n))
+    a_wins = (ranks[a] < ranks[b]) | ((ranks[a] == ranks[b]) & (crowding[a] >= crowding[b]))
+    return np.where(a_wins, a, b)
+
+def _variation(rng: np.random.Generator, parents: np.ndarray, lower: np.ndarray, upper: np.ndarray,
+               crossover_rate: float, crossover_eta: float, mutation_eta: float) -> np.ndarray:
+    """Simulated binary crossover of consecutive parent pairs, then polynomial mutation."""
+    n, n_params = parents.shape
+    p1, p2 = parents[0::2], parents[1::2]
+    u = rng.random(p1.shape)
+    beta = np.where(u <= 0.5, (2 * u) ** (1 / (crossover_eta + 1)), (1 / (2 * (1 - u))) ** (1 / (crossover_eta + 1)))
+    swap = (rng.random(p1.shape) < 0.5) & (rng.random((len(p1), 1)) < crossover_rate)
+    beta = np.where(swap, beta, 1.0)
+    children = np.concatenate([0.5 * ((1 + beta) * p1 + (1 - beta) * p2),
+                               0.5 * ((1 - beta) * p1 + (1 + beta) * p2)])[:n]
+
+    mutate = rng.random(children.shape) < 1 / n_params
+    u = rng.random(children.shape)
+    delta = np.where(u < 0.5, (2 * u) ** (1 / (mutation_eta + 1)) - 1, 1 - (2 * (1 - u)) ** (1 / (mutation_eta + 1)))
+    children = np.where(mutate, children + delta * (upper - lower), children)
+    return np.clip(children, lower, upper)
+
+def optimize_builds_pareto(
+    atk_ranges: list[tuple[int, int]],
+    def_ranges: list[tuple[int, int]],
+    rev_ranges: list[tuple[int, int]],
+    hp_ranges: list[tuple[int, int]],
+    spd_ranges: list[tuple[int, int]],
+    popsize: int = 1000,
+    generations: int = 100,
+    seed: Optional[int] = None,
+    engine: str = "numpy",
+    min_rounds: int = 3,
+    max_rounds: int = 10,
+    crossover_rate: float = 0.9,
+    crossover_eta: float = 15.0,
+    mutation_eta: float = 20.0,
+    verbose: bool = True
+) -> ParetoResult:
+    """
+    Find the Pareto front of the 15 build parameters with NSGA-II.
+
+    Args:
+        atk_ranges, def_ranges, rev_ranges, hp_ranges, spd_ranges: Stat ranges for
+            [Offense, Balanced, Tank], as in `optimize_builds`
+        popsize: Number of candidates per generation (rounded up to an even number)
+        generations: Number of generations
+        seed: Seed of the variation operators (speed ties are still broken with `random`)
+        engine: Battle engine of the objective evaluation (see `battle_engines`)
+        min_rounds, max_rounds: Round window of the "round_deviation" objective
+        crossover_rate: Probability that a parent pair is recombined
+        crossover_eta, mutation_eta: Distribution indices of SBX and polynomial mutation
+            (larger: children closer to their parents)
+        verbose: Print the front size every generation
+
+    Returns:
+        ParetoResult with the feasible non-dominated candidates of the final population
+    """
+    bounds = np.array([
+        atk_ranges[0], def_ranges[0], rev_ranges[0], hp_ranges[0], spd_ranges[0],
+        atk_ranges[1], def_ranges[1], rev_ranges[1], hp_ranges[1], spd_ranges[1],
+        atk_ranges[2], def_ranges[2], rev_ranges[2], hp_ranges[2], spd_ranges[2],
+    ], dtype=np.float64)
+    lower, upper = bounds[:, 0], bounds[:, 1]
+    popsize += popsize % 2
+    rng = np.random.default_rng(seed)
+
+    # Latin hypercube start, as `optimize_builds`
+    strata = (rng.permuted(np.tile(np.arange(popsize), (len(bounds), 1)), axis=1).T + rng.random((popsize, len(bounds))))
+    population = lower + strata / popsize * (upper - lower)
+    objectives, violation = objectives_batch(population, min_rounds, max_rounds, engine)
+    ranks = non_dominated_sort(objectives, violation)
+    crowding = crowding_distance(objectives, ranks)
+    nfev = popsize
+
+    for generation in range(1, generations + 1):
+        parents = population[_tournament(rng, ranks, crowding, popsize)]
+        offspring = _variation(rng, parents, lower, upper, crossover_rate, crossover_eta, mutation_eta)
+        offspring_objectives, offspring_violation = objectives_batch(offspring, min_rounds, max_rounds, engine)
+        nfev += popsize
+
+        # (mu + lambda) survival: best fronts first, the last front cut by crowding distance
+        merged = np.concatenate([population, offspring])
+        merged_objectives = np.concatenate([objectives, offspring_objectives])
+        merged_violation = np.concatenate([violation, offspring_violation])
+        merged_ranks = non_dominated_sort(merged_objectives, merged_violation)
+        merged_crowding = crowding_distance(merged_objectives, merged_ranks)
+        survivors = np.lexsort((-merged_crowding, merged_ranks))[:popsize]
+        # survivors are whole fronts plus part of one, so their ranks do not change
+        population, objectives, violation = merged[survivors], merged_objectives[survivors], merged_violation[survivors]
+        ranks, crowding = merged_ranks[survivors], merged_crowding[survivors]
+        if verbose:
+            n_feasible = int(np.sum(violation <= 0))
+            print(f"Generation {generation}: front size {int(np.sum((ranks == 0) & (violation <= 0)))}, "
+                  f"{n_feasible} feasible, best cycle margin {-objectives[violation <= 0, 0].min() if n_feasible else np.nan:.3f}")
+
+    front = np.flatnonzero((ranks == 0) & (violation <= 0))
+    _, unique = np.unique(population[front], axis=0, return_index=True)
+    front = front[np.sort(unique)]
+    front = front[np.argsort(objectives[front, 0], kind="stable")]
+    return ParetoResult(params=population[front], objectives=objectives[front], generations=generations, nfev=nfev,
+                        population=population, population_objectives=objectives, population_violation=violation)
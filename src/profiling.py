@@ -0,0 +1,312 @@
+"""
+Lightweight instrumentation of the battle, fitness and optimizer hot paths.
+
+Profiling is off by default. Instrumented functions then only check one module flag, so the
+overhead is one extra function call per instrumented call; the closed-form resolver
+`resolve_battle_fast` is not instrumented itself but counted by its caller `test_rps_cycle`.
+
+When enabled with `enable()`, the instrumented code records:
+- counters: battles resolved, rounds simulated, matchup cache hits/misses, fitness calls
+- timing histograms (power-of-two microsecond buckets) per function or `section`
+- per-generation records of `optimize_builds`: wall time, time spent evaluating the
+  population (including pickling to workers), SciPy's own time, and worker utilization
+
+Pool workers are forked after `enable()`, so they inherit the enabled flag and a small
+shared-memory array, into which they add their counters and busy time after every fitness
+evaluation. `stats()` merges these with the counters of the main process (timing histograms
+are per process). Generation records can be appended to a JSONL trace file.
+"""
+
+# Standard library imports
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field, asdict
+from functools import wraps
+import json
+import math
+import multiprocessing
+import os
+import time
+from typing import Callable, Iterator, Optional
+
+# ------------------------------------------------------------
+# Data structures
+# ------------------------------------------------------------
+
+# counters that pool workers report to the main process
+SHARED_COUNTERS: tuple[str, ...] = ("battle_calls", "rounds_simulated", "cache_hits", "cache_misses",
+                                    "fitness_calls", "fitness_batch_candidates")
+_BUSY_SLOT = len(SHARED_COUNTERS)  # shared slot holding the workers' busy seconds
+N_BUCKETS: int = 40
+
+@dataclass
+class TimingHistogram:
+    """Call durations of one instrumented function or section."""
+    count: int = 0
+    total: float = 0.0
+    min: float = math.inf
+    max: float = 0.0
+    buckets: list[int] = field(default_factory=lambda: [0] * N_BUCKETS)  # bucket k: [2^(k-1), 2^k) microseconds
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        self.buckets[min(N_BUCKETS - 1, max(0, math.frexp(seconds * 1e6)[1]))] += 1
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q: float) -> float:
+        """Upper bucket bound (seconds) below which a fraction `q` of the calls fall."""
+        target, seen = q * self.count, 0
+        for bucket, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= target:
+                return 2.0 ** bucket * 1e-6
+        return self.max
+
+    def __str__(self):
+        return (f"{self.count:10d} calls, total {self.total:9.3f} s, mean {self.mean * 1e6:10.1f} us, "
+                f"p50 < {self.percentile(0.5) * 1e6:.0f} us, p99 < {self.percentile(0.99) * 1e6:.0f} us, "
+                f"max {self.max * 1e6:.0f} us")
+
+@dataclass
+class ProfileStats:
+    """Snapshot returned by `stats()`."""
+    counters: dict[str, float]
+    timings: dict[str, TimingHistogram]
+    generations: list[dict]
+
+    def __str__(self):
+        lines = ["Counters:"]
+        lines += [f"  {name:28s} {value:14,.0f}" for name, value in sorted(self.counters.items())]
+        lines.append("Timings:")
+        lines += [f"  {name:28s} {histogram}" for name, histogram in sorted(self.timings.items())]
+        if self.generations:
+            last = self.generations[-1]
+            wall = sum(record["wall_seconds"] for record in self.generations)
+            evaluation = sum(record["evaluation_seconds"] for record in self.generations)
+            lines.append(f"Generations: {len(self.generations)}, {wall:.3f} s total, {evaluation:.3f} s evaluating "
+                         f"({evaluation / wall:.1%}), last worker utilization "
+                         f"{last['worker_utilization']:.1%}" if wall > 0 else f"Generations: {len(self.generations)}")
+        return "\n".join(lines)
+
+# ------------------------------------------------------------
+# Profiler state
+# ------------------------------------------------------------
+
+_enabled: bool = False
+_owner_pid: Optional[int] = None
+_shared = None  # multiprocessing.Array of SHARED_COUNTERS + busy seconds
+_counters: defaultdict = defaultdict(float)
+_timings: dict[str, TimingHistogram] = {}
+_generations: list[dict] = []
+_trace_file = None
+_run: dict = {}
+_battle_depth: int = 0
+
+def enable(trace_path: Optional[str] = None) -> None:
+    """
+    Start recording (and reset everything recorded so far).
+
+    Args:
+        trace_path: Append one JSON line per optimizer generation to this file
+    """
+    global _enabled, _owner_pid, _shared, _trace_file
+    reset()
+    _owner_pid = os.getpid()
+    _shared = multiprocessing.Array("d", len(SHARED_COUNTERS) + 1)
+    if _trace_file is not None:
+        _trace_file.close()
+    _trace_file = open(trace_path, "a") if trace_path is not None else None
+    _enabled = True
+
+def disable() -> None:
+    """Stop recording; the data recorded so far stays available through `stats()`."""
+    global _enabled, _trace_file
+    _enabled = False
+    if _trace_file is not None:
+        _trace_file.close()
+        _trace_file = None
+
+def is_enabled() -> bool:
+    return _enabled
+
+def reset() -> None:
+    """Forget all counters, timings and generation records."""
+    _counters.clear()
+    _timings.clear()
+    _generations.clear()
+    _run.clear()
+    if _shared is not None:
+        with _shared.get_lock():
+            _shared[:] = [0.0] * len(_shared)
+
+def stats() -> ProfileStats:
+    """Counters (main process + workers), timing histograms (main process) and generation records."""
+    counters = dict(_counters)
+    if _shared is not None and os.getpid() == _owner_pid:
+        for name, value in zip(SHARED_COUNTERS, _shared[:len(SHARED_COUNTERS)]):
+            if value:
+                counters[name] = counters.get(name, 0.0) + value
+        if _shared[_BUSY_SLOT]:
+            counters["worker_busy_seconds"] = _shared[_BUSY_SLOT]
+    return ProfileStats(counters=counters, timings={name: TimingHistogram(**asdict(histogram))
+                                                    for name, histogram in _timings.items()},
+                        generations=[dict(record) for record in _generations])
+
+# ------------------------------------------------------------
+# Recording
+# ------------------------------------------------------------
+
+def count(name: str, n: float = 1) -> None:
+    """Add `n` to a counter."""
+    if _enabled:
+        _counters[name] += n
+
+def _record(name: str, seconds: float) -> None:
+    histogram = _timings.get(name)
+    if histogram is None:
+        histogram = _timings[name] = TimingHistogram()
+    histogram.add(seconds)
+
+_NO_SECTION = nullcontext()
+
+@contextmanager
+def _timed_section(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, time.perf_counter() - start)
+
+def section(name: str):
+    """Context manager timing its body under `name` (a shared no-op context when disabled)."""
+    return _timed_section(name) if _enabled else _NO_SECTION
+
+def timed(name: str) -> Callable:
+    """Decorator timing every call of a function under `name`."""
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def _battle_counts(result) -> tuple[int, float]:
+    """(battles, rounds) of a `BattleResult`, `(BattleResult, hp_log)` or list of `BattleResult`s."""
+    results = result if isinstance(result, list) else [result[0] if isinstance(result, tuple) else result]
+    return len(results), sum(battle.rounds for battle in results)
+
+def timed_battle(name: str, extract: Callable[[object], tuple[int, float]] = _battle_counts) -> Callable:
+    """
+    Like `timed`, and count the battles and rounds of the result (`extract` returns both).
+    Only the outermost battle call is counted, so fallbacks (e.g. `resolve_battle_fast` ->
+    `simulate_battle`) are not counted twice.
+    """
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            global _battle_depth
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            _battle_depth += 1
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                _battle_depth -= 1
+                _record(name, time.perf_counter() - start)
+            if _battle_depth == 0:
+                n_battles, rounds = extract(result)
+                _counters["battle_calls"] += n_battles
+                _counters["rounds_simulated"] += rounds
+            return result
+        return wrapper
+    return decorator
+
+def count_battles(n_battles: int, rounds: float) -> None:
+    """Count battles resolved outside the decorated functions (e.g. by the closed form)."""
+    if _enabled and _battle_depth == 0:
+        _counters["battle_calls"] += n_battles
+        _counters["rounds_simulated"] += rounds
+
+def worker_evaluation_done(seconds: float) -> None:
+    """
+    Called after every fitness evaluation of `optimize_builds`. In pool workers, moves the
+    shared counters and the busy time into shared memory; in the main process, only adds
+    the busy time.
+    """
+    if not _enabled or _shared is None:
+        return
+    with _shared.get_lock():
+        _shared[_BUSY_SLOT] += seconds
+        if os.getpid() != _owner_pid:
+            for i, name in enumerate(SHARED_COUNTERS):
+                if _counters.get(name):
+                    _shared[i] += _counters.pop(name)
+
+# ------------------------------------------------------------
+# Optimizer generations
+# ------------------------------------------------------------
+
+class _TimedMap:
+    """Wraps the solver's map function to time each population evaluation."""
+
+    def __init__(self, mapper: Callable):
+        self.mapper = mapper
+
+    def __call__(self, func, iterable):
+        start = time.perf_counter()
+        try:
+            return self.mapper(func, iterable)
+        finally:
+            _run["evaluation_seconds"] = _run.get("evaluation_seconds", 0.0) + time.perf_counter() - start
+
+    def __getattr__(self, name):
+        return getattr(self.mapper, name)
+
+def instrument_solver(solver, n_workers: int) -> None:
+    """Time the population evaluations of a `DifferentialEvolutionSolver` and start the generation clock."""
+    if not _enabled:
+        return
+    solver._mapwrapper = _TimedMap(solver._mapwrapper)
+    _run.update(n_workers=n_workers, last_time=time.perf_counter(), evaluation_seconds=0.0,
+                last_counters=stats().counters)
+
+def generation_done(generation: int, nfev: int) -> None:
+    """Close the record of a generation and append it to the trace file."""
+    if not _enabled or "last_time" not in _run:
+        return
+    now = time.perf_counter()
+    wall = now - _run["last_time"]
+    counters = stats().counters
+    delta = {name: value - _run["last_counters"].get(name, 0.0) for name, value in counters.items()}
+    busy = delta.pop("worker_busy_seconds", 0.0)
+    evaluation = _run["evaluation_seconds"]
+    record = {
+        "generation": generation,
+        "time": time.time(),
+        "wall_seconds": wall,
+        "evaluation_seconds": evaluation,
+        "scipy_seconds": max(0.0, wall - evaluation),
+        "nfev": nfev,
+        "worker_busy_seconds": busy,
+        "worker_utilization": busy / (evaluation * _run["n_workers"]) if evaluation > 0 else 0.0,
+        "counters": {name: value for name, value in delta.items() if value},
+    }
+    _record("generation", wall)
+    _generations.append(record)
+    if _trace_file is not None:
+        _trace_file.write(json.dumps(record) + "\n")
+        _trace_file.flush()
+    _run.update(last_time=now, evaluation_seconds=0.0, last_counters=counters)
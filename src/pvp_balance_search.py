@@ -6,11 +6,22 @@ Author: OpenAI (ChatGPT, GPT-5)
 """
 
 # Standard library imports
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, replace
+from typing import Callable, Optional
+import math
+import os
+import time
 import numpy as np
-from scipy.optimize import differential_evolution
 import random                  # added for tie-breaking
+from functools import partial
+from batch_battle import ATK, DEF, REV, HP, DRAW, P1_WINS, P2_WINS, builds_to_array
+import profiling
+from battle_engines import get_engine
+from matchup_estimator import estimate_matchup
+from matchup_cache import CacheConfig, MatchupCache, SharedMatchupTable, get_matchup_cache, matchup_cache_stats
+from optimizer_checkpoint import capture_checkpoint, restore_checkpoint, save_checkpoint, load_checkpoint, \
+    check_solver_internals, import_solver_class
+from surrogate import SurrogateConfig, SurrogateScreen, set_surrogate_stats
 
 # ------------------------------------------------------------
 # Constants
@@ -24,6 +35,15 @@ STAT_RANGES = {
     'spd': (1., 10.)   # new speed stat
 }
 
+# fitness penalty weights
+OUT_OF_RANGE_FACTOR: float = 10000
+NAMES_FACTOR: float = 1000
+RPS_FACTOR: float = 100
+ROUNDS_FACTOR: float = 10
+
+# relative distance to 0 HP below which `resolve_battle_fast` defers to the round loop
+FAST_RESOLVE_TOL: float = 1e-9
+
 # ------------------------------------------------------------
 # Data structures
 # ------------------------------------------------------------
@@ -57,9 +77,36 @@ class BattleResult:
 # Battle simulator
 # ------------------------------------------------------------
 
-def simulate_battle(p1: Build, p2: Build, max_rounds: int = 100) -> tuple[BattleResult, list[tuple[int, int]]]:
+@dataclass
+class BattleSummary:
+    """Final HP of both players and the net damage each of them dealt (`record="summary"`)."""
+    final_hp: tuple[float, float]
+    damage_dealt: tuple[float, float]
+
+# what `simulate_battle` records besides the result: nothing, a `BattleSummary` or the HP log
+RECORDING_MODES: tuple[str, ...] = ("none", "summary", "full")
+
+def _battle_record(record: str, p1: Build, p2: Build, hp: tuple[float, float], hp_log: Optional[list]):
+    """Second return value of `simulate_battle` for a recording mode."""
+    if record == "full":
+        return hp_log
+    if record == "summary":
+        return BattleSummary(final_hp=(hp[0], hp[1]), damage_dealt=(p2.hp - hp[1], p1.hp - hp[0]))
+    return None
+
+@profiling.timed_battle("simulate_battle")
+def simulate_battle(p1: Build, p2: Build, max_rounds: int = 100, cache: Optional[MatchupCache] = None,
+                    engine: str = "python", record: str = "full") -> tuple[BattleResult, Optional[object]]:
     """
     Simulate a PvP battle between two builds until one dies or max_rounds is reached.
+    If a `cache` is given, the outcome is stored in it for later `resolve_battle_cached` calls.
+    Other engines than "python" (see `battle_engines`) only log the start and final HP.
+
+    `record` selects the second return value (see `RECORDING_MODES`):
+    - "none":    None; nothing is allocated per round (for callers that only need the result)
+    - "summary": a `BattleSummary` with the final HP and damage totals
+    - "full":    the HP log, a list of (hp1, hp2) tuples at the start and after every round
+    For full trajectories of many battles, pass a buffer to `simulate_battles_batch` instead.
 
     Order resolution:
     - Faster player attacks first. If speeds tie, first attacker is chosen at random.
@@ -70,9 +117,24 @@ def simulate_battle(p1: Build, p2: Build, max_rounds: int = 100) -> tuple[Battle
         4) If A survived, A deals revenge to B
     The battle can end after any of these steps.
     """
+    if record not in RECORDING_MODES:
+        raise ValueError(f"Unknown recording mode '{record}'. Available modes: {', '.join(RECORDING_MODES)}")
+    if cache is not None:
+        result, hp_log = simulate_battle(p1, p2, max_rounds, engine=engine, record=record)
+        _store_result(cache, p1, p2, max_rounds, result)
+        return result, hp_log
+    if engine != "python":
+        batch_result = get_engine(engine)(builds_to_array([p1]), builds_to_array([p2]), max_rounds)
+        final_hp = tuple(batch_result.hp[0].tolist())
+        hp_log = [(float(p1.hp), float(p2.hp)), final_hp] if record == "full" else None
+        return _battle_results([(p1, p2)], batch_result)[0], _battle_record(record, p1, p2, final_hp, hp_log)
+
     hp = [float(p1.hp), float(p2.hp)]
-    hp_log: list[tuple[float, float]] = [(hp[0], hp[1])]
+    full = record == "full"
+    hp_log: Optional[list[tuple[float, float]]] = [(hp[0], hp[1])] if full else None
     builds = [p1, p2]
+    winner: Optional[str] = None
+    n_rounds = max_rounds
 
     for round_idx in range(1, max_rounds + 1):
         # Determine order by speed; tie => random
@@ -89,36 +151,148 @@ def simulate_battle(p1: Build, p2: Build, max_rounds: int = 100) -> tuple[Battle
         dmg_a_to_b = max(0.0, builds[a].atk - builds[b].defense)
         hp[b] -= dmg_a_to_b
         if hp[b] <= 0:
-            winner = builds[a].name
-            hp_log.append((hp[0], hp[1]))
-            return BattleResult(winner=winner, rounds=round_idx), hp_log
+            winner, n_rounds = builds[a].name, round_idx
+            break
 
         # Step 2: b deals revenge to a (if b survived primary)
         hp[a] -= builds[b].revenge
         if hp[a] <= 0:
-            winner = builds[b].name
-            hp_log.append((hp[0], hp[1]))
-            return BattleResult(winner=winner, rounds=round_idx), hp_log
+            winner, n_rounds = builds[b].name, round_idx
+            break
 
         # Step 3: b primary hits a
         dmg_b_to_a = max(0.0, builds[b].atk - builds[a].defense)
         hp[a] -= dmg_b_to_a
         if hp[a] <= 0:
-            winner = builds[b].name
-            hp_log.append((hp[0], hp[1]))
-            return BattleResult(winner=winner, rounds=round_idx), hp_log
+            winner, n_rounds = builds[b].name, round_idx
+            break
 
         # Step 4: a deals revenge to b (if a survived second primary)
         hp[b] -= builds[a].revenge
         if hp[b] <= 0:
-            winner = builds[a].name
-            hp_log.append((hp[0], hp[1]))
-            return BattleResult(winner=winner, rounds=round_idx), hp_log
+            winner, n_rounds = builds[a].name, round_idx
+            break
 
         # commit state and continue
+        if full:
+            hp_log.append((hp[0], hp[1]))
+
+    if full and winner is not None:
         hp_log.append((hp[0], hp[1]))
+    return BattleResult(winner=winner, rounds=n_rounds), _battle_record(record, p1, p2, (hp[0], hp[1]), hp_log)
 
-    return BattleResult(winner=None, rounds=max_rounds), hp_log
+def _is_exact_stat(value: float) -> bool:
+    """True if `value` is a multiple of 1/1024 small enough for exact float sums over a battle."""
+    return abs(value) < 2**20 and float(value * 1024).is_integer()
+
+def _crossing_round(offset: float, loss: float, max_rounds: int) -> Optional[int]:
+    """
+    Find the first round k >= 1 with `offset - k * loss <= 0` (max_rounds + 1 if there is none).
+    Returns None if HP lands within FAST_RESOLVE_TOL of 0 at some round, where float rounding
+    of the step-by-step subtraction may decide the outcome.
+    """
+    if loss > 0:
+        ratio = offset / loss
+        nearest = min(max(round(ratio), 1), max_rounds)
+        if abs(ratio - nearest) * loss <= FAST_RESOLVE_TOL * (1.0 + abs(offset)):
+            return None
+        if ratio > max_rounds:
+            return max_rounds + 1
+        return max(1, math.ceil(ratio))
+    # HP never decreases over rounds, so only the first round can cross
+    if abs(offset - loss) <= FAST_RESOLVE_TOL * (1.0 + abs(offset)):
+        return None
+    return 1 if offset - loss <= 0 else max_rounds + 1
+
+def _crossing_round_exact(offset: float, loss: float, max_rounds: int) -> int:
+    """`_crossing_round` for inputs that pass `_is_exact_stat`, where every HP value is exact."""
+    if loss > 0:
+        ratio = offset / loss
+        return max_rounds + 1 if ratio > max_rounds else max(1, math.ceil(ratio))
+    return 1 if offset - loss <= 0 else max_rounds + 1
+
+def resolve_battle_fast(p1: Build, p2: Build, max_rounds: int = 100) -> BattleResult:
+    """
+    Closed-form equivalent of `simulate_battle` that skips the round loop and the HP log.
+
+    With a fixed order (A faster than B), HP is linear in the round number k at every step:
+        1) after A's primary:   HP_B - k * dmg_AB - (k - 1) * rev_A
+        2) after B's revenge:   HP_A - k * rev_B - (k - 1) * dmg_BA
+        3) after B's primary:   HP_A - k * (rev_B + dmg_BA)
+        4) after A's revenge:   HP_B - k * (dmg_AB + rev_A)
+    Solving each for the first k with HP <= 0 and taking the earliest step gives the winner
+    and round count in O(1).
+
+    Falls back to `simulate_battle` for speed ties, where the order is random each round, and
+    when HP lands almost exactly on 0 for stats that are not exact in floating point, where the
+    loop's repeated subtractions might end up on either side of 0.
+    """
+    if not (p1.spd > p2.spd or p2.spd > p1.spd):
+        return simulate_battle(p1, p2, max_rounds, record="none")[0]
+
+    a, b = (p1, p2) if p1.spd > p2.spd else (p2, p1)
+    hp_a, hp_b = float(a.hp), float(b.hp)
+    dmg_a_to_b = max(0.0, a.atk - b.defense)
+    dmg_b_to_a = max(0.0, b.atk - a.defense)
+    loss_a = b.revenge + dmg_b_to_a
+    loss_b = dmg_a_to_b + a.revenge
+
+    k1 = _crossing_round(hp_b + a.revenge, loss_b, max_rounds)
+    k2 = _crossing_round(hp_a + dmg_b_to_a, loss_a, max_rounds)
+    k3 = _crossing_round(hp_a, loss_a, max_rounds)
+    k4 = _crossing_round(hp_b, loss_b, max_rounds)
+    if k1 is None or k2 is None or k3 is None or k4 is None:
+        if not all(_is_exact_stat(value) for value in (hp_a, hp_b, dmg_a_to_b, dmg_b_to_a, a.revenge, b.revenge)):
+            return simulate_battle(p1, p2, max_rounds, record="none")[0]
+        k1 = _crossing_round_exact(hp_b + a.revenge, loss_b, max_rounds)
+        k2 = _crossing_round_exact(hp_a + dmg_b_to_a, loss_a, max_rounds)
+        k3 = _crossing_round_exact(hp_a, loss_a, max_rounds)
+        k4 = _crossing_round_exact(hp_b, loss_b, max_rounds)
+
+    # earliest step in battle order; index = 4 * round + step
+    rounds, step = divmod(min(4 * k1, 4 * k2 + 1, 4 * k3 + 2, 4 * k4 + 3), 4)
+    if rounds > max_rounds:
+        return BattleResult(winner=None, rounds=max_rounds)
+    return BattleResult(winner=a.name if step in (0, 3) else b.name, rounds=rounds)
+
+def _battle_results(pairs: list[tuple[Build, Build]], batch_result) -> list[BattleResult]:
+    """Convert the winner codes of a `BatchBattleResult` into named `BattleResult`s."""
+    return [BattleResult(winner=None if winner == DRAW else (p1.name, p2.name)[winner], rounds=int(rounds))
+            for (p1, p2), winner, rounds in zip(pairs, batch_result.winner, batch_result.rounds)]
+
+@profiling.timed_battle("resolve_battles")
+def resolve_battles(pairs: list[tuple[Build, Build]], max_rounds: int = 100, engine: str = "numpy") -> list[BattleResult]:
+    """Resolve many matchups with one call of the given engine (see `battle_engines`)."""
+    stats1 = builds_to_array([p1 for p1, _ in pairs])
+    stats2 = builds_to_array([p2 for _, p2 in pairs])
+    return _battle_results(pairs, get_engine(engine)(stats1, stats2, max_rounds))
+
+def _store_result(cache: MatchupCache, p1: Build, p2: Build, max_rounds: int, result: BattleResult) -> None:
+    """Put a deterministic battle outcome into the cache (speed ties are random and skipped)."""
+    if p1.spd > p2.spd or p2.spd > p1.spd:
+        winner = P1_WINS if result.winner == p1.name else P2_WINS if result.winner == p2.name else DRAW
+        cache.put(cache.make_key(p1, p2, max_rounds), (winner, result.rounds))
+
+def resolve_battle_cached(p1: Build, p2: Build, max_rounds: int = 100, cache: Optional[MatchupCache] = None, fast: bool = True) -> BattleResult:
+    """
+    Return the outcome of a battle, looking it up in `cache` first (quantized stats).
+    Misses are resolved with `resolve_battle_fast` (or `simulate_battle` if not `fast`) and stored.
+    Speed ties are random per battle and never cached.
+    """
+    if cache is None or not (p1.spd > p2.spd or p2.spd > p1.spd):
+        return resolve_battle_fast(p1, p2, max_rounds) if fast else simulate_battle(p1, p2, max_rounds, record="none")[0]
+
+    key = cache.make_key(p1, p2, max_rounds)
+    cached = cache.get(key)
+    if cached is not None:
+        profiling.count("cache_hits")
+        winner, rounds = cached
+        return BattleResult(winner=None if winner == DRAW else (p1.name, p2.name)[winner], rounds=rounds)
+
+    profiling.count("cache_misses")
+    result = resolve_battle_fast(p1, p2, max_rounds) if fast else simulate_battle(p1, p2, max_rounds, record="none")[0]
+    _store_result(cache, p1, p2, max_rounds, result)
+    return result
 
 # ------------------------------------------------------------
 # RPS cycle validation and fitness
@@ -163,49 +337,99 @@ def proper_strategy_names(o: Build, b: Build, t: Build) -> bool:
     ]
     return all(stat_order)
 
-def test_rps_cycle(o: Build, b: Build, t: Build) -> tuple[bool, tuple[int, int, int]]:
-    """Return True if (O > T, T > B, B > O) with each win lasting 3–10 rounds."""
-    r1, _ = simulate_battle(o, t)
-    r2, _ = simulate_battle(t, b)
-    r3, _ = simulate_battle(b, o)
+@profiling.timed_battle("test_rps_cycle", extract=lambda result: (3, sum(result[1])))
+def test_rps_cycle(o: Build, b: Build, t: Build, fast: bool = True, cache: Optional[MatchupCache] = None,
+                   engine: Optional[str] = None) -> tuple[bool, tuple[int, int, int]]:
+    """
+    Return True if (O > T, T > B, B > O) with each win lasting 3–10 rounds.
+    With `fast`, matchups are resolved with `resolve_battle_fast` (same results, no round loop).
+    With a `cache`, outcomes of previously seen matchups are reused.
+    With an `engine` name, all three matchups are resolved in one call of that engine instead.
+    """
+    if engine is not None:
+        r1, r2, r3 = resolve_battles([(o, t), (t, b), (b, o)], engine=engine)
+    elif cache is not None:
+        r1 = resolve_battle_cached(o, t, cache=cache, fast=fast)
+        r2 = resolve_battle_cached(t, b, cache=cache, fast=fast)
+        r3 = resolve_battle_cached(b, o, cache=cache, fast=fast)
+    elif fast:
+        r1, r2, r3 = resolve_battle_fast(o, t), resolve_battle_fast(t, b), resolve_battle_fast(b, o)
+    else:
+        r1, _ = simulate_battle(o, t, record="none")
+        r2, _ = simulate_battle(t, b, record="none")
+        r3, _ = simulate_battle(b, o, record="none")
 
     rps_valid = (r1.winner == o.name and r2.winner == t.name and r3.winner == b.name)
     round_lengths = (r1.rounds, r2.rounds, r3.rounds)
     
     return rps_valid, round_lengths
 
-def fitness(offense: Build, balanced: Build, tank: Build, min_rounds: int = 3, max_rounds: int = 10) -> float:
+@profiling.timed("fitness")
+def fitness(offense: Build, balanced: Build, tank: Build, min_rounds: int = 3, max_rounds: int = 10, fast: bool = True,
+            cache: Optional[MatchupCache] = None, expected_value: bool = False, n_samples: int = 1000,
+            seed: Optional[int] = 0, engine: Optional[str] = None, stamina: Optional[int] = None) -> float:
     """
     Continuous fitness function to estimate the quality of an RPS cycle formed by the three builds.
-    Lower is better.
+    Lower is better. `fast`, `cache` and `engine` are passed on to `test_rps_cycle`.
+
+    With `expected_value`, the RPS and round-length penalties are averaged over the outcome
+    distribution of each matchup (`estimate_matchup`, exact where possible, otherwise
+    `n_samples` samples from a Generator seeded with `seed`). Speed ties then no longer make
+    the score random.
+
+    With `stamina`, the attack order is bid from a stamina pool of that size instead of
+    being decided by SPD (see `stamina_game`): the RPS penalty is scaled by the probability
+    of not forming the cycle under equilibrium bidding. Round lengths still come from
+    `test_rps_cycle`.
     """
-    out_of_range_factor: float = 10000
-    names_factor: float = 1000
-    rps_factor: float = 100
-    rounds_factor: float = 10
+    out_of_range_factor: float = OUT_OF_RANGE_FACTOR
+    names_factor: float = NAMES_FACTOR
+    rps_factor: float = RPS_FACTOR
+    rounds_factor: float = ROUNDS_FACTOR
     
+    profiling.count("fitness_calls")
     score = 0.0
     # Penalize distance to valid ranges for all builds
-    for build in (offense, balanced, tank):
-        score += _penalize_out_of_range(build.atk, STAT_RANGES['atk'], multiplier=out_of_range_factor)
-        score += _penalize_out_of_range(build.defense, STAT_RANGES['defense'], multiplier=out_of_range_factor)
-        score += _penalize_out_of_range(build.revenge, STAT_RANGES['revenge'], multiplier=out_of_range_factor)
-        score += _penalize_out_of_range(build.hp, STAT_RANGES['hp'], multiplier=out_of_range_factor)
+    with profiling.section("fitness/out_of_range"):
+        for build in (offense, balanced, tank):
+            score += _penalize_out_of_range(build.atk, STAT_RANGES['atk'], multiplier=out_of_range_factor)
+            score += _penalize_out_of_range(build.defense, STAT_RANGES['defense'], multiplier=out_of_range_factor)
+            score += _penalize_out_of_range(build.revenge, STAT_RANGES['revenge'], multiplier=out_of_range_factor)
+            score += _penalize_out_of_range(build.hp, STAT_RANGES['hp'], multiplier=out_of_range_factor)
     
-    # Large penalty for not forming RPS cycle
-    is_rps_cycle, round_lengths = test_rps_cycle(offense, balanced, tank)
-    if not is_rps_cycle:
-        score += rps_factor
-    
-    # Penalize RPS cycle length deviations
-    for length in round_lengths:
-        if length < min_rounds:
-            score += 5 * rounds_factor * (min_rounds - length)
-        elif length > max_rounds:
-            score += rounds_factor * (length - max_rounds)
+    if expected_value:
+        rng = np.random.default_rng(seed)
+        estimates = [estimate_matchup(p1, p2, n_samples, rng=rng, exact=True)
+                     for p1, p2 in ((offense, tank), (tank, balanced), (balanced, offense))]
+        # Penalty scaled by the probability of not forming the RPS cycle
+        score += rps_factor * (1.0 - np.prod([estimate.p1_win for estimate in estimates]))
+        # Expected penalty of RPS cycle length deviations
+        for estimate in estimates:
+            lengths = np.arange(len(estimate.rounds))
+            penalties = np.where(lengths < min_rounds, 5 * rounds_factor * (min_rounds - lengths),
+                                 np.where(lengths > max_rounds, rounds_factor * (lengths - max_rounds), 0.0))
+            score += float(estimate.rounds @ penalties)
+    else:
+        # Large penalty for not forming RPS cycle
+        is_rps_cycle, round_lengths = test_rps_cycle(offense, balanced, tank, fast=fast, cache=cache, engine=engine)
+        if stamina is not None:
+            from stamina_game import stamina_win_probability  # imported here: stamina_game depends on this module
+            win_probabilities = [stamina_win_probability(p1, p2, stamina)
+                                 for p1, p2 in ((offense, tank), (tank, balanced), (balanced, offense))]
+            score += rps_factor * (1.0 - np.prod(win_probabilities))
+        elif not is_rps_cycle:
+            score += rps_factor
+        
+        # Penalize RPS cycle length deviations
+        for length in round_lengths:
+            if length < min_rounds:
+                score += 5 * rounds_factor * (min_rounds - length)
+            elif length > max_rounds:
+                score += rounds_factor * (length - max_rounds)
     
     # Penalize improper strategy names
-    score += names_factor * (1.0 - proper_strategy_names(offense, balanced, tank))
+    with profiling.section("fitness/names"):
+        score += names_factor * (1.0 - proper_strategy_names(offense, balanced, tank))
 
     # Evaluate advantages for each matchup in the RPS cycle
     matchups = [
@@ -224,11 +448,103 @@ def fitness(offense: Build, balanced: Build, tank: Build, min_rounds: int = 3, m
 
     return score
 
+@dataclass
+class FitnessBreakdown:
+    """Penalty terms of `fitness` for one candidate, with the RPS test they are based on."""
+    out_of_range: float
+    rps: float
+    rounds: float
+    names: float
+    is_rps: bool
+    round_lengths: tuple[int, int, int]
+
+    @property
+    def total(self) -> float:
+        return self.out_of_range + self.rps + self.rounds + self.names
+
+def fitness_breakdown(offense: Build, balanced: Build, tank: Build, min_rounds: int = 3, max_rounds: int = 10,
+                      fast: bool = True, rps_result: Optional[tuple[bool, tuple[int, int, int]]] = None
+                      ) -> FitnessBreakdown:
+    """
+    Split the (non expected-value) `fitness` of three builds into its penalty terms.
+    `rps_result` is the output of `test_rps_cycle` if the matchups were already resolved elsewhere.
+    """
+    out_of_range = sum(_penalize_out_of_range(getattr(build, stat), STAT_RANGES[stat], multiplier=OUT_OF_RANGE_FACTOR)
+                       for build in (offense, balanced, tank) for stat in ('atk', 'defense', 'revenge', 'hp'))
+    is_rps_cycle, round_lengths = test_rps_cycle(offense, balanced, tank, fast=fast) if rps_result is None else rps_result
+    rounds_penalty = sum(5 * ROUNDS_FACTOR * (min_rounds - length) if length < min_rounds
+                         else ROUNDS_FACTOR * (length - max_rounds) if length > max_rounds else 0
+                         for length in round_lengths)
+    return FitnessBreakdown(out_of_range=out_of_range, rps=0.0 if is_rps_cycle else RPS_FACTOR,
+                            rounds=float(rounds_penalty),
+                            names=NAMES_FACTOR * (1.0 - proper_strategy_names(offense, balanced, tank)),
+                            is_rps=is_rps_cycle, round_lengths=round_lengths)
+
+def _penalize_out_of_range_batch(values: np.ndarray, range_bounds: tuple[float, float], multiplier: float = 10) -> np.ndarray:
+    """Vectorized `_penalize_out_of_range`."""
+    return multiplier * (np.maximum(0.0, range_bounds[0] - values) + np.maximum(0.0, values - range_bounds[1]))
+
+@profiling.timed("fitness_batch")
+def fitness_batch(params: np.ndarray, min_rounds: int = 3, max_rounds: int = 10, engine: str = "numpy") -> np.ndarray:
+    """
+    Evaluate `fitness` for S parameter vectors at once using a batch battle engine.
+
+    Args:
+        params: (S, 15) array of parameter vectors in the layout of `_fitness_wrapper`
+        min_rounds: Minimum desired length of each RPS matchup
+        max_rounds: Maximum desired length of each RPS matchup
+        engine: Name of the battle engine resolving all 3 * S matchups (see `battle_engines`)
+
+    Returns:
+        (S,) array of fitness scores, identical to calling `_fitness_wrapper` on each row
+    """
+    stats = np.array(params, dtype=np.float64).reshape(-1, 3, 5)
+    stats[:, :, HP] = np.round(stats[:, :, HP])  # same rounding as `_fitness_wrapper`
+    offense, balanced, tank = stats[:, 0], stats[:, 1], stats[:, 2]
+
+    score = np.zeros(len(stats))
+    for build in (offense, balanced, tank):
+        score += _penalize_out_of_range_batch(build[:, ATK], STAT_RANGES['atk'], multiplier=OUT_OF_RANGE_FACTOR)
+        score += _penalize_out_of_range_batch(build[:, DEF], STAT_RANGES['defense'], multiplier=OUT_OF_RANGE_FACTOR)
+        score += _penalize_out_of_range_batch(build[:, REV], STAT_RANGES['revenge'], multiplier=OUT_OF_RANGE_FACTOR)
+        score += _penalize_out_of_range_batch(build[:, HP], STAT_RANGES['hp'], multiplier=OUT_OF_RANGE_FACTOR)
+
+    # Interleave the matchups (O vs T, T vs B, B vs O) per candidate so speed ties draw
+    # random numbers in the same order as sequential `test_rps_cycle` calls.
+    first = np.stack([offense, tank, balanced], axis=1).reshape(-1, 5)
+    second = np.stack([tank, balanced, offense], axis=1).reshape(-1, 5)
+    result = get_engine(engine)(first, second, 100)
+    profiling.count("fitness_batch_candidates", len(stats))
+    profiling.count_battles(len(result), float(result.rounds.sum()))
+    winners = result.winner.reshape(-1, 3)
+    round_lengths = result.rounds.reshape(-1, 3)
+
+    is_rps_cycle = np.all(winners == P1_WINS, axis=1)
+    score += np.where(is_rps_cycle, 0.0, RPS_FACTOR)
+
+    for length in round_lengths.T:
+        score += np.where(length < min_rounds, 5 * ROUNDS_FACTOR * (min_rounds - length), 0.0)
+        score += np.where(length > max_rounds, ROUNDS_FACTOR * (length - max_rounds), 0.0)
+
+    proper_names = ((offense[:, ATK] > balanced[:, ATK]) & (balanced[:, ATK] > tank[:, ATK])
+                    & (tank[:, DEF] > balanced[:, DEF]) & (balanced[:, DEF] > offense[:, DEF])
+                    & (offense[:, HP] < balanced[:, HP]) & (balanced[:, HP] < tank[:, HP]))
+    score += NAMES_FACTOR * (1.0 - proper_names)
+
+    return score
+
 # ------------------------------------------------------------
 # Optimization
 # ------------------------------------------------------------
 
-def _fitness_wrapper(params: np.ndarray) -> float:
+def _params_to_builds(params: np.ndarray) -> tuple[Build, Build, Build]:
+    """Builds of a flat 15-parameter vector, with HP rounded to integers."""
+    offense = Build("Offense", params[0], params[1], params[2], int(round(params[3])), params[4])
+    balanced = Build("Balanced", params[5], params[6], params[7], int(round(params[8])), params[9])
+    tank = Build("Tank", params[10], params[11], params[12], int(round(params[13])), params[14])
+    return offense, balanced, tank
+
+def _fitness_wrapper(params: np.ndarray, cache_config: Optional[CacheConfig] = None, engine: Optional[str] = None) -> float:
     """
     Wrapper for fitness function that accepts a flat array of 15 parameters.
     
@@ -236,16 +552,40 @@ def _fitness_wrapper(params: np.ndarray) -> float:
         params: Array of [atk_o, def_o, rev_o, hp_o, spd_o,
                          atk_b, def_b, rev_b, hp_b, spd_b,
                          atk_t, def_t, rev_t, hp_t, spd_t]
+        cache_config: If given, matchups are memoized in this process's matchup cache
+        engine: Battle engine passed on to `fitness`
     
     Returns:
         Fitness score (lower is better)
     """
     # Round HP values to integers during fitness evaluation
-    offense = Build("Offense", params[0], params[1], params[2], int(round(params[3])), params[4])
-    balanced = Build("Balanced", params[5], params[6], params[7], int(round(params[8])), params[9])
-    tank = Build("Tank", params[10], params[11], params[12], int(round(params[13])), params[14])
+    offense, balanced, tank = _params_to_builds(params)
     
-    return fitness(offense, balanced, tank)
+    cache = get_matchup_cache(cache_config) if cache_config is not None else None
+    if not profiling.is_enabled():
+        return fitness(offense, balanced, tank, cache=cache, engine=engine)
+    start = time.perf_counter()
+    score = fitness(offense, balanced, tank, cache=cache, engine=engine)
+    profiling.worker_evaluation_done(time.perf_counter() - start)
+    return score
+
+def _fitness_wrapper_vectorized(params: np.ndarray, engine: str = "numpy") -> np.ndarray:
+    """
+    Vectorized wrapper for SciPy's `vectorized=True` mode.
+
+    Args:
+        params: (15, S) array, one candidate per column in the layout of `_fitness_wrapper`
+        engine: Battle engine passed on to `fitness_batch`
+
+    Returns:
+        (S,) array of fitness scores
+    """
+    if not profiling.is_enabled():
+        return fitness_batch(np.asarray(params).T, engine=engine)
+    start = time.perf_counter()
+    scores = fitness_batch(np.asarray(params).T, engine=engine)
+    profiling.worker_evaluation_done(time.perf_counter() - start)
+    return scores
 
 def optimize_builds(
     atk_ranges: list[tuple[int, int]],
@@ -257,7 +597,17 @@ def optimize_builds(
     popsize: int = 15,
     workers: int = -1, # Use all available CPUs
     seed: Optional[int] = None,
-    initial_builds: Optional[tuple[Build, Build, Build]] = None
+    initial_builds: Optional[tuple[Build, Build, Build]] = None,
+    vectorized: bool = False,
+    cache_config: Optional[CacheConfig] = None,
+    engine: Optional[str] = None,
+    checkpoint_path: Optional[str] = None,
+    checkpoint_every: int = 10,
+    resume_from: Optional[str] = None,
+    results_db: Optional[str] = None,
+    surrogate: Optional[SurrogateConfig] = None,
+    robustness: Optional["RobustnessConfig"] = None,
+    on_generation: Optional[Callable[[int, float], None]] = None
 ) -> tuple[Build, Build, Build]:
     """
     Use differential evolution to optimize the 12 build parameters.
@@ -272,10 +622,36 @@ def optimize_builds(
         workers: Number of parallel workers (-1 for all CPUs)
         seed: Random seed for reproducibility
         initial_builds: Optional tuple of (Offense, Balanced, Tank) builds to seed the population
+        vectorized: Evaluate each generation with one `fitness_batch` call instead of one
+            `fitness` call per candidate. Replaces the worker pool (`workers` is ignored).
+        cache_config: Memoize matchup outcomes in a per-process cache with these settings
+            (not used with `vectorized`). With `shared_slots > 0`, all workers also share a
+            shared-memory table of that size for the duration of the run.
+        engine: Battle engine ("python", "numpy" or "jit", see `battle_engines`) used by the
+            fitness evaluation. Defaults to "numpy" when `vectorized`, else per-matchup resolution.
+        checkpoint_path: Save the solver state to this `.npz` file every `checkpoint_every`
+            generations and after the last generation (see `optimizer_checkpoint`)
+        checkpoint_every: Generations between two checkpoints
+        resume_from: Continue the run saved in this checkpoint file instead of starting a new
+            one (`initial_builds` is then ignored). `maxiter` counts the generations of the
+            whole run, including those before the checkpoint. Resuming reproduces the
+            uninterrupted run exactly if the fitness evaluation is deterministic or `workers=1`.
+        results_db: Append every improved best candidate (with fitness breakdown and round
+            lengths) and the final result to this SQLite file (see `results_store`)
+        surrogate: Screen each generation with a surrogate model and evaluate only the most
+            promising candidates with the real fitness (see `surrogate`). Implies `vectorized`.
+        robustness: Minimize `robust_fitness_batch` with these settings instead of the plain
+            fitness, i.e. also penalize cycles that break under perturbed or rounded stats
+            (see `robustness`). Implies `vectorized`; cannot be combined with `surrogate`.
+        on_generation: Called with (generation, best fitness) after every completed generation;
+            with `robustness` or `surrogate`, the best value of the minimized objective
     
     Returns:
         Tuple of optimized (Offense, Balanced, Tank) builds
     """
+    if robustness is not None and surrogate is not None:
+        raise ValueError("robustness and surrogate cannot be combined: the surrogate screens the plain fitness")
+
     # Construct bounds: [atk_o, def_o, rev_o, hp_o, spd_o, atk_b, def_b, rev_b, hp_b, spd_b, atk_t, def_t, rev_t, hp_t, spd_t]
     bounds: list[tuple[float, float]] = [
         atk_ranges[0], def_ranges[0], rev_ranges[0], hp_ranges[0], spd_ranges[0],
@@ -328,37 +704,120 @@ def optimize_builds(
     print(f"\nOptimizing {n_params} parameters with differential evolution...")
     print(f"Effective population size: {pop_size}, Max iterations: {maxiter}")
 
+    shared_table: Optional[SharedMatchupTable] = None
+    if cache_config is not None and cache_config.shared_slots > 0 and cache_config.shared_name is None:
+        shared_table = SharedMatchupTable(cache_config.shared_slots)
+        cache_config = replace(cache_config, shared_name=shared_table.name)
+    if robustness is not None:
+        # imported here: robustness depends on this module
+        from robustness import _robust_fitness_vectorized
+        vectorized = True
+        fitness_func = partial(_robust_fitness_vectorized, config=robustness, engine=engine or "numpy")
+    elif surrogate is not None:
+        vectorized = True
+        fitness_func = SurrogateScreen(partial(fitness_batch, engine=engine or "numpy"), bounds, surrogate)
+    elif vectorized:
+        fitness_func = partial(_fitness_wrapper_vectorized, engine=engine or "numpy")
+    else:
+        fitness_func = partial(_fitness_wrapper, cache_config=cache_config, engine=engine)
+
+    DifferentialEvolutionSolver = import_solver_class()
+
+    checkpoint = load_checkpoint(resume_from) if resume_from is not None else None
+    start_generation: int = checkpoint.generation if checkpoint is not None else 0
+    if checkpoint is not None:
+        print(f"Resuming from {resume_from}: {checkpoint}")
+    solver: Optional[DifferentialEvolutionSolver] = None
+    generation: int = start_generation
+
+    store = None
+    best_logged: float = np.inf
+    if results_db is not None:
+        # imported here: results_store depends on this module
+        from results_store import ResultStore, CandidateRecord
+        store = ResultStore(results_db)
+        run_id = store.start_run(dict(bounds=bounds, maxiter=maxiter, popsize=popsize, seed=seed,
+                                      vectorized=vectorized, engine=engine, resume_from=resume_from))
+
+        def log_candidate(params: np.ndarray, candidate_fitness: float, source: str) -> None:
+            # the breakdown re-runs the RPS test; keep the tie-breaking random stream untouched
+            random_state = random.getstate()
+            builds = _params_to_builds(params)
+            breakdown = fitness_breakdown(*builds)
+            random.setstate(random_state)
+            store.append(CandidateRecord(
+                *builds, fitness=float(candidate_fitness), is_rps=breakdown.is_rps, rounds=breakdown.round_lengths,
+                breakdown=dict(out_of_range=breakdown.out_of_range, rps=breakdown.rps, rounds=breakdown.rounds,
+                               names=breakdown.names),
+                generation=generation, source=source, run_id=run_id))
+
     def callback(xk, convergence):
         """Callback to monitor optimization progress."""
-        current_fitness = _fitness_wrapper(xk)
+        nonlocal generation, best_logged
+        generation += 1
+        if robustness is not None or surrogate is not None:
+            # report the minimized objective, not the plain fitness of the best vector
+            current_fitness = float(solver.population_energies.min())
+        else:
+            current_fitness = _fitness_wrapper(xk, cache_config=cache_config, engine=engine)
         print(f"Generation complete - Best fitness: {current_fitness:.2f}")
+        if on_generation is not None:
+            on_generation(generation, current_fitness)
+        if store is not None:
+            if current_fitness < best_logged:
+                best_logged = current_fitness
+                log_candidate(xk, current_fitness, "optimizer")
+            store.flush()  # readers see every finished generation; an interrupted run loses none
+        if checkpoint_path is not None and (generation % checkpoint_every == 0 or generation == maxiter):
+            save_checkpoint(capture_checkpoint(solver, generation, bounds), checkpoint_path)
+        profiling.generation_done(generation, solver._nfev)
         return False
     
-    result = differential_evolution(
-        _fitness_wrapper,
-        bounds=bounds,
-        strategy='best1bin',
-        maxiter=maxiter,
-        popsize=popsize,
-        tol=0.00001,
-        mutation=(0.5, 1.5),
-        recombination=0.9,
-        seed=seed,
-        workers=workers,
-        updating='deferred',
-        polish=True,
-        disp=True,
-        callback=callback,
-        init=init_population if initial_builds is not None else 'latinhypercube'
-    )
+    try:
+        # The solver class is used instead of `differential_evolution` so its population and
+        # random state can be saved between generations and restored when resuming.
+        with DifferentialEvolutionSolver(
+            fitness_func,
+            bounds=bounds,
+            strategy='best1bin',
+            maxiter=maxiter - start_generation,
+            popsize=popsize,
+            tol=0.00001,
+            mutation=(0.5, 1.5),
+            recombination=0.9,
+            rng=np.random.RandomState(seed),
+            workers=1 if vectorized else workers,
+            updating='deferred',
+            polish=True,
+            disp=True,
+            callback=callback,
+            init=init_population if initial_builds is not None and checkpoint is None else 'latinhypercube',
+            vectorized=vectorized
+        ) as solver:
+            check_solver_internals(solver)
+            if checkpoint is not None:
+                restore_checkpoint(solver, checkpoint, bounds)
+            profiling.instrument_solver(solver, n_workers=1 if vectorized or workers == 1 else
+                                        (os.cpu_count() or 1) if workers == -1 else workers)
+            result = solver.solve()
+        if store is not None:
+            log_candidate(result.x, result.fun, "final")
+    finally:
+        if shared_table is not None:
+            shared_table.close()
+        if store is not None:
+            store.close()
 
     # Extract optimized builds (keep float precision; HP displayed as int)
-    offense = Build("Offense", result.x[0], result.x[1], result.x[2], int(round(result.x[3])), result.x[4])
-    balanced = Build("Balanced", result.x[5], result.x[6], result.x[7], int(round(result.x[8])), result.x[9])
-    tank = Build("Tank", result.x[10], result.x[11], result.x[12], int(round(result.x[13])), result.x[14])
+    offense, balanced, tank = _params_to_builds(result.x)
 
     print(f"\nOptimization complete!")
     print(f"Final fitness score: {result.fun:.4f}")
     print(f"Function evaluations: {result.nfev}")
+    if cache_config is not None:
+        print(f"Matchup cache (main process): {matchup_cache_stats()}")
+    if surrogate is not None:
+        set_surrogate_stats(fitness_func.stats)
+        print(f"Surrogate screening: {fitness_func.stats}")
 
     return offense, balanced, tank
\ No newline at end of file
@@ -0,0 +1,274 @@
+"""
+Append-only SQLite store for candidate builds found by the optimizer.
+
+Every row holds the stats of an (Offense, Balanced, Tank) triple, its fitness and fitness
+breakdown, whether it forms an RPS cycle and the round lengths of the three cycle matchups
+(Offense vs Tank, Tank vs Balanced, Balanced vs Offense). Rows are buffered in memory and
+written in batches inside one transaction, so logging from the optimizer callback costs
+next to nothing. The buffer is written once it is full, once its oldest row is
+`flush_interval` seconds old, and by the optimizer after every generation, so readers of the
+file see a running optimization and an interrupted run loses at most one generation.
+
+`import_rps_cycles_text` imports (and, given speeds, re-simulates) the hand-written
+`found_rps_cycles.txt`; `query_cycles`
+answers questions like "all cycles with rounds in [3, 10] and HP < 15".
+"""
+
+# Standard library imports
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+import json
+import re
+import sqlite3
+import time
+from typing import Optional
+
+from pvp_balance_search import Build, fitness_breakdown
+
+# ------------------------------------------------------------
+# Data structures
+# ------------------------------------------------------------
+
+ARCHETYPES: tuple[str, ...] = ("offense", "balanced", "tank")
+STATS: tuple[str, ...] = ("atk", "defense", "revenge", "hp", "spd")
+BREAKDOWN: tuple[str, ...] = ("out_of_range", "rps", "rounds", "names")
+
+@dataclass
+class CandidateRecord:
+    """One stored candidate. Values that are unknown (e.g. for imported cycles) are None."""
+    offense: Build
+    balanced: Build
+    tank: Build
+    fitness: Optional[float] = None
+    is_rps: Optional[bool] = None
+    rounds: Optional[tuple[int, int, int]] = None  # (O vs T, T vs B, B vs O)
+    breakdown: dict[str, float] = field(default_factory=dict)  # penalty per `BREAKDOWN` term
+    generation: Optional[int] = None
+    source: str = "optimizer"
+    run_id: Optional[int] = None
+    id: Optional[int] = None
+
+    @property
+    def builds(self) -> tuple[Build, Build, Build]:
+        return self.offense, self.balanced, self.tank
+
+    def __str__(self):
+        fitness = "n/a" if self.fitness is None else f"{self.fitness:.4f}"
+        return (f"#{self.id} fitness {fitness}, rounds {self.rounds}\n"
+                + "\n".join(f"  {build}" for build in self.builds))
+
+_STAT_COLUMNS: list[str] = [f"{archetype}_{stat}" for archetype in ARCHETYPES for stat in STATS]
+_ROUND_COLUMNS: list[str] = ["rounds_ot", "rounds_tb", "rounds_bo"]
+_COLUMNS: list[str] = (["run_id", "generation", "source", "fitness", "is_rps"] + _ROUND_COLUMNS
+                       + [f"penalty_{term}" for term in BREAKDOWN] + _STAT_COLUMNS)
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started TEXT NOT NULL,
+    settings TEXT
+);
+CREATE TABLE IF NOT EXISTS candidates (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER REFERENCES runs(run_id),
+    generation INTEGER,
+    source TEXT NOT NULL,
+    fitness REAL,
+    is_rps INTEGER,
+    {", ".join(f"{column} INTEGER" for column in _ROUND_COLUMNS)},
+    {", ".join(f"penalty_{term} REAL" for term in BREAKDOWN)},
+    {", ".join(f"{column} REAL" for column in _STAT_COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS candidates_fitness ON candidates (fitness);
+"""
+
+# ------------------------------------------------------------
+# Store
+# ------------------------------------------------------------
+
+class ResultStore:
+    """
+    Append-only candidate store in an SQLite file.
+
+    Use as a context manager, or call `close()` to write the remaining buffered rows.
+
+    Args:
+        path: SQLite file
+        batch_size: Buffered records that trigger a write
+        flush_interval: Seconds after which buffered records are written at the next `append`
+    """
+
+    def __init__(self, path: str = "results.sqlite", batch_size: int = 256, flush_interval: float = 1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(_SCHEMA)
+        self._buffer: list[tuple] = []
+        self._buffered_since: float = 0.0  # time.monotonic() of the oldest buffered record
+
+    def __enter__(self) -> "ResultStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def start_run(self, settings: Optional[dict] = None) -> int:
+        """Register a new optimizer run and return its id."""
+        with self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO runs (started, settings) VALUES (?, ?)",
+                (datetime.now(timezone.utc).isoformat(timespec="seconds"), json.dumps(settings or {}, default=str)))
+        return cursor.lastrowid
+
+    def append(self, record: CandidateRecord) -> None:
+        """Buffer a record; the buffer is written once it holds `batch_size` records or is `flush_interval` seconds old."""
+        if not self._buffer:
+            self._buffered_since = time.monotonic()
+        self._buffer.append(_record_to_row(record))
+        if len(self._buffer) >= self.batch_size or time.monotonic() - self._buffered_since >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write all buffered records in one transaction."""
+        if not self._buffer:
+            return
+        with self._connection:
+            self._connection.executemany(
+                f"INSERT INTO candidates ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                self._buffer)
+        self._buffer.clear()
+
+    def close(self) -> None:
+        self.flush()
+        self._connection.close()
+
+    def __len__(self) -> int:
+        self.flush()
+        return self._connection.execute("SELECT COUNT(*) FROM candidates").fetchone()[0]
+
+    def query_cycles(self, rounds_range: Optional[tuple[int, int]] = None, hp_below: Optional[float] = None,
+                     is_rps: Optional[bool] = True, run_id: Optional[int] = None, source: Optional[str] = None,
+                     limit: Optional[int] = None) -> list[CandidateRecord]:
+        """
+        Return stored candidates matching all given conditions, best fitness first.
+
+        Args:
+            rounds_range: (min, max) round length that all three cycle matchups must lie in;
+                excludes candidates without known round lengths
+            hp_below: All three builds must have HP strictly below this
+            is_rps: Only RPS cycles (True), only non-cycles (False) or both (None)
+            run_id: Only candidates of this optimizer run
+            source: Only candidates of this source ("optimizer", "final" or "import")
+            limit: Maximum number of records
+
+        Returns:
+            List of matching records
+        """
+        self.flush()
+        conditions, params = [], []
+        if rounds_range is not None:
+            for column in _ROUND_COLUMNS:
+                conditions.append(f"{column} BETWEEN ? AND ?")
+                params += list(rounds_range)
+        if hp_below is not None:
+            for archetype in ARCHETYPES:
+                conditions.append(f"{archetype}_hp < ?")
+                params.append(hp_below)
+        if is_rps is not None:
+            conditions.append("is_rps = ?")
+            params.append(int(is_rps))
+        if run_id is not None:
+            conditions.append("run_id = ?")
+            params.append(run_id)
+        if source is not None:
+            conditions.append("source = ?")
+            params.append(source)
+        sql = f"SELECT id, {', '.join(_COLUMNS)} FROM candidates"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY fitness IS NULL, fitness, id"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return [_row_to_record(row) for row in self._connection.execute(sql, params)]
+
+# ------------------------------------------------------------
+# Row conversion
+# ------------------------------------------------------------
+
+def _record_to_row(record: CandidateRecord) -> tuple:
+    rounds = record.rounds if record.rounds is not None else (None, None, None)
+    stats = [None if getattr(build, stat) is None else float(getattr(build, stat))
+             for build in record.builds for stat in STATS]
+    return (record.run_id, record.generation, record.source, record.fitness,
+            None if record.is_rps is None else int(record.is_rps), *rounds,
+            *(record.breakdown.get(term) for term in BREAKDOWN), *stats)
+
+def _row_to_record(row: tuple) -> CandidateRecord:
+    record_id, run_id, generation, source, fitness, is_rps, *values = row
+    rounds, values = values[:3], values[3:]
+    penalties, stats = values[:len(BREAKDOWN)], values[len(BREAKDOWN):]
+    builds = []
+    for i, archetype in enumerate(ARCHETYPES):
+        atk, defense, revenge, hp, spd = stats[len(STATS) * i:len(STATS) * (i + 1)]
+        builds.append(Build(archetype.capitalize(), atk, defense, revenge, None if hp is None else int(hp), spd))
+    return CandidateRecord(*builds, fitness=fitness, is_rps=None if is_rps is None else bool(is_rps),
+                           rounds=None if rounds[0] is None else tuple(rounds),
+                           breakdown={term: value for term, value in zip(BREAKDOWN, penalties) if value is not None},
+                           generation=generation, source=source, run_id=run_id, id=record_id)
+
+# ------------------------------------------------------------
+# Import of found_rps_cycles.txt
+# ------------------------------------------------------------
+
+_BUILD_PATTERN = re.compile(
+    r"(?P<name>\w+)\(ATK: (?P<atk>[-\d.e]+), DEF: (?P<defense>[-\d.e]+), REV: (?P<revenge>[-\d.e]+), "
+    r"HP: (?P<hp>[-\d.e]+)(?:, SPD: (?P<spd>[-\d.e]+))?\)")
+
+def parse_rps_cycles_text(text: str) -> list[tuple[Build, Build, Build]]:
+    """
+    Parse the `Offense(ATK: .., DEF: .., REV: .., HP: ..)` blocks of `found_rps_cycles.txt`.
+    Builds written before the speed stat existed get `spd=None`.
+    """
+    builds = [Build(match["name"], float(match["atk"]), float(match["defense"]), float(match["revenge"]),
+                    int(float(match["hp"])), None if match["spd"] is None else float(match["spd"]))
+              for match in _BUILD_PATTERN.finditer(text)]
+    if len(builds) % 3 != 0:
+        raise ValueError(f"Expected (Offense, Balanced, Tank) triples, found {len(builds)} builds")
+    triples = [tuple(builds[i:i + 3]) for i in range(0, len(builds), 3)]
+    for triple in triples:
+        if tuple(build.name for build in triple) != ("Offense", "Balanced", "Tank"):
+            raise ValueError(f"Unexpected build order: {', '.join(build.name for build in triple)}")
+    return triples
+
+def import_rps_cycles_text(store: ResultStore, path: str = "found_rps_cycles.txt",
+                           speeds: Optional[tuple[float, float, float]] = None) -> int:
+    """
+    Import the hand-collected cycles of `path` as records with source "import".
+
+    Triples with speeds are re-simulated with the current rules and stored with their real
+    fitness breakdown, `is_rps` and round lengths. The cycles of `found_rps_cycles.txt` were
+    found before the speed stat existed; `speeds` fills in the missing SPD of (Offense,
+    Balanced, Tank). Triples that still have no speed cannot be simulated and are stored with
+    `is_rps`, fitness and round lengths unknown (None), so only `query_cycles(is_rps=None)`
+    without a `rounds_range` returns them.
+
+    Returns:
+        Number of imported cycles
+    """
+    with open(path) as file:
+        triples = parse_rps_cycles_text(file.read())
+    for triple in triples:
+        if speeds is not None:
+            triple = tuple(build if build.spd is not None else replace(build, spd=spd)
+                           for build, spd in zip(triple, speeds))
+        if any(build.spd is None for build in triple):
+            store.append(CandidateRecord(*triple, source="import"))
+            continue
+        breakdown = fitness_breakdown(*triple)
+        store.append(CandidateRecord(*triple, fitness=breakdown.total, is_rps=breakdown.is_rps,
+                                     rounds=breakdown.round_lengths,
+                                     breakdown={term: getattr(breakdown, term) for term in BREAKDOWN},
+                                     source="import"))
+    store.flush()
+    return len(triples)
@@ -0,0 +1,155 @@
+"""
+Robustness of RPS cycles against perturbed and rounded stats.
+
+Printed cards show rounded stats, and balance patches nudge single values, so a cycle found
+by `optimize_builds` is only useful if it survives small changes: a cycle with Offense ATK
+5.87 may break when the card says 6. `robustness` evaluates many variants of a triple in
+one batch engine call. Every variant adds a uniform offset of up to `noise` to each stat
+and then rounds each stat to its `rounding` step. It reports the fraction of variants that
+still form the cycle (`test_rps_cycle`), that still have properly ordered stats
+(`proper_strategy_names`), and that do both.
+
+The offsets are drawn once per (n_variants, seed) and reused for every triple (common
+random numbers), so robustness is a deterministic function of the triple apart from
+speed-tie coin flips, and `optimize_builds(..., robustness=RobustnessConfig())` can
+minimize `robust_fitness_batch` directly.
+"""
+
+# Standard library imports
+from dataclasses import dataclass
+from functools import lru_cache
+import numpy as np
+
+from batch_battle import ATK, DEF, HP, P1_WINS
+from battle_engines import get_engine
+from pvp_balance_search import Build, RPS_FACTOR, fitness_batch
+
+# ------------------------------------------------------------
+# Data structures
+# ------------------------------------------------------------
+
+@dataclass(frozen=True)
+class RobustnessConfig:
+    """
+    Settings of the perturbation analysis.
+
+    Args:
+        n_variants: Perturbed variants evaluated per triple
+        noise: Largest offset added to each stat, per stat in the order ATK, DEF, REV, HP, SPD
+        rounding: Step each perturbed stat is rounded to (0: not rounded), same order
+        seed: Seed of the offsets
+        factor: Weight of the non-robust fraction in `robust_fitness_batch`
+        max_battles: Battles per engine call; larger batches are split by candidate
+    """
+    n_variants: int = 1000
+    noise: tuple[float, float, float, float, float] = (0.5, 0.5, 0.1, 1.0, 0.5)
+    rounding: tuple[float, float, float, float, float] = (1.0, 1.0, 0.1, 1.0, 1.0)
+    seed: int = 0
+    factor: float = RPS_FACTOR
+    max_battles: int = 300_000
+
+@dataclass
+class RobustnessReport:
+    """Fractions of the perturbed variants of one triple that keep its properties."""
+    rps_rate: float              # still an RPS cycle
+    names_rate: float            # stats still ordered as the names say
+    robustness: float            # both
+    matchup_loss: np.ndarray     # (3,) fraction of variants losing O vs T, T vs B, B vs O
+    n_variants: int
+
+    def __str__(self):
+        losses = ", ".join(f"{name} {rate:.1%}" for name, rate in zip(("O>T", "T>B", "B>O"), self.matchup_loss))
+        return (f"robustness {self.robustness:.1%} over {self.n_variants} variants "
+                f"(RPS cycle {self.rps_rate:.1%}, proper names {self.names_rate:.1%}; matchups lost: {losses})")
+
+# ------------------------------------------------------------
+# Perturbation
+# ------------------------------------------------------------
+
+@lru_cache(maxsize=8)
+def _offsets(n_variants: int, seed: int) -> np.ndarray:
+    """(n_variants, 3, 5) uniform offsets in [-1, 1], shared by all triples."""
+    offsets = np.random.default_rng(seed).uniform(-1.0, 1.0, size=(n_variants, 3, 5))
+    offsets.setflags(write=False)
+    return offsets
+
+def perturbed_variants(params: np.ndarray, config: RobustnessConfig = RobustnessConfig()) -> np.ndarray:
+    """
+    Perturbed and rounded variants of S parameter vectors.
+
+    Args:
+        params: (S, 15) parameter vectors in the layout of `_fitness_wrapper`
+        config: Noise, rounding and number of variants
+
+    Returns:
+        (S, n_variants, 3, 5) stats of the variants (HP rounded to integers as in `fitness`)
+    """
+    stats = np.asarray(params, dtype=np.float64).reshape(-1, 1, 3, 5)
+    variants = stats + _offsets(config.n_variants, config.seed) * np.asarray(config.noise)
+    step = np.asarray(config.rounding, dtype=np.float64)
+    variants = np.where(step > 0, np.round(variants / np.where(step > 0, step, 1.0)) * step, variants)
+    variants[..., HP] = np.round(variants[..., HP])
+    return variants
+
+def _evaluate_variants(variants: np.ndarray, engine: str) -> tuple[np.ndarray, np.ndarray]:
+    """Per-variant (S, V, 3) matchup wins of the intended winners and (S, V) naming check."""
+    offense, balanced, tank = variants[..., 0, :], variants[..., 1, :], variants[..., 2, :]
+    first = np.stack([offense, tank, balanced], axis=-2).reshape(-1, 5)
+    second = np.stack([tank, balanced, offense], axis=-2).reshape(-1, 5)
+    wins = (get_engine(engine)(first, second, 100).winner == P1_WINS).reshape(variants.shape[:2] + (3,))
+    proper_names = ((offense[..., ATK] > balanced[..., ATK]) & (balanced[..., ATK] > tank[..., ATK])
+                    & (tank[..., DEF] > balanced[..., DEF]) & (balanced[..., DEF] > offense[..., DEF])
+                    & (offense[..., HP] < balanced[..., HP]) & (balanced[..., HP] < tank[..., HP]))
+    return wins, proper_names
+
+def robustness_batch(params: np.ndarray, config: RobustnessConfig = RobustnessConfig(),
+                     engine: str = "numpy") -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Robustness of S parameter vectors.
+
+    Args:
+        params: (S, 15) parameter vectors in the layout of `_fitness_wrapper`
+        config: Perturbation settings
+        engine: Battle engine resolving the 3 * S * n_variants matchups (see `battle_engines`)
+
+    Returns:
+        (S, 3) fraction of variants that win each cycle matchup, (S,) fraction with proper
+        names and (S,) fraction that form the cycle with proper names
+    """
+    params = np.asarray(params, dtype=np.float64).reshape(-1, 15)
+    chunk = max(1, config.max_battles // (3 * config.n_variants))
+    matchup_rates, names_rates, robust_rates = [], [], []
+    for start in range(0, len(params), chunk):
+        wins, proper_names = _evaluate_variants(perturbed_variants(params[start:start + chunk], config), engine)
+        matchup_rates.append(wins.mean(axis=1))
+        names_rates.append(proper_names.mean(axis=1))
+        robust_rates.append((wins.all(axis=2) & proper_names).mean(axis=1))
+    return np.concatenate(matchup_rates), np.concatenate(names_rates), np.concatenate(robust_rates)
+
+def robustness(offense: Build, balanced: Build, tank: Build, config: RobustnessConfig = RobustnessConfig(),
+               engine: str = "numpy") -> RobustnessReport:
+    """Evaluate the perturbed variants of one triple (see `robustness_batch`)."""
+    params = np.array([[build.atk, build.defense, build.revenge, build.hp, build.spd]
+                       for build in (offense, balanced, tank)], dtype=np.float64).reshape(1, 15)
+    wins, proper_names = _evaluate_variants(perturbed_variants(params, config), engine)
+    return RobustnessReport(rps_rate=float(wins.all(axis=2).mean()), names_rate=float(proper_names.mean()),
+                            robustness=float((wins.all(axis=2) & proper_names).mean()),
+                            matchup_loss=1.0 - wins[0].mean(axis=0), n_variants=config.n_variants)
+
+# ------------------------------------------------------------
+# Optimization
+# ------------------------------------------------------------
+
+def robust_fitness_batch(params: np.ndarray, config: RobustnessConfig = RobustnessConfig(),
+                         engine: str = "numpy") -> np.ndarray:
+    """
+    `fitness_batch` of S parameter vectors plus `config.factor` times the fraction of their
+    variants that lose the cycle or the naming order (lower is better).
+    """
+    params = np.asarray(params, dtype=np.float64).reshape(-1, 15)
+    return fitness_batch(params, engine=engine) + config.factor * (1.0 - robustness_batch(params, config, engine)[2])
+
+def _robust_fitness_vectorized(params: np.ndarray, config: RobustnessConfig = RobustnessConfig(),
+                               engine: str = "numpy") -> np.ndarray:
+    """`robust_fitness_batch` for SciPy's `vectorized=True` mode ((15, S) input)."""
+    return robust_fitness_batch(np.asarray(params).T, config, engine)
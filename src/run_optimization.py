@@ -1,12 +1,44 @@
 """
 Script to run build optimization and visualize results.
+
+The run is checkpointed to `optimization_checkpoint.npz`. An interrupted run is resumed from
+it (`--fresh` starts a new run instead); the file is removed once a run finishes.
 """
+import argparse
+import os
+from typing import Optional
 
 from pvp_balance_search import Build, optimize_builds, simulate_battle, test_rps_cycle, proper_strategy_names, fitness
+from optimizer_checkpoint import load_checkpoint
 from build_plotter import plot_builds
 from test_builds import default_stats
 
+CHECKPOINT_PATH = "optimization_checkpoint.npz"
+MAXITER = 2000
+
+def _resume_path(fresh: bool, resume: bool, parser: argparse.ArgumentParser) -> Optional[str]:
+    """Checkpoint to resume from: only an unfinished run, and never with `--fresh`."""
+    if fresh or (not resume and not os.path.exists(CHECKPOINT_PATH)):
+        return None
+    if not os.path.exists(CHECKPOINT_PATH):
+        parser.error(f"--resume: {CHECKPOINT_PATH} does not exist")
+    generation = load_checkpoint(CHECKPOINT_PATH).generation
+    if generation >= MAXITER:
+        if resume:
+            parser.error(f"--resume: {CHECKPOINT_PATH} is a finished run ({generation} of {MAXITER} generations)")
+        print(f"{CHECKPOINT_PATH} is a finished run, starting a new one")
+        return None
+    print(f"Resuming the unfinished run in {CHECKPOINT_PATH} (use --fresh to start a new one)")
+    return CHECKPOINT_PATH
+
 def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--fresh", action="store_true", help=f"start a new run and overwrite {CHECKPOINT_PATH}")
+    mode.add_argument("--resume", action="store_true", help=f"continue the unfinished run in {CHECKPOINT_PATH}")
+    args = parser.parse_args()
+    resume_from = _resume_path(args.fresh, args.resume, parser)
+
     # Stat ranges for each archetype (Offense, Balanced, Tank)
     atk_ranges = [(1, 10), (1, 10), (1, 10)]
     def_ranges = [(1, 10), (1, 10), (1, 10)]
@@ -36,12 +68,17 @@ def main():
         rev_ranges,
         hp_ranges,
         spd_ranges,            # pass speed ranges
-        maxiter=2000,
+        maxiter=MAXITER,
         popsize=75,
         workers=-1,
         # seed=42,
-        initial_builds=initial_builds  # Use test builds as starting point
+        initial_builds=initial_builds,  # Use test builds as starting point
+        checkpoint_path=CHECKPOINT_PATH,
+        resume_from=resume_from
     )
+    # the run is finished: a later start must not resume it
+    if os.path.exists(CHECKPOINT_PATH):
+        os.remove(CHECKPOINT_PATH)
     
     # Display results
     print("\n" + "=" * 60)
@@ -67,7 +104,7 @@ def main():
     ]
     
     for title, p1, p2 in battles:
-        result, _ = simulate_battle(p1, p2)
+        result, _ = simulate_battle(p1, p2, record="none")
         print(f"{title:25s} {result}")
     
     # Visualize the optimized builds
@@ -0,0 +1,251 @@
+"""
+Stamina bidding as a simultaneous game, solved for mixed-strategy Nash equilibria.
+
+Instead of comparing fixed SPD values, both players start a battle with a stamina pool and
+secretly bid part of it every round; the higher bid attacks first (ties: coin flip) and
+bids are spent. The rest of the round is resolved as in `simulate_battle`.
+
+A state is (hp1, hp2, stamina1, stamina2, rounds_left). Its value is the probability that
+p1 wins when p1 maximizes and p2 minimizes it (draws after `max_rounds` count as not
+winning). By backward induction, every state's bid game is a matrix game whose entries
+are the values of the successor states; it is solved with a linear program (or directly,
+if it has a saddle point). Values of all solved states are memoized per matchup, and
+matchups are kept in a bounded LRU cache, so repeated evaluation (e.g. from `fitness`)
+only does dictionary lookups.
+
+Two observations keep the state space small:
+- If both attack orders lead to the same HP (and neither ends the battle), bidding cannot
+  gain anything: values never decrease with more own stamina, so both bid 0.
+- Without negative revenge, this holds for every round but the last, since both players
+  take the same total damage in a round whatever the order.
+
+HP is rounded to `HP_DECIMALS` decimals after every round: with non-integer stats, the two
+attack orders subtract the same damage in a different order and differ in the last bit,
+which would otherwise defeat the first observation and split states on float noise.
+"""
+
+# Standard library imports
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Union
+import numpy as np
+from scipy.optimize import linprog
+
+from pvp_balance_search import Build
+
+# ------------------------------------------------------------
+# Data structures
+# ------------------------------------------------------------
+
+StaminaState = tuple[float, float, int, int, int]  # (hp1, hp2, stamina1, stamina2, rounds_left)
+RoundOutcome = tuple[float, float, Optional[int]]  # (hp1, hp2, winner or None)
+HP_DECIMALS: int = 9  # HP in states and round keys is rounded to this many decimals
+
+@dataclass
+class StaminaGameStats:
+    """Counters of all stamina games of this process."""
+    hits: int = 0           # state values found in the memo
+    misses: int = 0         # states solved
+    matrix_games: int = 0   # bid games solved with a linear program
+    saddle_points: int = 0  # bid games with a pure equilibrium
+    matchups_cached: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __str__(self):
+        return (f"states: {self.misses} solved, {self.hits} from memo ({self.hit_rate:.1%}); "
+                f"bid games: {self.matrix_games} linear programs, {self.saddle_points} saddle points; "
+                f"matchups cached: {self.matchups_cached}")
+
+_stats = StaminaGameStats()
+
+# ------------------------------------------------------------
+# Matrix games
+# ------------------------------------------------------------
+
+def solve_matrix_game(payoff: np.ndarray, tol: float = 1e-12) -> tuple[float, np.ndarray, np.ndarray]:
+    """
+    Mixed-strategy equilibrium of a zero-sum matrix game (row player maximizes).
+
+    Args:
+        payoff: (m, n) payoffs to the row player
+        tol: Tolerance of the saddle point test
+
+    Returns:
+        (value, row strategy (m,), column strategy (n,))
+    """
+    payoff = np.asarray(payoff, dtype=np.float64)
+    m, n = payoff.shape
+    row_min, col_max = payoff.min(axis=1), payoff.max(axis=0)
+    i, j = int(np.argmax(row_min)), int(np.argmin(col_max))
+    if col_max[j] - row_min[i] <= tol:
+        _stats.saddle_points += 1
+        return float(row_min[i]), np.eye(m)[i], np.eye(n)[j]
+    # maximize v  s.t.  payoff^T x >= v,  sum(x) = 1,  x >= 0
+    _stats.matrix_games += 1
+    result = linprog(
+        c=np.r_[np.zeros(m), -1.0],
+        A_ub=np.c_[-payoff.T, np.ones(n)], b_ub=np.zeros(n),
+        A_eq=np.r_[np.ones(m), 0.0][None, :], b_eq=[1.0],
+        bounds=[(0, None)] * m + [(None, None)],
+        method="highs",
+    )
+    if not result.success:
+        raise RuntimeError(f"Matrix game LP failed: {result.message}")
+    x = np.maximum(result.x[:m], 0)
+    y = np.maximum(-result.ineqlin.marginals, 0)  # duals of the column constraints
+    return float(result.x[m]), x / x.sum(), y / y.sum()
+
+# ------------------------------------------------------------
+# Stamina game
+# ------------------------------------------------------------
+
+def _play_round(builds: tuple[Build, Build], hp: tuple[float, float], p1_first: bool) -> RoundOutcome:
+    """HP after one round of `simulate_battle` with the given order, and the winner (0, 1 or None)."""
+    hp = [float(hp[0]), float(hp[1])]
+    a, b = (0, 1) if p1_first else (1, 0)
+    steps = ((b, max(0.0, builds[a].atk - builds[b].defense), a),  # (target, damage, attacker)
+             (a, builds[b].revenge, b),
+             (a, max(0.0, builds[b].atk - builds[a].defense), b),
+             (b, builds[a].revenge, a))
+    for target, damage, attacker in steps:
+        hp[target] -= damage
+        if hp[target] <= 0:
+            return round(hp[0], HP_DECIMALS), round(hp[1], HP_DECIMALS), attacker
+    # rounded: both orders subtract the same damage, but not always to the same last bit
+    return round(hp[0], HP_DECIMALS), round(hp[1], HP_DECIMALS), None
+
+def _same_outcome(first: RoundOutcome, second: RoundOutcome) -> bool:
+    """Whether two round outcomes have the same winner and HP (up to rounding noise)."""
+    tol = 10.0 ** -HP_DECIMALS
+    return first[2] == second[2] and abs(first[0] - second[0]) <= tol and abs(first[1] - second[1]) <= tol
+
+class StaminaGame:
+    """
+    Bid game of one matchup with memoized state values.
+
+    Args:
+        p1, p2: The two builds (SPD is ignored)
+        stamina: Stamina pool of both players, or (p1's, p2's)
+        max_rounds: Rounds after which the battle ends in a draw
+        bid_step: Granularity of the bids
+    """
+
+    def __init__(self, p1: Build, p2: Build, stamina: Union[int, tuple[int, int]] = 20, max_rounds: int = 100,
+                 bid_step: int = 1):
+        self.builds = (p1, p2)
+        self.stamina = (stamina, stamina) if isinstance(stamina, int) else tuple(stamina)
+        self.max_rounds = max_rounds
+        self.bid_step = bid_step
+        self._values: dict[StaminaState, float] = {}
+        self._rounds: dict[tuple[float, float, bool], RoundOutcome] = {}
+
+    @property
+    def initial_state(self) -> StaminaState:
+        return (round(float(self.builds[0].hp), HP_DECIMALS), round(float(self.builds[1].hp), HP_DECIMALS),
+                self.stamina[0], self.stamina[1], self.max_rounds)
+
+    def _round(self, hp1: float, hp2: float, p1_first: bool) -> RoundOutcome:
+        key = (hp1, hp2, p1_first)
+        if key not in self._rounds:
+            self._rounds[key] = _play_round(self.builds, (hp1, hp2), p1_first)
+        return self._rounds[key]
+
+    def _outcome_value(self, outcome: RoundOutcome, stamina1: int, stamina2: int,
+                       rounds_left: int) -> float:
+        hp1, hp2, winner = outcome
+        if winner is not None:
+            return 1.0 if winner == 0 else 0.0
+        return self.value((hp1, hp2, stamina1, stamina2, rounds_left - 1))
+
+    def _payoff(self, state: StaminaState) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Bid options of both players and the payoff matrix of the state's bid game."""
+        hp1, hp2, stamina1, stamina2, rounds_left = state
+        bids1 = np.arange(0, stamina1 + 1, self.bid_step)
+        bids2 = np.arange(0, stamina2 + 1, self.bid_step)
+        first1, first2 = self._round(hp1, hp2, True), self._round(hp1, hp2, False)
+        payoff = np.empty((len(bids1), len(bids2)))
+        for i, bid1 in enumerate(bids1):
+            for j, bid2 in enumerate(bids2):
+                left1, left2 = int(stamina1 - bid1), int(stamina2 - bid2)
+                if bid1 > bid2:
+                    payoff[i, j] = self._outcome_value(first1, left1, left2, rounds_left)
+                elif bid2 > bid1:
+                    payoff[i, j] = self._outcome_value(first2, left1, left2, rounds_left)
+                else:
+                    payoff[i, j] = 0.5 * (self._outcome_value(first1, left1, left2, rounds_left)
+                                          + self._outcome_value(first2, left1, left2, rounds_left))
+        return bids1, bids2, payoff
+
+    def value(self, state: Optional[StaminaState] = None) -> float:
+        """Probability that p1 wins from `state` (default: the start of the battle) under equilibrium play."""
+        state = self.initial_state if state is None else state
+        if state in self._values:
+            _stats.hits += 1
+            return self._values[state]
+        _stats.misses += 1
+        hp1, hp2, stamina1, stamina2, rounds_left = state
+        if rounds_left <= 0:
+            value = 0.0
+        else:
+            first1, first2 = self._round(hp1, hp2, True), self._round(hp1, hp2, False)
+            if _same_outcome(first1, first2):
+                # the order does not matter: nobody bids (more stamina never lowers one's value)
+                value = self._outcome_value(first1, stamina1, stamina2, rounds_left)
+            else:
+                value = solve_matrix_game(self._payoff(state)[2])[0]
+        self._values[state] = value
+        return value
+
+    def equilibrium(self, state: Optional[StaminaState] = None) -> tuple[dict[int, float], dict[int, float], float]:
+        """
+        Equilibrium bid distributions of both players in `state` (default: the first round).
+
+        Returns:
+            ({bid: probability} of p1, {bid: probability} of p2, value of the state)
+        """
+        state = self.initial_state if state is None else state
+        if _same_outcome(self._round(state[0], state[1], True), self._round(state[0], state[1], False)) or state[4] <= 0:
+            return {0: 1.0}, {0: 1.0}, self.value(state)
+        bids1, bids2, payoff = self._payoff(state)
+        value, x, y = solve_matrix_game(payoff)
+        return ({int(bid): float(p) for bid, p in zip(bids1, x) if p > 1e-9},
+                {int(bid): float(p) for bid, p in zip(bids2, y) if p > 1e-9}, value)
+
+    def __len__(self) -> int:
+        """Number of memoized states."""
+        return len(self._values)
+
+# ------------------------------------------------------------
+# Per-process matchup cache
+# ------------------------------------------------------------
+
+_games: "OrderedDict[tuple, StaminaGame]" = OrderedDict()
+MAX_CACHED_GAMES: int = 4096
+
+def get_stamina_game(p1: Build, p2: Build, stamina: Union[int, tuple[int, int]] = 20, max_rounds: int = 100,
+                     bid_step: int = 1) -> StaminaGame:
+    """Return the cached `StaminaGame` of a matchup (keyed on stats, not names)."""
+    key = ((p1.atk, p1.defense, p1.revenge, p1.hp), (p2.atk, p2.defense, p2.revenge, p2.hp),
+           stamina, max_rounds, bid_step)
+    game = _games.get(key)
+    if game is None:
+        game = _games[key] = StaminaGame(p1, p2, stamina, max_rounds, bid_step)
+        if len(_games) > MAX_CACHED_GAMES:
+            _games.popitem(last=False)
+    else:
+        _games.move_to_end(key)
+    _stats.matchups_cached = len(_games)
+    return game
+
+def stamina_win_probability(p1: Build, p2: Build, stamina: Union[int, tuple[int, int]] = 20,
+                            max_rounds: int = 100) -> float:
+    """Probability that p1 beats p2 when both bid stamina optimally."""
+    return get_stamina_game(p1, p2, stamina, max_rounds).value()
+
+def stamina_game_stats() -> StaminaGameStats:
+    """Counters of all stamina games solved in this process."""
+    return _stats
@@ -0,0 +1,178 @@
+"""
+Surrogate-assisted screening of differential evolution candidates.
+
+`SurrogateScreen` wraps a vectorized fitness function. The first generation is evaluated in
+full; afterwards every generation's trial vectors are ranked by a radial basis function
+model (`scipy.interpolate.RBFInterpolator`, the mean of a Gaussian process with fixed
+kernel) fitted on all candidates evaluated so far, and only the best `screen_fraction` of
+them are evaluated with the real fitness. The others get an infinite score, so differential
+evolution keeps their parent vectors.
+
+The model is fitted on `log1p(fitness)`, which keeps the large out-of-range and naming
+penalties from dominating the fit, and on parameters scaled to [0, 1].
+"""
+
+# Standard library imports
+from dataclasses import dataclass, field
+import math
+from typing import Callable, Optional
+import numpy as np
+
+# ------------------------------------------------------------
+# Data structures
+# ------------------------------------------------------------
+
+@dataclass(frozen=True)
+class SurrogateConfig:
+    """
+    Settings of the surrogate screening.
+
+    Args:
+        screen_fraction: Fraction of each generation's trial vectors evaluated with the real
+            fitness (1.0 = no screening, plain differential evolution)
+        neighbors: Archive points used per prediction (local RBF model)
+        max_archive: Keep at most this many evaluated points, the best ones
+        smoothing: RBF smoothing; > 0 tolerates repeated points with different scores
+        kernel: `RBFInterpolator` kernel
+    """
+    screen_fraction: float = 0.25
+    neighbors: int = 64
+    max_archive: int = 5000
+    smoothing: float = 1e-6
+    kernel: str = "thin_plate_spline"
+
+@dataclass
+class SurrogateStats:
+    """Evaluation counters of a `SurrogateScreen`."""
+    real_evaluations: int = 0
+    screened_out: int = 0
+    history: list[tuple[int, float]] = field(default_factory=list)  # (real evaluations, best fitness so far)
+
+    @property
+    def saved(self) -> float:
+        """Fraction of the proposed candidates that did not need a real evaluation."""
+        proposed = self.real_evaluations + self.screened_out
+        return self.screened_out / proposed if proposed else 0.0
+
+    @property
+    def best(self) -> float:
+        return self.history[-1][1] if self.history else math.inf
+
+    def evaluations_to_reach(self, target: float) -> Optional[int]:
+        """Real evaluations after which the best fitness was <= target (None if never)."""
+        for n_evaluations, best in self.history:
+            if best <= target:
+                return n_evaluations
+        return None
+
+    def __str__(self):
+        return (f"real evaluations: {self.real_evaluations}, screened out by the surrogate: {self.screened_out} "
+                f"({self.saved:.1%} saved)")
+
+# ------------------------------------------------------------
+# Screen
+# ------------------------------------------------------------
+
+class SurrogateScreen:
+    """
+    Vectorized objective for `DifferentialEvolutionSolver(vectorized=True)` that only
+    forwards the most promising candidates to `real_fitness`.
+
+    Args:
+        real_fitness: Scores an (S, n_params) array of candidates
+        bounds: (lower, upper) per parameter, used to scale the model inputs
+        config: Screening settings
+    """
+
+    def __init__(self, real_fitness: Callable[[np.ndarray], np.ndarray], bounds: list[tuple[float, float]],
+                 config: SurrogateConfig = SurrogateConfig()):
+        self.real_fitness = real_fitness
+        self.config = config
+        self.lower, self.upper = np.array(bounds, dtype=np.float64).T
+        self.stats = SurrogateStats()
+        self._x = np.zeros((0, len(bounds)))
+        self._y = np.zeros(0)
+
+    def _scale(self, x: np.ndarray) -> np.ndarray:
+        return (x - self.lower) / (self.upper - self.lower)
+
+    def _evaluate(self, x: np.ndarray) -> np.ndarray:
+        scores = np.asarray(self.real_fitness(x), dtype=np.float64)
+        self._x = np.concatenate([self._x, x])
+        self._y = np.concatenate([self._y, scores])
+        if len(self._y) > self.config.max_archive:
+            keep = np.argsort(self._y, kind="stable")[:self.config.max_archive]
+            self._x, self._y = self._x[keep], self._y[keep]
+        self.stats.real_evaluations += len(x)
+        self.stats.history.append((self.stats.real_evaluations, min(self.stats.best, float(scores.min()))))
+        return scores
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        """Surrogate estimate of the fitness of an (S, n_params) array."""
+        from scipy.interpolate import RBFInterpolator  # imported here: only needed once screening starts
+        model = RBFInterpolator(self._scale(self._x), np.log1p(self._y), kernel=self.config.kernel,
+                                neighbors=min(self.config.neighbors, len(self._y)), smoothing=self.config.smoothing)
+        return np.expm1(model(self._scale(x)))
+
+    def __call__(self, params: np.ndarray) -> np.ndarray:
+        """Score the (n_params, S) candidates of one generation; screened-out ones get inf."""
+        x = np.asarray(params, dtype=np.float64).T
+        n_real = math.ceil(self.config.screen_fraction * len(x))
+        if n_real >= len(x) or len(self._y) < len(x):
+            return self._evaluate(x)  # no screening, or not enough data yet (initial population)
+        chosen = np.argsort(self.predict(x), kind="stable")[:n_real]
+        scores = np.full(len(x), np.inf)
+        scores[chosen] = self._evaluate(x[chosen])
+        self.stats.screened_out += len(x) - n_real
+        return scores
+
+# ------------------------------------------------------------
+# Comparison with plain differential evolution
+# ------------------------------------------------------------
+
+def compare_to_plain(ranges: dict, config: SurrogateConfig = SurrogateConfig(), maxiter: int = 100,
+                     popsize: int = 15, seed: Optional[int] = 0) -> dict[str, float]:
+    """
+    Run `optimize_builds` without and with screening and compare the real evaluations needed
+    to reach the final fitness of the plain run.
+
+    Args:
+        ranges: Stat range keyword arguments of `optimize_builds` (atk_ranges, ..., spd_ranges)
+        config: Screening settings of the surrogate run
+        maxiter, popsize, seed: Optimizer settings of both runs
+
+    Returns:
+        Dictionary with the final fitness and evaluation counts of both runs
+    """
+    from pvp_balance_search import optimize_builds  # imported here: pvp_balance_search depends on this module
+    optimize_builds(**ranges, maxiter=maxiter, popsize=popsize, seed=seed,
+                    surrogate=SurrogateConfig(screen_fraction=1.0))
+    plain = surrogate_stats()
+    optimize_builds(**ranges, maxiter=maxiter, popsize=popsize, seed=seed, surrogate=config)
+    screened = surrogate_stats()
+    target = plain.best
+    report = {
+        "plain_best": plain.best,
+        "plain_evaluations": plain.evaluations_to_reach(target),
+        "surrogate_best": screened.best,
+        "surrogate_evaluations": screened.evaluations_to_reach(target),
+    }
+    if report["surrogate_evaluations"] is not None:
+        report["evaluations_saved"] = report["plain_evaluations"] - report["surrogate_evaluations"]
+    print(f"Plain DE reached {target:.4f} after {report['plain_evaluations']} real evaluations; "
+          f"with the surrogate: {report['surrogate_evaluations']} evaluations (best {screened.best:.4f})")
+    return report
+
+# ------------------------------------------------------------
+# Per-process stats
+# ------------------------------------------------------------
+
+_last_stats: Optional[SurrogateStats] = None
+
+def set_surrogate_stats(stats: SurrogateStats) -> None:
+    global _last_stats
+    _last_stats = stats
+
+def surrogate_stats() -> SurrogateStats:
+    """Counters of the last surrogate-assisted `optimize_builds` run of this process."""
+    return _last_stats if _last_stats is not None else SurrogateStats()
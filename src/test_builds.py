@@ -1,9 +1,18 @@
 """
 Script to test default builds and visualize battle HP logs.
 """
+import os
+import random
+import subprocess
+import time
+import sys
+from dataclasses import replace
 import numpy as np
-import matplotlib.pyplot as plt
-from pvp_balance_search import Build, simulate_battle, test_rps_cycle, proper_strategy_names, fitness
+from pvp_balance_search import Build, simulate_battle, resolve_battle_fast, test_rps_cycle, proper_strategy_names, fitness, fitness_batch, _fitness_wrapper
+from batch_battle import P1_WINS, P2_WINS, simulate_battles_batch
+from battle_engines import ENGINES, JIT_AVAILABLE
+from matchup_cache import MatchupCache
+from matchup_estimator import estimate_matchup
 from build_plotter import ARCHETYPE_TO_COLOR, plot_builds
 
 def default_stats() -> tuple[Build, Build, Build]:
@@ -42,10 +51,16 @@ def stats_from_matrix(scale_factor: float) -> tuple[Build, Build, Build]:
     print(f"{tank}")
     return offense, balanced, tank
 
-def plot_battle(ax: plt.Axes, title: str, hp_log: list[tuple[int, int]]):
-    """Plot HP logs for a single battle on given axis."""
+def plot_battle(ax: "plt.Axes", title: str, hp_log: list[tuple[int, int]] | np.ndarray):
+    """
+    Plot HP logs for a single battle on given axis. `hp_log` is the list returned by
+    `simulate_battle` or one battle's (max_rounds + 1, 2) row of a trajectory buffer of
+    `simulate_battles_batch`, which is used without copying (trailing NaN rows are cut off).
+    """
     player1, player2 = title.split(" vs ")
-    hp1_log, hp2_log = zip(*hp_log)
+    hp_log = np.asarray(hp_log)
+    hp_log = hp_log[:np.count_nonzero(~np.isnan(hp_log[:, 0]))]
+    hp1_log, hp2_log = hp_log[:, 0], hp_log[:, 1]
     
     # Calculate average damage per turn
     avg_dmg_1 = (hp_log[0][1] - hp_log[-1][1]) / len(hp_log)
@@ -91,11 +106,626 @@ def test_default_battle(plot_hp_logs: bool = True):
     
     # plot_builds([offense, balanced, tank])
     if plot_hp_logs:
+        import matplotlib.pyplot as plt  # imported here: slow, and only needed for plotting
         fig, axs = plt.subplots(3, 1, figsize=(5, 8))
         for ax, (title, _, hp_log) in zip(axs, results_and_logs):
             plot_battle(ax, title, hp_log)
         plt.tight_layout()
         plt.show()
 
+def builds_from_vector(params: np.ndarray) -> tuple[Build, Build, Build]:
+    """Builds for a 15-parameter vector, as in `_fitness_wrapper`."""
+    return tuple(Build(name, *params[5 * i:5 * i + 3], int(round(params[5 * i + 3])), params[5 * i + 4])
+                 for i, name in enumerate(("Offense", "Balanced", "Tank")))
+
+def random_parameter_vectors(n: int, seed: int = 0) -> np.ndarray:
+    """Draw n random 15-parameter vectors, some with speed ties and integer stats."""
+    rng = np.random.default_rng(seed)
+    lower = np.array([1, 1, -2, 6, 0] * 3)
+    upper = np.array([10, 10, 2, 25, 10] * 3)
+    params = rng.uniform(lower, upper, size=(n, 15))
+    params[::7, 4] = params[::7, 9]     # Offense/Balanced speed ties
+    params[::11, 9] = params[::11, 14]  # Balanced/Tank speed ties
+    params[::5, [0, 5, 10]] = np.round(params[::5, [0, 5, 10]])
+    return params
+
+def test_batch_fitness_matches_fitness(n_candidates: int = 2000):
+    """Check that the vectorized fitness reproduces `fitness` bit-for-bit on a fixed seed."""
+    params = random_parameter_vectors(n_candidates)
+    random.seed(42)
+    expected = np.array([_fitness_wrapper(p) for p in params])
+    random.seed(42)
+    assert np.array_equal(fitness_batch(params), expected)
+
+def test_resolve_battle_fast_matches_simulate_battle(n_battles: int = 1_000_000):
+    """
+    Property test: `resolve_battle_fast` agrees with the round loop of `simulate_battle` on
+    random builds with continuous, one-decimal and half-point stats (including speed ties
+    and long draws).
+    """
+    rng = np.random.default_rng(1)
+    lower = np.array([0, 0, -2, 1, 0])
+    upper = np.array([10, 10, 3, 40, 10])
+    for decimals in (None, 1, 0.5):
+        stats1 = rng.uniform(lower, upper, size=(n_battles // 3, 5))
+        stats2 = rng.uniform(lower, upper, size=(n_battles // 3, 5))
+        if decimals == 0.5:
+            stats1, stats2 = np.round(stats1 * 2) / 2, np.round(stats2 * 2) / 2
+        elif decimals is not None:
+            stats1, stats2 = np.round(stats1, decimals), np.round(stats2, decimals)
+        stats1[:, 3], stats2[:, 3] = np.round(stats1[:, 3]), np.round(stats2[:, 3])
+        stats2[::13, 4] = stats1[::13, 4]
+
+        for s1, s2 in zip(stats1.tolist(), stats2.tolist()):
+            p1 = Build("P1", s1[0], s1[1], s1[2], int(s1[3]), s1[4])
+            p2 = Build("P2", s2[0], s2[1], s2[2], int(s2[3]), s2[4])
+            # same random stream for both, so speed ties draw the same attack orders
+            random_state = random.getstate()
+            expected, _ = simulate_battle(p1, p2, record="none")
+            random.setstate(random_state)
+            assert resolve_battle_fast(p1, p2) == expected
+
+def test_matchup_cache_reuses_outcomes(n_candidates: int = 500):
+    """Cached fitness equals uncached fitness, and a second pass is served from the cache."""
+    params = random_parameter_vectors(n_candidates, seed=3)
+    cache = MatchupCache(maxsize=4 * n_candidates)
+    random.seed(0)
+    expected = [_fitness_wrapper(p) for p in params]
+    for _ in range(2):
+        random.seed(0)
+        assert [fitness(*builds_from_vector(p), cache=cache) for p in params] == expected
+    stats = cache.stats()
+    assert stats.evictions == 0 and stats.hits >= stats.size
+
+def _write_shared_table(name: str, entries: list[tuple[tuple, tuple[int, int]]], torn: tuple) -> None:
+    """Pool worker of `test_shared_matchup_table_across_processes`: store entries, then tear one slot."""
+    from matchup_cache import SharedMatchupTable
+    table = SharedMatchupTable(name=name)
+    for key, value in entries:
+        table.put(key, value)
+    # a writer stopped between its value and its checksum: the slot holds a value the checksum does not cover
+    slot = table.slots[hash(torn) % len(table.slots)]
+    slot['rounds'] += 1
+    table.close()
+
+def test_shared_matchup_table_across_processes():
+    """Entries written by another process are read back; slots with a stale checksum read as misses."""
+    from concurrent.futures import ProcessPoolExecutor
+    from matchup_cache import SharedMatchupTable
+    table = SharedMatchupTable(n_slots=4096)
+    try:
+        keys = [tuple(int(v) for v in row) for row in np.random.default_rng(4).integers(0, 10**7, size=(50, 11))]
+        keys = list({hash(key) % len(table.slots): key for key in keys}.values())  # one key per slot (direct-mapped)
+        entries = [(key, (i % 3 - 1, i + 1)) for i, key in enumerate(keys)]
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            pool.submit(_write_shared_table, table.name, entries, keys[7]).result()
+        assert all(table.get(key) == value for key, value in entries if key != keys[7])
+        assert table.get(keys[7]) is None
+        assert table.get((1,) * 11) is None  # never written
+        cache = MatchupCache(shared=table)
+        assert cache.get(keys[3]) == entries[3][1] and cache.stats().shared_hits == 1
+    finally:
+        table.close()
+
+def test_estimate_matchup_exact_matches_sampling():
+    """The exact tie distribution agrees with Monte Carlo sampling, which is reproducible by seed."""
+    _, balanced, tank = default_stats2()  # equal speed: random order every round
+    exact = estimate_matchup(tank, balanced, exact=True)
+    sampled = estimate_matchup(tank, balanced, n_samples=200_000, rng=1)
+    assert exact.n_samples == 0 and abs(exact.round_probs.sum() - 1.0) < 1e-12
+    assert np.abs(exact.round_probs - sampled.round_probs).max() < 0.01
+    assert np.array_equal(sampled.round_probs, estimate_matchup(tank, balanced, n_samples=200_000, rng=1).round_probs)
+
+def test_engines_agree(n_candidates: int = 5000):
+    """All registered battle engines return identical results, including speed ties, and the same fitness."""
+    params = random_parameter_vectors(n_candidates, seed=4)
+    stats1, stats2 = params[:, :5].copy(), params[:, 5:10].copy()
+    stats1[:, 3], stats2[:, 3] = np.round(stats1[:, 3]), np.round(stats2[:, 3])
+    results = {}
+    for name, engine in ENGINES.items():
+        random.seed(5)
+        results[name] = (engine(stats1, stats2, 100), fitness_batch(params, engine=name))
+    reference, reference_fitness = results["python"]
+    for result, fitness_scores in results.values():
+        assert np.array_equal(result.winner, reference.winner)
+        assert np.array_equal(result.rounds, reference.rounds)
+        assert np.array_equal(result.hp, reference.hp)
+        assert np.array_equal(fitness_scores, reference_fitness)
+
+def test_jit_compile_is_cached(max_seconds: float = 2.0):
+    """A fresh process loads the compiled JIT kernel from the disk cache instead of recompiling."""
+    if not JIT_AVAILABLE:
+        return
+    script = ("import time; t = time.perf_counter(); from battle_engines import jit_engine; import numpy as np; "
+              "jit_engine(np.ones((1, 5)), np.full((1, 5), 2.0)); print(time.perf_counter() - t)")
+    for _ in range(2):  # the first run may compile and write the cache
+        startup = float(subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).stdout)
+    assert startup < max_seconds
+
+def test_benchmark_regression_check(tmp_path):
+    """Benchmark results survive a JSON round trip, and only slowdowns beyond the threshold are regressions."""
+    from benchmarks import run_benchmarks, save_results, load_results, compare_results
+    results = run_benchmarks(quick=True, groups=["battles"], name_filter="engine_numpy", verbose=False)
+    assert len(results) == 2 and all(result.rate > 0 for result in results)
+    save_results(results, tmp_path / "baseline.json")
+    baseline = load_results(tmp_path / "baseline.json")
+    assert baseline == results
+    slower = [replace(result, rate=result.rate * factor) for result, factor in zip(results, (0.95, 0.5))]
+    regressions = compare_results(baseline, slower, threshold=0.1)
+    assert [regression.name for regression in regressions] == [results[1].name]
+
+def test_optimizer_resume_matches_uninterrupted_run(tmp_path):
+    """Stopping after a checkpoint and resuming gives the same builds as one uninterrupted run."""
+    from pvp_balance_search import optimize_builds
+    ranges = dict(atk_ranges=[(1, 10)] * 3, def_ranges=[(1, 10)] * 3, rev_ranges=[(-2, 2)] * 3,
+                  hp_ranges=[(6, 23), (6, 24), (6, 25)], spd_ranges=[(0, 10)] * 3)
+    checkpoint = str(tmp_path / "checkpoint.npz")
+    for settings in (dict(vectorized=True), dict(workers=1)):
+        random.seed(1)
+        uninterrupted = optimize_builds(**ranges, maxiter=8, popsize=5, seed=3, **settings)
+        optimize_builds(**ranges, maxiter=4, popsize=5, seed=3, checkpoint_path=checkpoint, **settings)
+        random.seed(2)  # restored from the checkpoint
+        resumed = optimize_builds(**ranges, maxiter=8, popsize=5, seed=3, resume_from=checkpoint, **settings)
+        assert [str(build) for build in resumed] == [str(build) for build in uninterrupted]
+    # a solver without the private state a checkpoint needs fails loudly instead of resuming wrongly
+    from optimizer_checkpoint import capture_checkpoint, load_checkpoint, restore_checkpoint
+    import pytest
+    with pytest.raises(RuntimeError, match="_random_population_index"):
+        restore_checkpoint(object(), load_checkpoint(checkpoint), ranges)
+    with pytest.raises(RuntimeError, match="not supported"):
+        capture_checkpoint(object(), 0, ranges)
+
+def test_results_store_import_and_query(tmp_path):
+    """Imported text cycles and logged candidates are stored in batches and can be filtered."""
+    from results_store import ResultStore, CandidateRecord, import_rps_cycles_text
+    from pvp_balance_search import fitness_breakdown
+    with ResultStore(str(tmp_path / "results.sqlite"), batch_size=4) as store:
+        n_imported = import_rps_cycles_text(store, os.path.join(os.path.dirname(os.path.abspath(__file__)), "found_rps_cycles.txt"))
+        assert n_imported == 65 and len(store) == n_imported
+        imported = store.query_cycles(hp_below=15, is_rps=None, source="import")
+        assert imported and all(max(build.hp for build in record.builds) < 15 and record.tank.spd is None
+                                and record.is_rps is None and record.rounds is None for record in imported)
+        # with speeds filled in, imported triples are re-simulated and answer round queries
+        import_rps_cycles_text(store, os.path.join(os.path.dirname(os.path.abspath(__file__)), "found_rps_cycles.txt"),
+                               speeds=(3, 2, 1))
+        simulated = store.query_cycles(rounds_range=(3, 10), hp_below=15, source="import")
+        assert simulated and all(record.tank.spd == 1 and test_rps_cycle(*record.builds) == (True, record.rounds)
+                                 for record in simulated)
+        run_id = store.start_run({"test": True})
+        for params in random_parameter_vectors(20, seed=5):
+            builds = builds_from_vector(params)
+            breakdown = fitness_breakdown(*builds)
+            store.append(CandidateRecord(*builds, fitness=breakdown.total, is_rps=breakdown.is_rps,
+                                         rounds=breakdown.round_lengths, run_id=run_id))
+        logged = store.query_cycles(is_rps=None, run_id=run_id)
+        assert len(logged) == 20 and [r.fitness for r in logged] == sorted(r.fitness for r in logged)
+        for record in store.query_cycles(rounds_range=(3, 10), hp_below=15, is_rps=None):
+            assert all(3 <= rounds <= 10 for rounds in record.rounds)
+    # records reach the file during a run: after every generation and once the buffer is flush_interval old
+    import sqlite3
+    from pvp_balance_search import optimize_builds
+    path = str(tmp_path / "running.sqlite")
+    def stored_rows():
+        with sqlite3.connect(path) as reader:
+            return reader.execute("SELECT COUNT(*) FROM candidates").fetchone()[0]
+    visible = []
+    optimize_builds([(1, 10)] * 3, [(1, 10)] * 3, [(-2, 2)] * 3, [(6, 23), (6, 24), (6, 25)], [(0, 10)] * 3,
+                    maxiter=3, popsize=5, seed=3, workers=1, results_db=path,
+                    on_generation=lambda generation, best: visible.append(stored_rows()))
+    assert visible[0] == 0 and visible[1] >= 1  # the first generation's best is written before the second ends
+    with ResultStore(path, flush_interval=0.0) as store:
+        before = stored_rows()
+        store.append(CandidateRecord(*default_stats(), source="test"))
+        assert stored_rows() == before + 1
+
+def test_island_optimizer_exchanges_migrants():
+    """Islands run in separate processes, exchange their best vectors and report results best first."""
+    from island_optimizer import optimize_builds_islands
+    results = optimize_builds_islands(atk_ranges=[(1, 10)] * 3, def_ranges=[(1, 10)] * 3, rev_ranges=[(-2, 2)] * 3,
+                                      hp_ranges=[(6, 23), (6, 24), (6, 25)], spd_ranges=[(0, 10)] * 3,
+                                      n_islands=2, maxiter=10, popsize=5, migration_interval=2, seed=0)
+    assert sorted(result.island for result in results) == [0, 1]
+    assert [result.fun for result in results] == sorted(result.fun for result in results)
+    assert all(0 < result.migrants_sent <= 10 and result.migrants_accepted <= 10 for result in results)
+
+def test_tournament_matches_pairwise_battles(n_builds: int = 30):
+    """The batched N x N tournament agrees with one `simulate_battle` per pair and generalizes `fitness`."""
+    from tournament import play_tournament, rotation_pairings, tournament_fitness
+    from pvp_balance_search import NAMES_FACTOR
+    params = random_parameter_vectors(n_builds, seed=6)
+    params[:, 4] = np.arange(n_builds) * 0.25  # distinct speeds: every battle is deterministic
+    builds = [replace(builds_from_vector(p)[0], name=f"Build {i}") for i, p in enumerate(params)]
+    tournament = play_tournament(builds)
+    assert np.array_equal(tournament.outcome, -tournament.outcome.T)
+    for i, j in [(0, 1), (3, 17), (29, 5)]:
+        result, _ = simulate_battle(builds[i], builds[j])
+        assert tournament.rounds[i, j] == result.rounds
+        assert tournament.beats[i, j] == (result.winner == builds[i].name)
+        assert tournament.beats[j, i] == (result.winner == builds[j].name)
+    for cycle in tournament.cycles(3):
+        assert tournament.is_cycle(cycle) and cycle[0] == min(cycle)
+    pairs = {tuple(sorted(pair)) for pvp_round in range(3) for pair in rotation_pairings(4, pvp_round)}
+    assert len(pairs) == 6
+
+    offense, balanced, tank = default_stats()
+    expected = fitness(offense, balanced, tank) - NAMES_FACTOR * (1 - proper_strategy_names(offense, balanced, tank))
+    assert np.isclose(tournament_fitness([offense, tank, balanced]), expected)
+
+def test_balance_atlas_matches_brute_force(tmp_path):
+    """Atlas cycle counts equal a brute-force sweep, and a grid extension only simulates the new pairs."""
+    import pytest
+    from balance_atlas import BalanceAtlas, StatGrid
+    def grids(offense_hp):
+        return {"offense": StatGrid(atk=[5, 6.5], defense=[1, 2], revenge=[0, 0.5], hp=offense_hp, spd=[6, 8]),
+                "balanced": StatGrid(atk=[4, 5], defense=[2, 3], revenge=[0.5, 1], hp=[10, 12], spd=[4, 6]),
+                "tank": StatGrid(atk=[2, 3], defense=[3, 4.5], revenge=[0.5, 1.5], hp=[14, 16], spd=[2, 6])}
+    def brute_force(grids, rounds_range=(3, 10)):
+        builds = {name: [Build(name.capitalize(), *row[:3], int(row[3]), row[4]) for row in grid.builds()]
+                  for name, grid in grids.items()}
+        count = 0
+        for o in builds["offense"]:
+            for b in builds["balanced"]:
+                for t in builds["tank"]:
+                    if not proper_strategy_names(o, b, t) or len({o.spd, b.spd, t.spd}) < 3:
+                        continue  # speed ties are excluded from the atlas
+                    is_rps, rounds = test_rps_cycle(o, b, t)
+                    count += is_rps and all(rounds_range[0] <= length <= rounds_range[1] for length in rounds)
+        return count
+    atlas = BalanceAtlas(str(tmp_path), grids([8, 10]))
+    n_simulated = atlas.update()
+    assert 0 < atlas.count_cycles() == brute_force(grids([8, 10])) == len(atlas.cycles())
+    extended = BalanceAtlas(str(tmp_path), grids([8, 9, 10]))
+    n_new = extended.update()
+    assert 0 < n_new < n_simulated and extended.update() == 0
+    assert extended.count_cycles() == brute_force(grids([8, 9, 10]))
+    # shifting a range leaves off-grid rows in the store; they must not hide pairs of the new grid
+    shifted = grids([8, 9, 10])
+    shifted["tank"].hp = [15, 16, 17]
+    moved = BalanceAtlas(str(tmp_path), shifted)
+    moved.update()
+    fresh = BalanceAtlas(str(tmp_path / "fresh"), shifted)
+    fresh.update()
+    def stored_pairs(atlas, first, second):
+        pairs = set()
+        for atk_a, atk_b, _, _ in atlas._chunks(first, second):
+            stats_a, stats_b, _, _ = atlas._load_chunk(atlas._chunk_path(first, second, atk_a, atk_b))
+            ia, ib = atlas.grids[first].index_of(stats_a), atlas.grids[second].index_of(stats_b)
+            pairs |= {(a, b) for a, b in zip(ia, ib) if a >= 0 and b >= 0}
+        return pairs
+    for first, second in (("offense", "tank"), ("tank", "balanced"), ("balanced", "offense")):
+        assert stored_pairs(moved, first, second) == stored_pairs(fresh, first, second)
+    assert moved.count_cycles() == fresh.count_cycles() == brute_force(shifted)
+    # chunks simulated with another round limit are never reused
+    shorter = BalanceAtlas(str(tmp_path), grids([8, 10]), max_rounds=5)
+    with pytest.raises(ValueError, match="max_rounds=100"):
+        shorter.update()
+    with pytest.raises(ValueError, match="max_rounds=100"):
+        shorter.count_cycles()
+
+def test_surrogate_screening_saves_real_evaluations():
+    """With screening, only the chosen fraction of each generation reaches the real fitness."""
+    from surrogate import SurrogateScreen, SurrogateConfig
+    bounds = [(1, 10), (1, 10), (-2, 2), (6, 23), (0, 10)] * 3
+    calls = []
+    def real_fitness(x):
+        calls.append(len(x))
+        return fitness_batch(x)
+    screen = SurrogateScreen(real_fitness, bounds, SurrogateConfig(screen_fraction=0.25))
+    population = random_parameter_vectors(40, seed=7)
+    random.seed(0)
+    expected = fitness_batch(population)
+    random.seed(0)
+    assert np.array_equal(screen(population.T), expected)  # initial population: all real
+    trials = random_parameter_vectors(40, seed=8)
+    random.seed(0)
+    scores = screen(trials.T)
+    assert calls == [40, 10] and np.isinf(scores).sum() == 30
+    assert screen.stats.real_evaluations == 50 and screen.stats.screened_out == 30
+    random.seed(0)
+    assert np.array_equal(scores[np.isfinite(scores)], fitness_batch(trials[np.isfinite(scores)]))
+
+def test_deck_battles_match_stat_battles(n_battles: int = 2000):
+    """Decks of identical cards behave like fixed ATK/DEF; seeded runs are reproducible."""
+    from deck_battle import DeckBuild, simulate_deck_battles
+    builds = [Build("Offense", 6, 3, 0, 14, 8), Build("Balanced", 5, 4, 1, 18, 5), Build("Tank", 3, 5, 2, 22, 2)]
+    for p1, p2 in [(builds[0], builds[2]), (builds[2], builds[1]), (builds[1], builds[0])]:
+        deck_p1 = DeckBuild(p1.name, [p1.atk] * 5, [p1.defense] * 3, p1.revenge, p1.hp, p1.spd)
+        deck_p2 = DeckBuild(p2.name, [p2.atk] * 4, [p2.defense] * 2, p2.revenge, p2.hp, p2.spd)
+        result = simulate_deck_battles(deck_p1, deck_p2, 10, seed=0)
+        assert [str(r) for r in result.battle_results(deck_p1, deck_p2)] == [str(simulate_battle(p1, p2)[0])] * 10
+    p1 = DeckBuild("Offense", [3, 4, 5, 6, 8], [1, 2, 3], revenge=0.5, hp=15, spd=3)
+    p2 = DeckBuild("Tank", [2, 3, 4], [2, 3, 4, 5], revenge=1.0, hp=20, spd=3)
+    first = simulate_deck_battles(p1, p2, n_battles, seed=1, chunk_size=512)
+    second = simulate_deck_battles(p1, p2, n_battles, seed=1, chunk_size=512)
+    assert np.array_equal(first.winner, second.winner) and np.array_equal(first.rounds, second.rounds)
+    assert 0 < first.win_rates()[0] < 1
+    # every resolved primary attack plays one attack card and one defense card
+    for player in (0, 1):
+        assert first.attack_usage[player].sum() == first.defense_usage[1 - player].sum()
+    import pytest
+    with pytest.raises(ValueError, match="integers"):  # not silently truncated to 1
+        simulate_deck_battles(DeckBuild("Offense", [1.5, 3], [1, 2]), p2, 10, seed=0)
+
+def test_monster_battle_targeting_and_tokens():
+    """Hand-computed monster battle (fast, monster, slow order) under the targeting variants."""
+    from monster_battle import Monster, simulate_monster_battle
+    team = (Build("Fast", 4, 0, 0, 10, 5), Build("Slow", 4, 0, 0, 20, 1))
+    monster = Monster("Wolf", hp=12, atk=3, spd=3, reward=6)
+    # the monster hits Slow once before Fast deals the killing blow in turn 2
+    for targeting in ("A1", "highest_hp"):
+        result = simulate_monster_battle(team, monster, targeting, n_seeds=50, seed=0)
+        assert result.win_rate == 1.0 and set(result.turns) == {2}
+        assert result.tokens[0].tolist() == [[6, 2, 0, 2, 2], [6, 1, 0, 0, 3]]
+    result = simulate_monster_battle(team, monster, "most_vp", n_seeds=50, seed=0, vp=(5, 0))
+    assert result.hp[0, :2].tolist() == [7, 20] and result.tokens[0, 0, 4] == 1
+    # in turn 1 nobody has dealt damage yet, so "most_damage" picks a random target
+    first = simulate_monster_battle(team, monster, "A2", n_seeds=400, seed=1)
+    second = simulate_monster_battle(team, monster, "A2", n_seeds=400, seed=1)
+    assert np.array_equal(first.hp, second.hp)
+    assert 0 < np.mean(first.hp[:, 0] < 10) < 1
+
+def test_full_game_runner_is_chunk_independent():
+    """Seeded games give the same results in one process and chunked across a process pool."""
+    from game_simulator import run_games
+    inline = run_games(12, ("balanced", "aggressive"), seed=3, workers=1, verbose=False)
+    pooled = run_games(12, ("balanced", "aggressive"), seed=3, workers=2, chunk_size=5, verbose=False)
+    assert np.array_equal(inline.batch.vp, pooled.batch.vp) and np.array_equal(inline.batch.winner, pooled.batch.winner)
+    # 1 VP per monster (9 rounds) and 2 VP per PvP win (3 phases)
+    assert np.array_equal(inline.batch.vp, inline.batch.monster_wins + 2 * inline.batch.pvp_wins)
+    assert inline.batch.vp.max() <= 15 and np.array_equal(inline.batch.vp_history[:, -1], inline.batch.vp)
+
+def test_stamina_game_equilibrium_and_memo():
+    """Matrix games give known mixed equilibria; the bid game is decided by who can outbid in the lethal round."""
+    from stamina_game import StaminaGame, solve_matrix_game, stamina_game_stats
+    value, x, y = solve_matrix_game(np.array([[0, -1, 1], [1, 0, -1], [-1, 1, 0]]))
+    assert abs(value) < 1e-9 and np.allclose(x, 1 / 3) and np.allclose(y, 1 / 3)
+    # whoever attacks first in round 2 wins: both deal 5 per round, revenge heals 1
+    p1, p2 = Build("A", 6, 1, -1, 10, 0), Build("B", 6, 1, -1, 10, 0)
+    assert StaminaGame(p1, p2, stamina=4).value() == 0.5
+    assert StaminaGame(p1, p2, stamina=(5, 4)).value() == 1.0
+    assert StaminaGame(p1, p2, stamina=(4, 5)).value() == 0.0
+    # with non-integer stats both orders differ only in float noise: nobody bids until the lethal round
+    game = StaminaGame(Build("A", 5.5, 2.3, 0.7, 20, 0), Build("B", 3.2, 4.1, 1.3, 30, 0), stamina=20)
+    assert game.value() == 0.0 and len(game) <= game.max_rounds
+    fitness_args = default_stats()
+    fitness(*fitness_args, stamina=20)
+    misses = stamina_game_stats().misses
+    fitness(*fitness_args, stamina=20)
+    assert stamina_game_stats().misses == misses  # second evaluation only hits the memo
+
+def test_profiling_counts_battles_and_traces_generations(tmp_path):
+    """Enabled profiling counts battles and cache hits and writes one trace line per generation."""
+    import json
+    import profiling
+    from pvp_balance_search import optimize_builds
+    trace_path = tmp_path / "trace.jsonl"
+    profiling.enable(str(trace_path))
+    try:
+        cache = MatchupCache()
+        for _ in range(4):
+            fitness(*default_stats(), cache=cache)
+        stats = profiling.stats()
+        assert stats.counters["battle_calls"] == 12 and stats.counters["cache_hits"] == 9
+        assert stats.timings["fitness"].count == 4
+        ranges = dict(atk_ranges=[(1, 10)] * 3, def_ranges=[(1, 10)] * 3, rev_ranges=[(-2, 2)] * 3,
+                      hp_ranges=[(6, 23), (6, 24), (6, 25)], spd_ranges=[(0, 10)] * 3)
+        optimize_builds(**ranges, maxiter=3, popsize=5, workers=1, seed=0)
+    finally:
+        profiling.disable()
+    records = [json.loads(line) for line in trace_path.read_text().splitlines()]
+    assert [record["generation"] for record in records] == [1, 2, 3]
+    assert all(record["evaluation_seconds"] <= record["wall_seconds"] for record in records)
+    assert records[1]["counters"]["fitness_calls"] >= 75
+    assert not profiling.is_enabled()
+
+def test_pareto_search_front_is_non_dominated():
+    """Ranks match a brute-force domination count, and the returned front is feasible and non-dominated."""
+    from pareto_search import non_dominated_sort, optimize_builds_pareto, objectives_batch
+    rng = np.random.default_rng(0)
+    objectives, violation = rng.random((200, 3)), np.where(rng.random(200) < 0.2, rng.random(200), 0.0)
+    ranks = non_dominated_sort(objectives, violation)
+    for j in range(len(objectives)):
+        dominators = [i for i in range(len(objectives)) if (
+            np.all(objectives[i] <= objectives[j]) and np.any(objectives[i] < objectives[j])
+            if violation[i] == violation[j] == 0 else violation[i] < violation[j])]
+        assert ranks[j] == (max(ranks[dominators]) + 1 if dominators else 0)
+    result = optimize_builds_pareto([(4, 9), (3, 7), (1, 5)], [(1, 4), (2, 6), (4, 9)], [(0, 1)] * 3,
+                                    [(5, 15), (8, 20), (12, 25)], [(1, 10)] * 3,
+                                    popsize=60, generations=5, seed=0, verbose=False)
+    assert len(result) > 0 and np.all(non_dominated_sort(result.objectives) == 0)
+    assert np.all(objectives_batch(result.params)[1] == 0)
+
+def test_robustness_of_perturbed_variants():
+    """Unperturbed variants keep the cycle; perturbed ones break it sometimes, equally in single and batch evaluation."""
+    from robustness import RobustnessConfig, robustness, robustness_batch, robust_fitness_batch
+    builds = default_stats()
+    params = np.array([[b.atk, b.defense, b.revenge, b.hp, b.spd] for b in builds]).reshape(1, 15)
+    exact = RobustnessConfig(n_variants=10, noise=(0.0,) * 5, rounding=(0.0,) * 5)
+    assert robustness(*builds, exact).robustness == 1.0
+    config = RobustnessConfig(n_variants=500)
+    report = robustness(*builds, config)
+    assert 0.0 < report.robustness < 1.0 and report.robustness <= min(report.rps_rate, report.names_rate)
+    matchup_rates, names_rates, robust_rates = robustness_batch(np.repeat(params, 3, axis=0), config)
+    assert np.allclose(robust_rates, report.robustness) and np.allclose(1 - matchup_rates, report.matchup_loss)
+    assert np.allclose(robust_fitness_batch(params, config), fitness_batch(params) + config.factor * (1 - report.robustness))
+    import pytest
+    from pvp_balance_search import optimize_builds
+    from surrogate import SurrogateConfig
+    bounds = [(1, 10)] * 3
+    with pytest.raises(ValueError, match="cannot be combined"):
+        optimize_builds(bounds, bounds, bounds, bounds, bounds, robustness=config, surrogate=SurrogateConfig())
+
+def test_optimizer_reports_the_minimized_objective(monkeypatch):
+    """With robustness, generations report the best robust fitness, i.e. the minimum objective value so far."""
+    import robustness
+    from pvp_balance_search import optimize_builds
+    evaluated = []
+    objective = robustness._robust_fitness_vectorized
+    def recording_objective(*args, **kwargs):
+        values = objective(*args, **kwargs)
+        evaluated.extend(values)
+        return values
+    monkeypatch.setattr(robustness, "_robust_fitness_vectorized", recording_objective)
+    reported = []
+    optimize_builds([(1, 10)] * 3, [(1, 10)] * 3, [(-2, 2)] * 3, [(6, 23), (6, 24), (6, 25)], [(0, 10)] * 3,
+                    maxiter=4, popsize=5, seed=3, robustness=robustness.RobustnessConfig(n_variants=20),
+                    on_generation=lambda generation, best: reported.append((best, min(evaluated))))
+    assert len(reported) == 4 and all(best == lowest for best, lowest in reported)
+
+def test_cli_simulate_reads_builds_without_scipy_or_matplotlib(tmp_path):
+    """`battle-builder simulate` matches `simulate_battle` and does not import SciPy or matplotlib."""
+    import csv
+    import json
+    builds = default_stats()
+    path = tmp_path / "builds.json"
+    path.write_text(json.dumps([dict(name=b.name, atk=b.atk, defense=b.defense, revenge=b.revenge, hp=b.hp, spd=b.spd)
+                                for b in builds]))
+    script = (f"import sys, cli; cli.main(['simulate', {str(path)!r}, '-o', {str(tmp_path / 'out.csv')!r}]); "
+              "print(sorted(m for m in ('scipy', 'matplotlib', 'pvp_balance_search') if m in sys.modules))")
+    imported = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    assert imported == "[]"
+    rows = list(csv.DictReader(open(tmp_path / "out.csv")))
+    assert [(row["p1"], row["p2"]) for row in rows] == [("Offense", "Balanced"), ("Offense", "Tank"), ("Balanced", "Tank")]
+    for row, (p1, p2) in zip(rows, [(0, 1), (0, 2), (1, 2)]):
+        result, _ = simulate_battle(builds[p1], builds[p2])
+        assert row["winner"] == result.winner and int(row["rounds"]) == result.rounds
+    import cli
+    for values in ("6:8:0", "1:3", "8:6:1"):  # malformed ranges are reported, not raised
+        assert cli.main(["sweep", str(path), "--build", "Offense", "--stat", "atk", "--values", values]) == 2
+
+def test_recording_modes_and_trajectory_buffer():
+    """All recording modes give the same result; the trajectory buffer holds the same HP as the full log."""
+    from pvp_balance_search import BattleSummary
+    from batch_battle import allocate_trajectories, builds_to_array
+    builds = [builds_from_vector(params) for params in random_parameter_vectors(100, seed=3)]
+    pairs = [(o, t) for o, _, t in builds] + [(b, b) for _, b, _ in builds]  # includes speed ties
+    random.seed(5)
+    full = [simulate_battle(p1, p2) for p1, p2 in pairs]
+    trajectory = allocate_trajectories(len(pairs))
+    random.seed(5)
+    simulate_battles_batch(builds_to_array([p1 for p1, _ in pairs]), builds_to_array([p2 for _, p2 in pairs]),
+                           trajectory=trajectory)
+    random.seed(5)
+    none = [simulate_battle(p1, p2, record="none") for p1, p2 in pairs]
+    random.seed(5)
+    summary = [simulate_battle(p1, p2, record="summary") for p1, p2 in pairs]
+    for (p1, p2), (result, hp_log), (result_none, log_none), (result_summary, battle_summary), buffer in zip(
+            pairs, full, none, summary, trajectory):
+        assert str(result) == str(result_none) == str(result_summary) and log_none is None
+        assert isinstance(battle_summary, BattleSummary) and battle_summary.final_hp == hp_log[-1]
+        assert battle_summary.damage_dealt == (p2.hp - hp_log[-1][1], p1.hp - hp_log[-1][0])
+        assert np.array_equal(buffer[:len(hp_log)], np.array(hp_log, dtype=np.float32))
+        assert np.isnan(buffer[len(hp_log):]).all()
+
+def test_level_tables_match_widget_and_optimize():
+    """The default level tables give the widget's numbers; batch scores equal single scores; DE finds a cycle."""
+    from level_tables import LevelTables, analyze_level_tables, level_table_fitness_batch, optimize_level_tables
+    analysis = analyze_level_tables(LevelTables().to_array())
+    # Offense vs Tank: 5 - 2 + 0.2 = 3.2 damage against 6 HP, 3 - 0.75 + 0.6 = 2.85 against 10 HP
+    assert np.isclose(analysis.pvp_turns[0, 0, 2], 6 / 3.2) and np.isclose(analysis.pvp_turns[0, 2, 0], 10 / 2.85)
+    assert np.isclose(analysis.cycle_margin[0, 0], 10 / 2.85 - 6 / 3.2) and not analysis.is_cycle[0]
+    assert np.isclose(analysis.solvability[0], 6 * (1.5 - 0.75) + 8 * (0.75 - 2) + 10 * (2 - 1.5))
+    candidates = np.random.default_rng(0).uniform(0, 10, size=(50, 24))
+    assert np.allclose(level_table_fitness_batch(candidates), [level_table_fitness_batch(x)[0] for x in candidates])
+    tables, score = optimize_level_tables(maxiter=300, seed=0)
+    assert analyze_level_tables(tables.to_array()).is_cycle[0] and score < 100
+
+def test_batch_service_coalesces_concurrent_requests():
+    """Concurrent clients get the results of `fitness` and `test_rps_cycle` from a few shared engine calls."""
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    from batch_service import BatchService, BatchServiceClient, ServiceConfig
+    # without speed ties, whose random outcomes would differ between the service and the reference
+    triples = [builds_from_vector(params) for params in random_parameter_vectors(50, seed=4)
+               if len(set(params[4::5])) == 3]
+
+    def client(port: int, triple) -> tuple:
+        connection = BatchServiceClient(port=port)
+        try:
+            return connection.fitness(*triple), connection.rps_cycle(*triple)
+        finally:
+            connection.close()
+
+    async def run():
+        service = BatchService(ServiceConfig(max_delay=0.02))
+        server = await service.start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(len(triples)) as pool:
+            results = await asyncio.gather(*[loop.run_in_executor(pool, client, port, triple) for triple in triples])
+        server.close()
+        return results, service.metrics_dict()
+
+    results, metrics = asyncio.run(run())
+    for triple, (score, rps_result) in zip(triples, results):
+        assert np.isclose(score, fitness(*triple)) and rps_result == test_rps_cycle(*triple)
+    assert metrics["requests"]["fitness"] == metrics["requests"]["rps_cycle"] == len(triples)
+    assert metrics["batches"] < len(triples) and metrics["battles"] + metrics["cache_hits"] + metrics["coalesced"] == 6 * len(triples)
+
+    def failing_fitness(port: int) -> str:
+        try:
+            client(port, triples[0])
+        except ValueError as error:
+            return str(error)
+        return ""
+
+    async def run_failing_engine():
+        """A slow engine does not block other connections, and its errors reach the client."""
+        service = BatchService(ServiceConfig(max_delay=0.001))
+        def slow_failing_engine(stats1, stats2, max_rounds):
+            time.sleep(0.3)
+            raise ZeroDivisionError("engine failure")
+        service.batcher._engine = slow_failing_engine
+        server = await service.start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(2) as pool:
+            failing = loop.run_in_executor(pool, failing_fitness, port)
+            await asyncio.sleep(0.1)
+            start = time.perf_counter()
+            await loop.run_in_executor(pool, lambda: BatchServiceClient(port=port).metrics())
+            waited = time.perf_counter() - start
+            message = await failing
+        server.close()
+        service.close()
+        return message, waited
+
+    message, waited = asyncio.run(run_failing_engine())
+    assert "ZeroDivisionError" in message and waited < 0.15
+
+def test_aggregate_plots_bin_batches(tmp_path):
+    """Binned trajectories, stat grids and stat distributions match direct counts; plots render headless."""
+    from aggregate_plots import (TrajectoryDensity, trajectory_density, stat_grid, stat_distribution, sweep_params,
+                                 plot_trajectory_density, plot_stat_grid, plot_stat_distributions)
+    from batch_battle import allocate_trajectories
+    params = random_parameter_vectors(3000, seed=6)
+    stats1, stats2 = params[:, :5].copy(), params[:, 10:].copy()
+    stats1[:, 3], stats2[:, 3] = np.round(stats1[:, 3]), np.round(stats2[:, 3])
+    trajectory = allocate_trajectories(len(stats1))
+    result = simulate_battles_batch(stats1, stats2, trajectory=trajectory)
+    density = trajectory_density(trajectory)
+    # every battle counts once per round it was running, in chunks or all at once
+    assert np.array_equal(density.running, (~np.isnan(trajectory[:, :, 0])).sum(axis=0))
+    chunked = TrajectoryDensity(100, (density.hp_edges[0], density.hp_edges[-1]), len(density.hp_edges) - 1)
+    chunked.add(trajectory[:1000]).add(trajectory[1000:])
+    assert np.array_equal(chunked.counts, density.counts) and chunked.n_battles == len(stats1)
+    wins = (result.winner == P1_WINS).astype(float)
+    grid = stat_grid(stats1, wins, "atk", "spd", bins=8)
+    in_bin = (stats1[:, 0] <= grid.x_edges[1]) & (stats1[:, 4] <= grid.y_edges[1])
+    assert grid.count.sum() == len(stats1) and grid.count[0, 0] == in_bin.sum()
+    assert np.isclose(grid.value[0, 0], wins[in_bin].mean())
+    assert stat_grid(stats1, wins, "atk", "spd", bins=8, statistic="min").value[0, 0] == wins[in_bin].min()
+    sweep = sweep_params(params[0], "Offense.atk", "Tank.hp", np.linspace(1, 10, 10), np.arange(6, 26))
+    sweep_grid = stat_grid(sweep, fitness_batch(sweep), "Offense.atk", "Tank.hp", bins=(10, 20))
+    assert np.all(sweep_grid.count == 1)
+    distribution = stat_distribution(stats1, weights=wins)
+    assert np.allclose(distribution.density.sum(axis=1), 1) and np.allclose(distribution.mean, stats1[wins == 1].mean(axis=0))
+    plot_trajectory_density(density, ("Offense", "Tank"), path=tmp_path / "trajectories.png")
+    plot_stat_grid(grid, "win rate", path=tmp_path / "grid.png")
+    plot_stat_distributions({"Offense": distribution, "Tank": stat_distribution(stats2)}, path=tmp_path / "radar.png")
+    assert all((tmp_path / name).stat().st_size > 0 for name in ("trajectories.png", "grid.png", "radar.png"))
+
 if __name__ == "__main__":
     test_default_battle()
@@ -0,0 +1,182 @@
+"""
+Round-robin tournaments between any number of builds.
+
+`play_tournament` resolves every pair of N builds in one batched engine call and returns the
+full N x N outcome matrix. The attack order of a battle depends on speed, not on which build
+is passed first, so i vs j is the same battle as j vs i: only the N(N-1)/2 pairs i < j are
+simulated and mirrored into the lower triangle.
+
+From the matrix, `Tournament` derives the dominance structure (wins per build, undominated
+and dominant builds) and the directed cycles, and `tournament_fitness` generalizes the
+RPS `fitness` to cycles of arbitrary length.
+"""
+
+# Standard library imports
+from dataclasses import dataclass
+from itertools import permutations
+from typing import Optional, Sequence
+import numpy as np
+
+from batch_battle import DRAW, P1_WINS, builds_to_array
+from battle_engines import get_engine
+from pvp_balance_search import Build, STAT_RANGES, OUT_OF_RANGE_FACTOR, RPS_FACTOR, ROUNDS_FACTOR, \
+    _penalize_out_of_range
+
+# ------------------------------------------------------------
+# Data structures
+# ------------------------------------------------------------
+
+@dataclass
+class Tournament:
+    """
+    Outcome of all pairings of N builds.
+
+    `outcome[i, j]` is 1 if build i beats build j, -1 if it loses and 0 for a draw (and on the
+    diagonal); it is antisymmetric. `rounds[i, j]` is the battle length (symmetric, 0 on the
+    diagonal).
+    """
+    builds: list[Build]
+    outcome: np.ndarray  # (N, N) int8
+    rounds: np.ndarray   # (N, N) int64
+
+    @property
+    def names(self) -> list[str]:
+        return [build.name for build in self.builds]
+
+    @property
+    def beats(self) -> np.ndarray:
+        """(N, N) bool matrix: build i beats build j."""
+        return self.outcome > 0
+
+    @property
+    def wins(self) -> np.ndarray:
+        """Number of wins of each build."""
+        return self.beats.sum(axis=1)
+
+    @property
+    def losses(self) -> np.ndarray:
+        return self.beats.sum(axis=0)
+
+    def dominant(self) -> list[int]:
+        """Builds that beat every other build."""
+        return [i for i in range(len(self.builds)) if self.wins[i] == len(self.builds) - 1]
+
+    def undominated(self) -> list[int]:
+        """Builds that no other build beats."""
+        return [i for i in range(len(self.builds)) if self.losses[i] == 0]
+
+    def is_cycle(self, order: Sequence[int]) -> bool:
+        """True if order[0] beats order[1], ..., and order[-1] beats order[0]."""
+        return all(self.beats[a, b] for a, b in zip(order, np.roll(order, -1)))
+
+    def cycle_rounds(self, order: Sequence[int]) -> np.ndarray:
+        """Battle lengths along the cycle `order` (same edges as `is_cycle`)."""
+        return np.array([self.rounds[a, b] for a, b in zip(order, np.roll(order, -1))])
+
+    def cycles(self, length: int = 3) -> list[tuple[int, ...]]:
+        """
+        All directed cycles of `length` builds, each listed once, starting at its smallest index.
+        Enumerates ordered tuples, so keep `length` small for large N.
+        """
+        n = len(self.builds)
+        found = []
+        for start in range(n):
+            for rest in permutations(range(start + 1, n), length - 1):
+                order = (start, *rest)
+                if self.is_cycle(order):
+                    found.append(order)
+        return found
+
+    def __str__(self):
+        width = max(len(name) for name in self.names)
+        symbols = {1: "W", -1: "L", 0: "D"}
+        lines = [" " * width + "  " + " ".join(f"{name[:width]:>{width}}" for name in self.names)]
+        for i, name in enumerate(self.names):
+            cells = ["-" if i == j else f"{symbols[int(self.outcome[i, j])]}{self.rounds[i, j]}"
+                     for j in range(len(self.names))]
+            lines.append(f"{name:>{width}}  " + " ".join(f"{cell:>{width}}" for cell in cells))
+        return "\n".join(lines)
+
+# ------------------------------------------------------------
+# Tournament
+# ------------------------------------------------------------
+
+def play_tournament(builds: Sequence[Build], max_rounds: int = 100, engine: str = "numpy") -> Tournament:
+    """
+    Resolve all N(N-1)/2 pairings of `builds` in one engine call.
+
+    Speed ties are resolved with `random` in the order of the pairs (i, j), i < j, row by row.
+
+    Args:
+        builds: The N builds
+        max_rounds: Rounds after which a battle ends in a draw
+        engine: Battle engine (see `battle_engines`)
+
+    Returns:
+        Tournament with the N x N outcome and rounds matrices
+    """
+    builds = list(builds)
+    stats = builds_to_array(builds)
+    first, second = np.triu_indices(len(builds), k=1)
+    result = get_engine(engine)(stats[first], stats[second], max_rounds)
+
+    outcome = np.zeros((len(builds), len(builds)), dtype=np.int8)
+    score = np.where(result.winner == P1_WINS, 1, np.where(result.winner == DRAW, 0, -1)).astype(np.int8)
+    outcome[first, second] = score
+    outcome[second, first] = -score
+    rounds = np.zeros((len(builds), len(builds)), dtype=np.int64)
+    rounds[first, second] = result.rounds
+    rounds[second, first] = result.rounds
+    return Tournament(builds=builds, outcome=outcome, rounds=rounds)
+
+def rotation_pairings(n_players: int, pvp_round: int) -> list[tuple[int, int]]:
+    """
+    Pairings of round `pvp_round` of a round-robin rotation (circle method), e.g. for the
+    4-player PvP phase. With an odd number of players one player sits out every round.
+    """
+    players = list(range(n_players)) + ([None] if n_players % 2 else [])
+    n = len(players)
+    shift = pvp_round % (n - 1)
+    rotated = [players[0]] + players[1:][-shift:] + players[1:][:-shift] if shift else players
+    pairs = [(rotated[i], rotated[n - 1 - i]) for i in range(n // 2)]
+    return [pair for pair in pairs if None not in pair]
+
+# ------------------------------------------------------------
+# Generalized fitness
+# ------------------------------------------------------------
+
+def tournament_fitness(builds: Sequence[Build], cycle: Optional[Sequence[int]] = None, min_rounds: int = 3,
+                       max_rounds: int = 10, engine: str = "numpy", tournament: Optional[Tournament] = None) -> float:
+    """
+    Fitness of N builds that should form the cycle `cycle[0] > cycle[1] > ... > cycle[0]`.
+
+    Uses the out-of-range, RPS and round-length penalties of `fitness`, applied to all builds
+    and all cycle edges. For the three archetypes in the order (Offense, Tank, Balanced) this
+    equals `fitness` without its archetype-specific naming penalty.
+
+    Args:
+        builds: The N builds
+        cycle: Intended cycle as build indices (default: 0 > 1 > ... > N-1 > 0)
+        min_rounds, max_rounds: Desired battle length along the cycle
+        engine: Battle engine used if no `tournament` is given
+        tournament: Precomputed tournament of `builds`
+
+    Returns:
+        Fitness score (lower is better)
+    """
+    builds = list(builds)
+    cycle = list(range(len(builds))) if cycle is None else list(cycle)
+    tournament = tournament if tournament is not None else play_tournament(builds, engine=engine)
+
+    score = 0.0
+    for build in builds:
+        for stat in ('atk', 'defense', 'revenge', 'hp'):
+            score += _penalize_out_of_range(getattr(build, stat), STAT_RANGES[stat], multiplier=OUT_OF_RANGE_FACTOR)
+    if not tournament.is_cycle(cycle):
+        score += RPS_FACTOR
+    for length in tournament.cycle_rounds(cycle):
+        if length < min_rounds:
+            score += 5 * ROUNDS_FACTOR * (min_rounds - length)
+        elif length > max_rounds:
+            score += ROUNDS_FACTOR * (length - max_rounds)
+    return score